@@ -23,7 +23,8 @@ if src_dir not in sys.path:
 
 from src import data_loader, eda, modelo_1_regresion, modelo_2_segmentacion, modelo_3_clasificacion, modelo_4_anomalias
 from src.mapeo_columnas import mapear_columnas_dataset, verificar_columnas_disponibles
-from src.data_utils import optimize_dataframe_for_streamlit, display_data_quality_summary, safe_dataframe_display
+from src.almacen_caracteristicas import AlmacenCaracteristicas
+from src.data_utils import optimize_dataframe_for_streamlit, display_data_quality_summary, safe_dataframe_display, content_fingerprint
 
 st.set_page_config(page_title="Modelos Conceptuales Supermercado", layout="wide", initial_sidebar_state="expanded")
 
@@ -117,18 +118,30 @@ st.sidebar.subheader("🗂️ Dataset de Supermercado")
 # Inicializar estado de la sesión para el dataframe
 if 'df' not in st.session_state:
     st.session_state.df = None
+# Almacén de columnas codificadas compartido por los modelos de la sesión
+if 'almacen_caracteristicas' not in st.session_state:
+    st.session_state.almacen_caracteristicas = AlmacenCaracteristicas()
+almacen = st.session_state.almacen_caracteristicas
 
 # Verificar dataset principal
 dataset_info = data_loader.verificar_dataset_real()
 
+# Lectura por bloques para archivos grandes (acota el pico de memoria)
+modo_streaming = st.sidebar.checkbox(
+    "📦 Lectura por bloques (archivos grandes)",
+    value=False,
+    help="Lee el archivo en bloques de tamaño fijo en lugar de cargarlo completo de una vez",
+    key="streaming_mode_checkbox"
+)
+
 # Mostrar estado del dataset
 if dataset_info['disponible']:
     st.sidebar.success("✅ Dataset de ventas disponible")
-    st.sidebar.caption(f"📊 {dataset_info['registros']} registros")
+    st.sidebar.caption(f"📊 {'' if dataset_info['registros_exactos'] else '≈ '}{dataset_info['registros']} registros")
     
     if st.sidebar.button("🚀 Cargar Datos de Supermercado", type="primary", key="load_main_dataset"):
         with st.spinner("Cargando datos de ventas..."):
-            df_temp = data_loader.cargar_datos()
+            df_temp = data_loader.cargar_datos(modo_streaming=modo_streaming)
             if df_temp is not None:
                 st.session_state.df = df_temp
                 st.sidebar.success("✅ Datos cargados exitosamente")
@@ -139,7 +152,7 @@ else:
     
     if st.sidebar.button("🧪 Usar Datos Sintéticos", type="secondary", key="load_synthetic_data"):
         with st.spinner("Generando datos sintéticos..."):
-            df_temp = data_loader.cargar_datos()
+            df_temp = data_loader.cargar_datos(modo_streaming=modo_streaming)
             if df_temp is not None:
                 st.session_state.df = df_temp
                 st.sidebar.success("✅ Datos sintéticos generados")
@@ -150,7 +163,7 @@ with st.sidebar.expander("📁 Cargar Archivo Personalizado"):
     archivo = st.file_uploader("Sube archivo Excel/CSV", type=["xlsx", "csv"], key="file_uploader")
     if archivo:
         with st.spinner("Procesando archivo..."):
-            df_temp = data_loader.cargar_datos(archivo)
+            df_temp = data_loader.cargar_datos(archivo, modo_streaming=modo_streaming)
             if df_temp is not None:
                 st.session_state.df = df_temp
                 st.sidebar.success("✅ Archivo cargado exitosamente")
@@ -169,8 +182,15 @@ st.sidebar.markdown("---")
 if df is not None:
     st.sidebar.success(f"📊 **Dataset Activo**")
     st.sidebar.info(f"📈 {len(df)} registros x {len(df.columns)} columnas")
+    estadisticas_almacen = almacen.estadisticas()
+    if estadisticas_almacen['bloques']:
+        st.sidebar.caption(
+            f"🧱 Almacén de características: {estadisticas_almacen['bloques']} bloques "
+            f"({estadisticas_almacen['mb']} MB, {estadisticas_almacen['aciertos']} reutilizaciones)"
+        )
     if st.sidebar.button("🗑️ Limpiar Datos", key="clear_data"):
         st.session_state.df = None
+        almacen.limpiar()
         st.rerun()
 else:
     st.sidebar.warning("⚠️ **Sin datos cargados**")
@@ -195,6 +215,10 @@ if df is not None:
     except Exception as e:
         st.warning(f"⚠️ Error en mapeo automático: {e}")
         st.info("Continuando con columnas originales del dataset.")
+    
+    # Dataset sobre el que el almacén resuelve las filas de cada modelo; la
+    # huella completa se calcula una sola vez por DataFrame cargado
+    almacen.asignar_datos(df, content_fingerprint(df))
 else:
     # Pantalla de bienvenida cuando no hay datos cargados
     st.markdown("## 👋 ¡Bienvenido al Dashboard de Modelos Conceptuales!")
@@ -222,7 +246,8 @@ else:
     
     # Mostrar información del dataset disponible
     if dataset_info['disponible']:
-        st.success(f"✅ Dataset principal detectado ({dataset_info['registros']} registros)")
+        st.success(f"✅ Dataset principal detectado ({'' if dataset_info['registros_exactos'] else '≈ '}"
+                   f"{dataset_info['registros']} registros)")
     else:
         st.warning("⚠️ Dataset principal no encontrado - se usarán datos sintéticos")
 
@@ -335,6 +360,39 @@ if df is not None:
             categorical_vars = len([v for v in variables if not pd.api.types.is_numeric_dtype(df[v])])
             st.metric("Variables Categóricas", categorical_vars)
     
+    # Función para configurar el modo de entrenamiento de las redes MLP
+    def configurar_entrenamiento_mlp(clave):
+        """Controles de lote, parada temprana y presupuesto de tiempo para las MLP"""
+        with st.expander("⚙️ Configuración de entrenamiento", expanded=False):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                batch_size = st.select_slider("Tamaño de lote", options=['auto', 32, 64, 128, 256, 512, 1024],
+                                              value='auto', key=f"{clave}_batch_size")
+                early_stopping = st.checkbox("Parada temprana", value=False, key=f"{clave}_early_stopping")
+            with col2:
+                n_iter_no_change = st.number_input("Épocas sin mejora", min_value=2, max_value=50, value=10,
+                                                   key=f"{clave}_n_iter_no_change")
+                max_iter = st.number_input("Épocas máximas", min_value=10, max_value=1000, value=500, step=10,
+                                           key=f"{clave}_max_iter")
+            with col3:
+                tiempo_maximo = st.number_input("Tiempo máximo (s, 0 = sin límite)", min_value=0, max_value=600,
+                                                value=0, key=f"{clave}_tiempo_maximo")
+                streaming = st.checkbox("Entrenamiento por bloques (partial_fit)", value=False,
+                                        key=f"{clave}_streaming")
+        return {
+            'modo': 'streaming' if streaming else 'completo',
+            'batch_size': batch_size,
+            'early_stopping': early_stopping,
+            'n_iter_no_change': int(n_iter_no_change),
+            'max_iter': int(max_iter),
+            'tiempo_maximo': tiempo_maximo or None
+        }
+    
+    def mostrar_info_entrenamiento(info):
+        if info:
+            st.caption(f"⏱️ Entrenamiento ({info['modo']}): {info['epocas']} épocas en {info['segundos']:.2f}s "
+                       f"— detenido por {info['detenido_por']}")
+    
     # Función para validar variables por modelo
     def validar_variables_modelo(modelo_tipo, variables_seleccionadas, df):
         """Valida si las variables seleccionadas son apropiadas para el modelo"""
@@ -422,13 +480,20 @@ if df is not None:
         
         can_train = 'Rating' in df.columns and len([v for v in variables if pd.api.types.is_numeric_dtype(df[v])]) >= 1
         if can_train:
+            config_regresion = configurar_entrenamiento_mlp("regression")
             if st.button("🚀 Entrenar modelo de regresión", type="primary", key="train_regression_btn"):
                 with st.spinner("Entrenando modelo..."):
                     try:
                         input_vars = [v for v in variables if v != 'Rating']
-                        modelo, preproc, resultados = modelo_1_regresion.entrenar_regresion(df[input_vars + ['Rating']].dropna())
+                        modelo, preproc, resultados = modelo_1_regresion.entrenar_regresion(df[input_vars + ['Rating']].dropna(), usar_cache=True,
+                                                                                         config_entrenamiento=config_regresion,
+                                                                                         almacen=almacen)
                         
-                        st.success("✅ Entrenamiento finalizado exitosamente.")
+                        if resultados.get('desde_cache'):
+                            st.success("⚡ Modelo recuperado de la caché (mismos datos, variables e hiperparámetros).")
+                        else:
+                            st.success("✅ Entrenamiento finalizado exitosamente.")
+                        mostrar_info_entrenamiento(resultados.get('entrenamiento'))
                         
                         # Métricas en columnas
                         col1, col2, col3 = st.columns(3)
@@ -544,13 +609,77 @@ if df is not None:
             col1, col2 = st.columns([1, 3])
             with col1:
                 n_clusters = st.slider("Número de segmentos", min_value=2, max_value=8, value=3, key="segmentation_clusters_slider")
+                motor_clustering = st.selectbox(
+                    "Motor de clustering",
+                    list(modelo_2_segmentacion.MOTORES_CLUSTERING),
+                    help=f"'auto' usa MiniBatchKMeans a partir de {modelo_2_segmentacion.UMBRAL_MINIBATCH:,} filas; 'streaming' ajusta con partial_fit por bloques",
+                    key="segmentation_engine_select"
+                )
+                batch_size_kmeans = st.number_input(
+                    "Tamaño de lote (MiniBatch)", min_value=256, max_value=65536,
+                    value=modelo_2_segmentacion.TAMANO_LOTE_KMEANS, step=256,
+                    key="segmentation_batch_size"
+                )
             with col2:
                 st.info(f"💡 Se usarán {len(numeric_vars)} variables numéricas para la segmentación")
+                if st.button("⏱️ Comparar motores (inercia y tiempo)", key="compare_engines_btn"):
+                    with st.spinner("Comparando motores de clustering..."):
+                        comparacion = modelo_2_segmentacion.comparar_motores(
+                            df[variables].dropna(), n_clusters=n_clusters, batch_size=int(batch_size_kmeans),
+                            almacen=almacen
+                        )
+                    st.dataframe(comparacion, use_container_width=True)
+            
+            # Barrido de k: una sola llamada evalúa todos los segmentos en paralelo. Sus
+            # asignaciones valen solo para el mismo contenido, variables y motor: la clave
+            # usa la huella completa y un barrido de otros datos se descarta
+            clave_barrido = (content_fingerprint(df), tuple(variables), motor_clustering, int(batch_size_kmeans))
+            barrido = st.session_state.get('barrido_segmentacion')
+            if barrido and barrido['clave'] != clave_barrido:
+                del st.session_state.barrido_segmentacion
+            with st.expander("🔎 Explorar número de segmentos (k = 2 a 8)", expanded=False):
+                if st.button("📈 Evaluar rango de k en paralelo", key="k_sweep_btn"):
+                    with st.spinner("Evaluando números de segmentos..."):
+                        try:
+                            df_segmentacion = df[variables].dropna()
+                            st.session_state.barrido_segmentacion = {
+                                'clave': clave_barrido,
+                                'resultado': modelo_2_segmentacion.evaluar_rango_k(
+                                    df_segmentacion, k_min=2, k_max=8,
+                                    motor=motor_clustering, batch_size=int(batch_size_kmeans),
+                                    almacen=almacen
+                                )
+                            }
+                        except Exception as e:
+                            st.error(f"❌ Error al evaluar el rango de segmentos: {e}")
+                barrido = st.session_state.get('barrido_segmentacion')
+                if barrido and barrido['clave'] == clave_barrido:
+                    resumen = barrido['resultado']['resumen']
+                    col_a, col_b = st.columns(2)
+                    with col_a:
+                        st.line_chart(resumen.set_index('k')['inercia'])
+                    with col_b:
+                        st.line_chart(resumen.set_index('k')['silhouette'])
+                    st.dataframe(resumen, use_container_width=True)
+                    st.info(f"💡 Mejor silhouette con k = {barrido['resultado']['mejor_k']}. "
+                            "Al ejecutar la segmentación con un k evaluado se reutiliza el resultado.")
             
             if st.button("🚀 Ejecutar segmentación", type="primary", key="execute_segmentation_btn"):
                 with st.spinner("Segmentando clientes..."):
                     try:
-                        df_seg, kmeans, pca, preproc = modelo_2_segmentacion.segmentar_clientes(df[variables].dropna(), n_clusters=n_clusters)
+                        df_segmentacion = df[variables].dropna()
+                        barrido = st.session_state.get('barrido_segmentacion')
+                        if (barrido and barrido['clave'] == clave_barrido
+                                and n_clusters in barrido['resultado']['asignaciones']):
+                            df_seg, kmeans, pca, preproc = modelo_2_segmentacion.segmentacion_desde_barrido(
+                                df_segmentacion, barrido['resultado'], n_clusters
+                            )
+                        else:
+                            df_seg, kmeans, pca, preproc = modelo_2_segmentacion.segmentar_clientes(
+                                df_segmentacion, n_clusters=n_clusters,
+                                motor=motor_clustering, batch_size=int(batch_size_kmeans),
+                                almacen=almacen
+                            )
                         caracteristicas = modelo_2_segmentacion.caracterizar_segmentos(df_seg)
                         
                         st.success("✅ Segmentación completada exitosamente.")
@@ -564,7 +693,7 @@ if df is not None:
                         with col3:
                             try:
                                 from sklearn.metrics import silhouette_score
-                                sil_score = silhouette_score(pca.transform(preproc.transform(df[variables].dropna())), df_seg['Segmento'])
+                                sil_score = silhouette_score(pca.transform(preproc.transform(df_segmentacion)), df_seg['Segmento'])
                                 st.metric("Silhouette Score", f"{sil_score:.3f}")
                             except:
                                 st.metric("Variables Usadas", len(variables))
@@ -575,7 +704,7 @@ if df is not None:
                         
                         with col1:
                             fig, ax = plt.subplots(figsize=(10, 8))
-                            pca_coords = pca.transform(preproc.transform(df[variables].dropna()))
+                            pca_coords = pca.transform(preproc.transform(df_segmentacion))
                             
                             scatter = sns.scatterplot(
                                 x=pca_coords[:,0], 
@@ -684,13 +813,40 @@ if df is not None:
                 st.bar_chart(class_dist)
                 st.dataframe(class_dist.reset_index().rename(columns={'index': 'Línea de Producto', 'Product line': 'Cantidad'}))
             
+            config_clasificacion = configurar_entrenamiento_mlp("classification")
+            incremental_clasificacion = st.checkbox(
+                "Entrenamiento incremental fuera de memoria (preprocesador y red ajustados bloque a bloque)",
+                value=False, key="classification_incremental"
+            )
+            if incremental_clasificacion:
+                col1, col2 = st.columns(2)
+                with col1:
+                    archivo_incremental = st.file_uploader(
+                        "Archivo grande Excel/CSV (opcional; si no, se recorre el dataset cargado)",
+                        type=["xlsx", "csv"], key="classification_incremental_file"
+                    )
+                with col2:
+                    tamano_bloque_clasificacion = st.number_input(
+                        "Filas por bloque", min_value=1_000, max_value=1_000_000,
+                        value=modelo_3_clasificacion.TAMANO_BLOQUE, step=1_000, key="classification_block_size"
+                    )
             if st.button("🚀 Entrenar modelo de clasificación", type="primary", key="train_classification_btn"):
                 with st.spinner("Entrenando modelo de clasificación..."):
                     try:
                         input_vars = [v for v in variables if v != 'Product line']
-                        modelo, preproc, resultados = modelo_3_clasificacion.entrenar_clasificacion(df[input_vars + ['Product line']].dropna())
+                        if incremental_clasificacion:
+                            fuente = archivo_incremental if archivo_incremental is not None else df[input_vars + ['Product line']]
+                            modelo, preproc, resultados = modelo_3_clasificacion.entrenar_clasificacion_incremental(
+                                fuente, tamano_bloque=int(tamano_bloque_clasificacion),
+                                config_entrenamiento=config_clasificacion
+                            )
+                        else:
+                            modelo, preproc, resultados = modelo_3_clasificacion.entrenar_clasificacion(df[input_vars + ['Product line']].dropna(),
+                                                                                                     config_entrenamiento=config_clasificacion,
+                                                                                                     almacen=almacen)
                         
                         st.success("✅ Entrenamiento finalizado exitosamente.")
+                        mostrar_info_entrenamiento(resultados.get('entrenamiento'))
                         
                         # Métricas principales
                         col1, col2, col3 = st.columns(3)
@@ -716,8 +872,8 @@ if df is not None:
                                       fmt='d', 
                                       cmap='Blues', 
                                       ax=ax,
-                                      xticklabels=product_lines,
-                                      yticklabels=product_lines)
+                                      xticklabels=resultados['label_encoder'].classes_,
+                                      yticklabels=resultados['label_encoder'].classes_)
                             ax.set_xlabel('Predicción', fontsize=12)
                             ax.set_ylabel('Real', fontsize=12)
                             ax.set_title('Matriz de Confusión', fontsize=14, fontweight='bold')
@@ -797,7 +953,11 @@ if df is not None:
             if st.button("🚀 Detectar anomalías", type="primary", key="detect_anomalies_btn"):
                 with st.spinner("Detectando anomalías..."):
                     try:
-                        df_anom, modelo, preproc = modelo_4_anomalias.detectar_anomalias(df[variables].dropna(), variables, contamination)
+                        df_anom, modelo, preproc = modelo_4_anomalias.detectar_anomalias(
+                            df[variables].dropna(), variables, contamination, almacen=almacen
+                        )
+                        # Detector reutilizable para puntuar transacciones nuevas sin reentrenar
+                        st.session_state.detector_anomalias = modelo_4_anomalias.construir_detector(preproc, modelo)
                         
                         st.success("✅ Detección de anomalías completada.")
                         
@@ -817,7 +977,7 @@ if df is not None:
                         st.subheader("📊 Análisis de Anomalías Detectadas")
                         
                         if n_anomalies > 0:
-                            anomalias_df = df_anom[df_anom['Anomalía'] == 'Sí'].copy()
+                            anomalias_df = df_anom[df_anom['Anomalía'] == 'Sí'].sort_values('Puntuación anomalía')
                             with st.expander("🔍 Casos Anómalos Detectados", expanded=False):
                                 st.dataframe(anomalias_df.head(20), use_container_width=True)
                                 if len(anomalias_df) > 20:
@@ -887,6 +1047,26 @@ if df is not None:
                             st.info("No hay variables numéricas disponibles para visualización detallada de anomalías.")                            
                     except Exception as e:
                         st.error(f"❌ Error durante la detección de anomalías: {e}")
+            
+            if st.session_state.get('detector_anomalias') is not None:
+                with st.expander("📡 Puntuar transacciones nuevas (streaming, sin reentrenar)", expanded=False):
+                    archivo_nuevo = st.file_uploader(
+                        "Archivo de transacciones (.csv o .xlsx)", type=['csv', 'xlsx'], key="anomaly_stream_file"
+                    )
+                    if archivo_nuevo is not None and st.button("▶️ Puntuar en micro-lotes", key="anomaly_stream_btn"):
+                        try:
+                            lotes_anomalos = []
+                            latencias = []
+                            for lote, info_lote in modelo_4_anomalias.puntuar_en_streaming(
+                                    st.session_state.detector_anomalias, archivo_nuevo):
+                                lotes_anomalos.append(lote[lote['Anomalía'] == 'Sí'])
+                                latencias.append(info_lote['segundos'] * 1000)
+                            resultado = pd.concat(lotes_anomalos) if lotes_anomalos else pd.DataFrame()
+                            st.metric("Anomalías en las transacciones nuevas", len(resultado))
+                            st.caption(f"{len(latencias)} lotes · latencia media por lote {np.mean(latencias):.1f} ms")
+                            st.dataframe(resultado.head(50), use_container_width=True)
+                        except Exception as e:
+                            st.error(f"❌ Error al puntuar las transacciones: {e}")
         else:
             st.info("⚠️ Selecciona al menos una variable para detectar anomalías.")
     
@@ -0,0 +1,367 @@
+# Este módulo está alineado y documentado según la arquitectura conceptual ubicada en:
+# C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
+"""
+Almacén de características por sesión.
+
+El almacén trabaja sobre el dataset de la sesión, asignado con su huella de
+contenido (calculada una sola vez al cargarlo, ver asignar_datos). Las
+claves combinan esa huella con la columna y el rol, así que una consulta no
+vuelve a hashear la columna: las filas de cada modelo (p. ej. el resultado
+de un dropna()) se resuelven a posiciones del dataset y se seleccionan con
+ellas después de la consulta.
+
+Hay dos niveles de bloques:
+- Base: las categóricas del dataset completo factorizadas a códigos enteros
+  (nulos como 'Unknown'), compartidas por todos los perfiles.
+- Codificado: la salida del paso del perfil de cada modelo (one-hot, códigos
+  ordinales o imputación y escalado) junto con su transformador ajustado,
+  por columna, perfil, filas y filas de ajuste. Repetir un entrenamiento o
+  un barrido sobre las mismas filas no vuelve a codificar nada.
+
+Las columnas que no pertenecen al dataset asignado (o cuyas filas no se
+pueden resolver) se codifican igual, sin pasar por la caché.
+
+El almacén se crea una vez por sesión (en app.py vive en st.session_state) y
+tiene un tamaño máximo: al superarlo se descartan los bloques usados menos
+recientemente.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+
+try:
+    from .preprocesamiento import PERFILES, DTYPE, crear_codificador_categorico, crear_transformador_numerico
+except ImportError:
+    from preprocesamiento import PERFILES, DTYPE, crear_codificador_categorico, crear_transformador_numerico
+
+# Memoria máxima ocupada por los bloques (base y codificados)
+TAMANO_MAXIMO_MB = 512
+# Categoría asignada a los valores nulos de las columnas categóricas
+CATEGORIA_NULA = 'Unknown'
+
+
+def _bytes_bloque(bloque) -> int:
+    if sparse.issparse(bloque):
+        return bloque.data.nbytes + bloque.indices.nbytes + bloque.indptr.nbytes
+    return bloque.nbytes
+
+
+def _clave_filas(posiciones):
+    """Clave compacta de un conjunto de posiciones (None: todas las filas)"""
+    if posiciones is None:
+        return None
+    posiciones = np.ascontiguousarray(posiciones, dtype=np.int64)
+    return len(posiciones), hashlib.blake2b(posiciones.tobytes(), digest_size=16).hexdigest()
+
+
+def apilar_bloques(bloques, sparse_threshold=0.0):
+    """
+    Apila bloques codificados en una matriz float32.
+
+    Sigue la regla de ColumnTransformer: si hay bloques dispersos y la
+    densidad total es menor que `sparse_threshold`, la salida es CSR; si no,
+    densa y contigua. Un único bloque denso se retorna sin copiar.
+    """
+    if any(sparse.issparse(b) for b in bloques):
+        no_nulos = sum(b.nnz if sparse.issparse(b) else b.size for b in bloques)
+        total = sum(b.shape[0] * b.shape[1] for b in bloques)
+        if total and no_nulos / total < sparse_threshold:
+            return sparse.hstack(bloques, format='csr', dtype=DTYPE)
+        bloques = [b.toarray() if sparse.issparse(b) else b for b in bloques]
+    if len(bloques) == 1 and bloques[0].dtype == DTYPE and bloques[0].flags['C_CONTIGUOUS']:
+        return bloques[0]
+    return np.hstack(bloques).astype(DTYPE, copy=False)
+
+
+def _segundos_desde(serie, origen):
+    serie = serie if pd.api.types.is_datetime64_any_dtype(serie) else pd.to_datetime(serie)
+    return (serie - origen).dt.total_seconds().to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class ConversorColumna(BaseEstimator, TransformerMixin):
+    """
+    Paso base de una columna, el mismo con el que se arma el bloque del almacén.
+
+    Las categóricas salen como objetos con los nulos en CATEGORIA_NULA; las
+    numéricas como float64 con NaN y, si `origen` es una fecha, en segundos
+    desde ese origen (también si llegan como texto, p. ej. desde un CSV).
+    """
+
+    def __init__(self, rol='num', origen=None):
+        self.rol = rol
+        self.origen = origen
+
+    def fit(self, X, y=None):
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        return self
+
+    def transform(self, X):
+        serie = X.iloc[:, 0]
+        if self.rol == 'cat':
+            valores = serie.astype(object)
+            return valores.where(valores.notna(), CATEGORIA_NULA).to_frame()
+        if self.origen is not None:
+            return _segundos_desde(serie, self.origen).reshape(-1, 1)
+        return serie.to_numpy(dtype=np.float64, na_value=np.nan).reshape(-1, 1)
+
+    def get_feature_names_out(self, input_features=None):
+        return self.feature_names_in_ if input_features is None else np.asarray(input_features, dtype=object)
+
+
+def preparar_bloque_base(serie, rol):
+    """
+    Bloque base de una columna.
+
+    Returns:
+        tuple: ('cat') códigos int32 y categorías ordenadas, con los nulos en
+        CATEGORIA_NULA; ('num') valores float64 y origen de fechas (o None)
+    """
+    if rol == 'cat':
+        codigos, categorias = pd.factorize(serie, sort=True)
+        categorias = np.asarray(categorias, dtype=object)
+        nulos = codigos < 0
+        if nulos.any():
+            existente = np.flatnonzero(categorias == CATEGORIA_NULA)
+            if len(existente):
+                codigos[nulos] = existente[0]
+            else:
+                codigos[nulos] = len(categorias)
+                categorias = np.append(categorias, np.array([CATEGORIA_NULA], dtype=object))
+        return codigos.astype(np.int32, copy=False), categorias
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        origen = serie.min()
+        return _segundos_desde(serie, origen), origen
+    return serie.to_numpy(dtype=np.float64, na_value=np.nan), None
+
+
+def _paso_categorico(columna, codigos, categorias, perfil, filas_ajuste):
+    """One-hot u ordinal sobre los códigos; solo cuentan las categorías de las filas de ajuste"""
+    codigos_ajuste = codigos if filas_ajuste is None else codigos[filas_ajuste]
+    presentes = np.flatnonzero(np.bincount(codigos_ajuste, minlength=len(categorias)))
+    mapa = np.full(len(categorias), -1, dtype=np.int64)
+    mapa[presentes] = np.arange(len(presentes))
+    codigos = mapa[codigos]
+    categorias = categorias[presentes]
+
+    if PERFILES[perfil]['categoricas'] == 'ordinal':
+        # Categorías no vistas en el ajuste: -1, como unknown_value del OrdinalEncoder
+        codificado = codigos.astype(DTYPE).reshape(-1, 1)
+    else:
+        validos = codigos >= 0
+        indptr = np.concatenate([[0], np.cumsum(validos)])
+        codificado = sparse.csr_matrix(
+            (np.ones(int(validos.sum()), dtype=DTYPE), codigos[validos], indptr),
+            shape=(len(codigos), len(categorias))
+        )
+    codificador = crear_codificador_categorico(perfil, [categorias]).fit(pd.DataFrame({columna: categorias}))
+    return ConversorColumna('cat'), codificador, codificado
+
+
+def _paso_numerico(valores, origen, perfil, filas_ajuste):
+    """Imputación por mediana y conversión/escalado del perfil, ajustados con las filas de ajuste"""
+    valores = valores.reshape(-1, 1)
+    valores_ajuste = valores if filas_ajuste is None else valores[filas_ajuste]
+    imputador = SimpleImputer(strategy='median', keep_empty_features=True).fit(valores_ajuste)
+    transformador = crear_transformador_numerico(perfil).fit(imputador.transform(valores_ajuste))
+    codificado = np.ascontiguousarray(transformador.transform(imputador.transform(valores)), dtype=DTYPE)
+    return ConversorColumna('num', origen), Pipeline([('imputar', imputador), ('perfil', transformador)]), codificado
+
+
+class CodificadorPorColumnas(BaseEstimator, TransformerMixin):
+    """
+    Preprocesador formado por un transformador ajustado por columna.
+
+    Es el preprocesador que retornan los modelos cuando su matriz sale del
+    almacén: transforma DataFrames nuevos igual que la matriz de
+    entrenamiento, sin depender del almacén.
+    """
+
+    def __init__(self, transformadores=None, sparse_threshold=0.0):
+        self.transformadores = transformadores
+        self.sparse_threshold = sparse_threshold
+
+    def fit(self, X, y=None):
+        self.transformadores_ = [(col, clone(t).fit(X[[col]])) for col, t in self.transformadores]
+        self.feature_names_in_ = np.asarray([col for col, _ in self.transformadores], dtype=object)
+        return self
+
+    def transform(self, X):
+        return apilar_bloques([t.transform(X[[col]]) for col, t in self.transformadores_], self.sparse_threshold)
+
+    def get_feature_names_out(self, input_features=None):
+        return np.concatenate([t.get_feature_names_out() for _, t in self.transformadores_])
+
+
+class AlmacenCaracteristicas:
+    """
+    Caché de bloques base y codificados del dataset de la sesión.
+    """
+
+    def __init__(self, tamano_maximo_mb=TAMANO_MAXIMO_MB):
+        self.tamano_maximo = tamano_maximo_mb * 1024 * 1024
+        self._bloques = OrderedDict()
+        self._bytes = 0
+        self._datos = None
+        self._huella = None
+        self.aciertos = 0
+        self.fallos = 0
+
+    def asignar_datos(self, df, huella):
+        """
+        Asigna el dataset sobre el que se resuelven las filas de cada modelo.
+
+        Args:
+            df: Dataset de la sesión
+            huella: Huella de su contenido completo, calculada una sola vez
+                al cargarlo (ver data_utils.content_fingerprint). Los bloques
+                de otros datasets quedan en la caché hasta ser descartados.
+        """
+        self._datos = df
+        self._huella = huella
+
+    def _guardar(self, clave, entrada, nbytes):
+        self._bloques[clave] = (entrada, nbytes)
+        self._bytes += nbytes
+        while self._bytes > self.tamano_maximo and len(self._bloques) > 1:
+            _, (_, descartado) = self._bloques.popitem(last=False)
+            self._bytes -= descartado
+
+    def _consultar(self, clave):
+        if clave not in self._bloques:
+            return None
+        self._bloques.move_to_end(clave)
+        return self._bloques[clave][0]
+
+    def _posiciones(self, df):
+        """
+        Posiciones de las filas de df en el dataset asignado.
+
+        Returns:
+            tuple: (resueltas, posiciones); posiciones es None si df tiene
+            todas las filas del dataset en su orden
+        """
+        if self._datos is None:
+            return False, None
+        indice = self._datos.index
+        if df.index is indice or df.index.equals(indice):
+            return True, None
+        if not indice.is_unique:
+            return False, None
+        posiciones = indice.get_indexer(df.index)
+        if (posiciones < 0).any():
+            return False, None
+        return True, posiciones
+
+    def _columna_del_dataset(self, df, columna, posiciones):
+        """Comprueba que la columna de df coincide con la del dataset en esas filas"""
+        if columna not in self._datos.columns:
+            return False
+        serie, base = df[columna], self._datos[columna]
+        if serie is base:
+            return True
+        if serie.dtype != base.dtype:
+            return False
+        valores = base.array if posiciones is None else base.array.take(posiciones)
+        return serie.array.equals(valores)
+
+    def bloque(self, columna):
+        """
+        Bloque base categórico de una columna del dataset asignado (ver
+        preparar_bloque_base), calculado una sola vez por huella del dataset.
+        """
+        clave = (self._huella, columna, 'cat')
+        entrada = self._consultar(clave)
+        if entrada is None:
+            entrada = preparar_bloque_base(self._datos[columna], 'cat')
+            self._guardar(clave, entrada, _bytes_bloque(entrada[0]))
+        return entrada
+
+    def _codificar_columna(self, df, columna, rol, perfil, filas_ajuste):
+        if rol == 'cat':
+            codigos, categorias = preparar_bloque_base(df[columna], 'cat')
+            conversor, paso, codificado = _paso_categorico(columna, codigos, categorias, perfil, filas_ajuste)
+        else:
+            valores, origen = preparar_bloque_base(df[columna], 'num')
+            conversor, paso, codificado = _paso_numerico(valores, origen, perfil, filas_ajuste)
+        return Pipeline([('base', conversor.fit(df[[columna]])), ('perfil', paso)]), codificado
+
+    def codificar(self, df, cat_features, num_features, perfil, filas_ajuste=None):
+        """
+        Arma la matriz de un modelo con los bloques codificados de sus
+        columnas, reutilizando los ya calculados para las mismas filas.
+
+        Args:
+            df: DataFrame con las variables (el dataset asignado o un
+                subconjunto de sus filas)
+            cat_features: Variables categóricas
+            num_features: Variables numéricas
+            perfil: Perfil de preprocesamiento (ver preprocesamiento.PERFILES)
+            filas_ajuste: Posiciones (dentro de df) de las filas con las que se
+                ajustan las categorías, la imputación y el escalado (p. ej. las
+                de entrenamiento); por defecto todas. La matriz cubre todas las filas.
+
+        Returns:
+            tuple: (matriz float32, CodificadorPorColumnas ajustado)
+        """
+        if not cat_features and not num_features:
+            raise ValueError("No se encontraron variables válidas para procesar")
+        if perfil not in PERFILES:
+            raise ValueError(f"Perfil de preprocesamiento no soportado: {perfil}")
+
+        resueltas, posiciones = self._posiciones(df)
+        clave_filas = (_clave_filas(posiciones), _clave_filas(filas_ajuste))
+        transformadores, bloques = [], []
+        for col in cat_features + num_features:
+            rol = 'cat' if col in cat_features else 'num'
+            if not (resueltas and self._columna_del_dataset(df, col, posiciones)):
+                self.fallos += 1
+                transformador, codificado = self._codificar_columna(df, col, rol, perfil, filas_ajuste)
+            else:
+                clave = (self._huella, col, rol, perfil) + clave_filas
+                entrada = self._consultar(clave)
+                if entrada is not None:
+                    self.aciertos += 1
+                    transformador, codificado = entrada
+                else:
+                    self.fallos += 1
+                    if rol == 'cat':
+                        codigos, categorias = self.bloque(col)
+                        if posiciones is not None:
+                            codigos = codigos[posiciones]
+                        conversor, paso, codificado = _paso_categorico(col, codigos, categorias,
+                                                                       perfil, filas_ajuste)
+                        transformador = Pipeline([('base', conversor.fit(df[[col]])), ('perfil', paso)])
+                    else:
+                        transformador, codificado = self._codificar_columna(df, col, rol, perfil, filas_ajuste)
+                    self._guardar(clave, (transformador, codificado), _bytes_bloque(codificado))
+            transformadores.append((col, transformador))
+            bloques.append(codificado)
+
+        sparse_threshold = PERFILES[perfil]['sparse_threshold']
+        X = apilar_bloques(bloques, sparse_threshold)
+        codificador = CodificadorPorColumnas(transformadores, sparse_threshold)
+        codificador.transformadores_ = transformadores
+        codificador.feature_names_in_ = np.asarray(cat_features + num_features, dtype=object)
+        return X, codificador
+
+    def estadisticas(self) -> dict:
+        """Bloques guardados, memoria y columnas codificadas reutilizadas (aciertos) o calculadas (fallos)"""
+        return {
+            'bloques': len(self._bloques),
+            'mb': round(self._bytes / 1024 / 1024, 2),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos
+        }
+
+    def limpiar(self):
+        self._bloques.clear()
+        self._bytes = 0
+        self._datos = None
+        self._huella = None
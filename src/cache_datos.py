@@ -0,0 +1,247 @@
+# Este módulo está alineado y documentado según la arquitectura conceptual ubicada en:
+# C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
+"""
+Caché columnar (Parquet) para los archivos de datos del proyecto.
+
+La primera carga de un archivo Excel/CSV se guarda como Parquet junto con su
+huella (ruta, fecha de modificación, tamaño y hash del contenido). Las cargas
+posteriores leen directamente el archivo columnar, opcionalmente mapeado en
+memoria, sin volver a interpretar el libro de Excel.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (motor de Parquet)
+    PARQUET_DISPONIBLE = True
+except ImportError:
+    PARQUET_DISPONIBLE = False
+
+# Directorio donde se guardan los archivos de caché
+CACHE_DIR = os.path.join('data', '.cache')
+# Tamaño de bloque usado para calcular el hash del contenido
+TAMANO_BLOQUE_HASH = 1024 * 1024
+
+
+def huella_archivo(ruta: str) -> dict:
+    """
+    Calcula la huella de un archivo de datos.
+
+    Args:
+        ruta: Ruta del archivo fuente
+
+    Returns:
+        dict: Ruta absoluta, fecha de modificación, tamaño y hash del contenido
+    """
+    info = os.stat(ruta)
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+            hasher.update(bloque)
+
+    return {
+        'ruta': os.path.abspath(ruta),
+        'mtime_ns': info.st_mtime_ns,
+        'tamano': info.st_size,
+        'hash': hasher.hexdigest()
+    }
+
+
+def rutas_cache(ruta: str, cache_dir: str = None) -> tuple:
+    """
+    Retorna las rutas del archivo Parquet y de su metadato para una fuente dada.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    ruta_abs = os.path.abspath(ruta)
+    nombre = os.path.splitext(os.path.basename(ruta_abs))[0]
+    clave = hashlib.sha1(ruta_abs.encode('utf-8')).hexdigest()[:12]
+    base = os.path.join(cache_dir, f"{nombre}-{clave}")
+    return base + '.parquet', base + '.json'
+
+
+def ruta_hashes(ruta: str, cache_dir: str = None) -> str:
+    """Ruta del archivo con los hashes por fila, junto al Parquet de la fuente"""
+    ruta_parquet, _ = rutas_cache(ruta, cache_dir)
+    return ruta_parquet[:-len('.parquet')] + '.hashes.npz'
+
+
+def guardar_hashes(ruta: str, hashes: np.ndarray, huella_fuente: str, cache_dir: str = None):
+    """
+    Guarda los hashes por fila de la última carga de una fuente junto con el
+    hash del contenido del archivo del que se calcularon.
+    """
+    destino = ruta_hashes(ruta, cache_dir)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+
+    def _escribir(tmp):
+        with open(tmp, 'wb') as f:
+            np.savez(f, hashes=np.asarray(hashes, dtype=np.uint64), huella=np.array(huella_fuente))
+
+    _escribir_atomico(destino, _escribir)
+
+
+def cargar_hashes(ruta: str, cache_dir: str = None):
+    """
+    Hashes por fila guardados en la última carga y hash del contenido de la
+    fuente de la que se calcularon: (hashes, huella) o None si no existen.
+    """
+    try:
+        with np.load(ruta_hashes(ruta, cache_dir)) as guardado:
+            return guardado['hashes'], str(guardado['huella'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def ruta_sketches(ruta: str, cache_dir: str = None) -> str:
+    """Ruta del archivo con los sketches de columnas categóricas de la fuente"""
+    ruta_parquet, _ = rutas_cache(ruta, cache_dir)
+    return ruta_parquet[:-len('.parquet')] + '.sketches.joblib'
+
+
+def guardar_sketches(ruta: str, sketches: dict, huella_fuente: str, cache_dir: str = None):
+    """
+    Guarda los sketches categóricos construidos en la última carga junto con
+    el hash del contenido del archivo del que se construyeron.
+    """
+    destino = ruta_sketches(ruta, cache_dir)
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    guardado = {'huella': huella_fuente, 'sketches': sketches}
+    _escribir_atomico(destino, lambda tmp: joblib.dump(guardado, tmp))
+
+
+def cargar_sketches(ruta: str, cache_dir: str = None):
+    """
+    Sketches categóricos guardados en la última carga y hash del contenido de
+    la fuente de la que se construyeron: (sketches, huella) o None si no existen.
+    """
+    try:
+        guardado = joblib.load(ruta_sketches(ruta, cache_dir))
+        return guardado['sketches'], guardado['huella']
+    except Exception:
+        return None
+
+
+def _leer_meta(ruta_meta: str):
+    try:
+        with open(ruta_meta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _escribir_atomico(ruta_destino: str, escribir):
+    """Escribe en un archivo temporal y lo renombra para evitar cachés a medio escribir"""
+    ruta_tmp = f"{ruta_destino}.{os.getpid()}.tmp"
+    try:
+        escribir(ruta_tmp)
+        os.replace(ruta_tmp, ruta_destino)
+    finally:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+
+
+def guardar_cache(df: pd.DataFrame, ruta: str, huella: dict, cache_dir: str = None):
+    """
+    Guarda un DataFrame como Parquet junto con la huella de su archivo fuente.
+    """
+    ruta_parquet, ruta_meta = rutas_cache(ruta, cache_dir)
+    os.makedirs(os.path.dirname(ruta_parquet), exist_ok=True)
+
+    _escribir_atomico(ruta_parquet, lambda tmp: df.to_parquet(tmp, engine='pyarrow', index=False))
+
+    def _escribir_meta(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(huella, f, indent=2)
+
+    _escribir_atomico(ruta_meta, _escribir_meta)
+
+
+def cargar_con_cache(ruta: str, cargador, memory_map: bool = True, cache_dir: str = None):
+    """
+    Carga un archivo usando la caché Parquet cuando su huella no ha cambiado.
+
+    Args:
+        ruta: Ruta del archivo fuente (Excel o CSV)
+        cargador: Función que recibe la ruta y retorna el DataFrame ya normalizado
+        memory_map: Si es True, el Parquet se lee mapeado en memoria
+        cache_dir: Directorio de caché (por defecto CACHE_DIR)
+
+    Returns:
+        tuple: (DataFrame, dict con el estado de la caché y los tiempos de carga)
+    """
+    inicio = time.perf_counter()
+
+    if not PARQUET_DISPONIBLE:
+        df = cargador(ruta)
+        return df, {
+            'cache': 'desactivada',
+            'segundos': time.perf_counter() - inicio,
+            'motivo': 'pyarrow no está instalado'
+        }
+
+    ruta_parquet, ruta_meta = rutas_cache(ruta, cache_dir)
+    huella = huella_archivo(ruta)
+    segundos_huella = time.perf_counter() - inicio
+
+    if _leer_meta(ruta_meta) == huella and os.path.exists(ruta_parquet):
+        try:
+            df = pd.read_parquet(ruta_parquet, engine='pyarrow', memory_map=memory_map)
+            return df, {
+                'cache': 'hit',
+                'segundos': time.perf_counter() - inicio,
+                'segundos_huella': segundos_huella,
+                'ruta_cache': ruta_parquet,
+                'huella_fuente': huella['hash']
+            }
+        except Exception:
+            # Caché corrupta: se regenera a partir del archivo fuente
+            pass
+
+    df = cargador(ruta)
+    segundos_lectura = time.perf_counter() - inicio - segundos_huella
+
+    info = {
+        'cache': 'miss',
+        'segundos_huella': segundos_huella,
+        'segundos_lectura': segundos_lectura,
+        'ruta_cache': ruta_parquet,
+        'huella_fuente': huella['hash']
+    }
+    try:
+        guardar_cache(df, ruta, huella, cache_dir)
+    except Exception as e:
+        # Columnas no representables en Parquet: se sigue sin caché
+        info['cache'] = 'error'
+        info['motivo'] = str(e)
+
+    info['segundos'] = time.perf_counter() - inicio
+    return df, info
+
+
+def describir_carga(info: dict) -> str:
+    """Texto breve con el estado de la caché para mostrar en la interfaz"""
+    if not info:
+        return ""
+    etiquetas = {
+        'hit': '⚡ Caché columnar (hit)',
+        'miss': '🐢 Lectura completa (miss, caché actualizada)',
+        'error': '⚠️ Lectura completa (no se pudo guardar la caché)',
+        'desactivada': 'ℹ️ Caché desactivada'
+    }
+    texto = f"{etiquetas.get(info.get('cache'), info.get('cache'))} en {info.get('segundos', 0):.2f}s"
+    if 'motivo' in info:
+        texto += f" — {info['motivo']}"
+    cambios = info.get('cambios')
+    if cambios:
+        texto += (f" — {cambios['new_or_modified']} filas nuevas o modificadas y "
+                  f"{cambios['removed']} eliminadas desde la última carga")
+    for aviso in info.get('avisos', ()):
+        texto += f" — ⚠️ {aviso}"
+    return texto
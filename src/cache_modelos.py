@@ -0,0 +1,113 @@
+# Este módulo está alineado y documentado según la arquitectura conceptual ubicada en:
+# C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
+"""
+Caché en disco de modelos entrenados.
+
+Cada artefacto (modelo, preprocesador y métricas) se guarda con joblib bajo una
+clave derivada de la huella del dataset, las variables usadas y los
+hiperparámetros. El directorio tiene un tamaño máximo: al superarlo se
+eliminan los artefactos usados menos recientemente (LRU por fecha de acceso).
+"""
+
+import hashlib
+import json
+import os
+
+import joblib
+import sklearn
+
+try:
+    from .cache_datos import CACHE_DIR
+except ImportError:
+    from cache_datos import CACHE_DIR
+
+# Directorio de artefactos de modelos
+MODELOS_CACHE_DIR = os.path.join(CACHE_DIR, 'modelos')
+# Tamaño máximo del directorio de artefactos
+TAMANO_MAXIMO_MB = 200
+
+
+def clave_modelo(nombre: str, huella_datos: str, variables, hiperparametros: dict) -> str:
+    """
+    Construye la clave de un artefacto de modelo.
+
+    Args:
+        nombre: Nombre del modelo (p. ej. 'regresion')
+        huella_datos: Huella del DataFrame de entrenamiento
+        variables: Variables usadas por el modelo
+        hiperparametros: Hiperparámetros del modelo y del entrenamiento
+
+    Returns:
+        str: Clave hexadecimal
+    """
+    contenido = json.dumps({
+        'modelo': nombre,
+        'datos': huella_datos,
+        'variables': list(variables),
+        'hiperparametros': hiperparametros,
+        # Los artefactos de joblib no son portables entre versiones de scikit-learn
+        'sklearn': sklearn.__version__
+    }, sort_keys=True, default=str)
+    return f"{nombre}-{hashlib.sha1(contenido.encode('utf-8')).hexdigest()}"
+
+
+def _ruta_artefacto(clave: str, cache_dir: str = None) -> str:
+    return os.path.join(cache_dir or MODELOS_CACHE_DIR, f"{clave}.joblib")
+
+
+def cargar_artefacto(clave: str, cache_dir: str = None):
+    """
+    Carga un artefacto de la caché.
+
+    Returns:
+        El artefacto guardado, o None si no existe o no se puede leer
+    """
+    ruta = _ruta_artefacto(clave, cache_dir)
+    if not os.path.exists(ruta):
+        return None
+    try:
+        artefacto = joblib.load(ruta)
+    except Exception:
+        return None
+    # Marcar como usado recientemente para la política LRU
+    os.utime(ruta, None)
+    return artefacto
+
+
+def _desalojar(cache_dir: str, tamano_maximo_mb: float):
+    """Elimina los artefactos menos usados hasta quedar bajo el tamaño máximo"""
+    artefactos = []
+    for nombre in os.listdir(cache_dir):
+        if nombre.endswith('.joblib'):
+            ruta = os.path.join(cache_dir, nombre)
+            info = os.stat(ruta)
+            artefactos.append((info.st_mtime, info.st_size, ruta))
+
+    total = sum(tamano for _, tamano, _ in artefactos)
+    limite = tamano_maximo_mb * 1024 * 1024
+    for _, tamano, ruta in sorted(artefactos):
+        if total <= limite:
+            break
+        try:
+            os.remove(ruta)
+            total -= tamano
+        except OSError:
+            continue
+
+
+def guardar_artefacto(clave: str, artefacto, cache_dir: str = None,
+                      tamano_maximo_mb: float = TAMANO_MAXIMO_MB):
+    """
+    Guarda un artefacto en la caché y aplica el límite de tamaño.
+    """
+    cache_dir = cache_dir or MODELOS_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    ruta = _ruta_artefacto(clave, cache_dir)
+    ruta_tmp = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        joblib.dump(artefacto, ruta_tmp)
+        os.replace(ruta_tmp, ruta)
+    finally:
+        if os.path.exists(ruta_tmp):
+            os.remove(ruta_tmp)
+    _desalojar(cache_dir, tamano_maximo_mb)
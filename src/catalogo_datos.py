@@ -0,0 +1,195 @@
+# Este módulo está alineado y documentado según la arquitectura conceptual ubicada en:
+# C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
+"""
+Catálogo ligero de datasets.
+
+Obtiene número de registros, nombres de columnas y tipos de datos leyendo solo
+las cabeceras de los archivos (etiqueta <dimension> de los .xlsx, pie de los
+.parquet, primeras filas de los .csv) y guarda el resultado en un manifiesto
+JSON. Mientras el archivo no cambie (fecha de modificación y tamaño), la
+consulta al catálogo no vuelve a abrir el archivo. Las entradas de archivos
+que ya no existen se eliminan del manifiesto al actualizarlo.
+
+El número de registros de los .xlsx sale de la etiqueta <dimension>, que
+algunos programas dejan desactualizada: en ese caso 'registros_exactos' es
+False y el conteo debe tomarse como estimación.
+"""
+
+import csv
+import json
+import os
+
+import pandas as pd
+
+try:
+    from .cache_datos import CACHE_DIR
+except ImportError:
+    from cache_datos import CACHE_DIR
+
+# Manifiesto con los metadatos de los datasets conocidos
+MANIFIESTO_PATH = os.path.join(CACHE_DIR, 'catalogo.json')
+# Filas leídas para inferir los tipos de datos
+FILAS_MUESTRA_TIPOS = 100
+TAMANO_BLOQUE_LINEAS = 1024 * 1024
+
+
+def _tipos_muestra(df_muestra: pd.DataFrame) -> dict:
+    return {col: str(dtype) for col, dtype in df_muestra.dtypes.items()}
+
+
+def _metadatos_xlsx(ruta: str) -> dict:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        filas = ws.iter_rows(values_only=True)
+        columnas = [str(c) for c in next(filas, ())]
+        muestra = [fila for _, fila in zip(range(FILAS_MUESTRA_TIPOS), filas)]
+
+        # En modo solo lectura max_row proviene de la etiqueta <dimension>
+        max_row = ws.max_row
+        exactos = False
+        if max_row is None or max_row - 1 < len(muestra):
+            # Sin dimensión declarada o contradicha por la muestra: contar filas en streaming
+            max_row = 1 + len(muestra) + sum(1 for _ in filas)
+            exactos = True
+        registros = max(max_row - 1, 0)
+    finally:
+        wb.close()
+
+    df_muestra = pd.DataFrame(muestra, columns=columnas).infer_objects()
+    return {
+        'registros': registros,
+        'registros_exactos': exactos,
+        'columnas': columnas,
+        'tipos': _tipos_muestra(df_muestra)
+    }
+
+
+def _contar_registros_csv(ruta: str) -> int:
+    """
+    Cuenta los registros de un CSV (sin la cabecera).
+
+    Cuenta saltos de línea en binario, sin interpretar el CSV; solo si el
+    archivo contiene comillas (un campo entrecomillado puede contener saltos
+    de línea) se recuenta con el lector csv, que sí los respeta.
+    """
+    lineas = 0
+    ultimo = b'\n'
+    comillas = False
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(TAMANO_BLOQUE_LINEAS), b''):
+            lineas += bloque.count(b'\n')
+            comillas = comillas or b'"' in bloque
+            ultimo = bloque[-1:]
+    if ultimo != b'\n':
+        lineas += 1
+
+    if comillas:
+        with open(ruta, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            lineas = sum(1 for fila in csv.reader(f) if fila)
+    return max(lineas - 1, 0)
+
+
+def _metadatos_csv(ruta: str) -> dict:
+    df_muestra = pd.read_csv(ruta, nrows=FILAS_MUESTRA_TIPOS)
+    return {
+        'registros': _contar_registros_csv(ruta),
+        'registros_exactos': True,
+        'columnas': [str(c) for c in df_muestra.columns],
+        'tipos': _tipos_muestra(df_muestra)
+    }
+
+
+def _metadatos_parquet(ruta: str) -> dict:
+    import pyarrow.parquet as pq
+
+    archivo = pq.ParquetFile(ruta)
+    esquema = archivo.schema_arrow
+    return {
+        'registros': archivo.metadata.num_rows,
+        'registros_exactos': True,
+        'columnas': list(esquema.names),
+        'tipos': {campo.name: str(campo.type) for campo in esquema}
+    }
+
+
+def leer_metadatos(ruta: str) -> dict:
+    """
+    Lee los metadatos de un archivo sin cargar sus datos completos.
+
+    Args:
+        ruta: Ruta del archivo (.xlsx, .csv o .parquet)
+
+    Returns:
+        dict: Registros, columnas y tipos de datos del archivo
+    """
+    if ruta.endswith('.xlsx'):
+        return _metadatos_xlsx(ruta)
+    if ruta.endswith('.parquet'):
+        return _metadatos_parquet(ruta)
+    if ruta.endswith('.csv'):
+        return _metadatos_csv(ruta)
+    raise ValueError(f"Formato de archivo no soportado: {ruta}")
+
+
+def _cargar_manifiesto(ruta_manifiesto: str) -> dict:
+    try:
+        with open(ruta_manifiesto, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _podar_manifiesto(manifiesto: dict) -> dict:
+    """Elimina las entradas de archivos que ya no existen (borrados o renombrados)"""
+    return {clave: entrada for clave, entrada in manifiesto.items() if os.path.exists(clave)}
+
+
+def _guardar_manifiesto(manifiesto: dict, ruta_manifiesto: str):
+    os.makedirs(os.path.dirname(ruta_manifiesto) or '.', exist_ok=True)
+    ruta_tmp = f"{ruta_manifiesto}.{os.getpid()}.tmp"
+    with open(ruta_tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, indent=2, ensure_ascii=False)
+    os.replace(ruta_tmp, ruta_manifiesto)
+
+
+def obtener_metadatos(ruta: str, ruta_manifiesto: str = None) -> dict:
+    """
+    Retorna los metadatos de un archivo usando el manifiesto como caché.
+
+    Args:
+        ruta: Ruta del archivo de datos
+        ruta_manifiesto: Ruta del manifiesto JSON (por defecto MANIFIESTO_PATH)
+
+    Returns:
+        dict: Registros (y si el conteo es exacto), columnas, tipos, tamaño
+        en MB y ruta del archivo
+    """
+    ruta_manifiesto = ruta_manifiesto or MANIFIESTO_PATH
+    info = os.stat(ruta)
+    clave = os.path.abspath(ruta)
+
+    manifiesto = _cargar_manifiesto(ruta_manifiesto)
+    entrada = manifiesto.get(clave)
+    if (entrada is None or entrada.get('mtime_ns') != info.st_mtime_ns
+            or entrada.get('tamano') != info.st_size):
+        entrada = leer_metadatos(ruta)
+        entrada.update(mtime_ns=info.st_mtime_ns, tamano=info.st_size)
+        manifiesto = _podar_manifiesto(manifiesto)
+        manifiesto[clave] = entrada
+        try:
+            _guardar_manifiesto(manifiesto, ruta_manifiesto)
+        except OSError:
+            # Sin permisos de escritura: el catálogo funciona sin persistir
+            pass
+
+    return {
+        'registros': entrada['registros'],
+        'registros_exactos': entrada.get('registros_exactos', True),
+        'columnas': entrada['columnas'],
+        'tipos': entrada['tipos'],
+        'ruta': ruta,
+        'tamaño_mb': round(info.st_size / 1024 / 1024, 2)
+    }
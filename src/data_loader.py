@@ -2,10 +2,11 @@
 # C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
 
 import pandas as pd
+import numpy as np
 import streamlit as st
-from typing import Optional
 import os
 import sys
+import time
 
 # Asegurar que podamos importar desde el directorio src
 try:
@@ -17,16 +18,47 @@ except ImportError:
         sys.path.insert(0, current_dir)
     from dataset_generator import SupermarketDatasetGenerator
 
+try:
+    from .cache_datos import (cargar_con_cache, describir_carga, cargar_hashes, guardar_hashes,
+                              cargar_sketches, guardar_sketches)
+    from .catalogo_datos import obtener_metadatos
+    from .data_utils import (compact_dtypes, build_row_index, register_row_index, compare_row_hashes,
+                             register_column_sketches, infer_datetime_formats, parse_datetime_column,
+                             CATEGORY_MAX_RATIO, DATETIME_COLUMNS, NULL_TOKENS)
+    from .perfil_eda import columnas_categoricas
+    from .sketches_categoricos import actualizar_sketches, obtener_sketches
+except ImportError:
+    from cache_datos import (cargar_con_cache, describir_carga, cargar_hashes, guardar_hashes,
+                             cargar_sketches, guardar_sketches)
+    from catalogo_datos import obtener_metadatos
+    from data_utils import (compact_dtypes, build_row_index, register_row_index, compare_row_hashes,
+                            register_column_sketches, infer_datetime_formats, parse_datetime_column,
+                            CATEGORY_MAX_RATIO, DATETIME_COLUMNS, NULL_TOKENS)
+    from perfil_eda import columnas_categoricas
+    from sketches_categoricos import actualizar_sketches, obtener_sketches
+
 # Ruta principal del dataset
 DATASET_PATH = 'data/supermarket_sales.xlsx'
 DATASET_BACKUP_PATH = 'data/test_supermarket_data.csv'
 
-def cargar_datos(archivo_subido=None):
+# Estado de la última carga desde disco (caché hit/miss y tiempos)
+ULTIMA_CARGA = {}
+
+# Filas por bloque en el modo de ingesta por streaming
+TAMANO_BLOQUE = 100_000
+# Margen sobre CATEGORY_MAX_RATIO con el que la cardinalidad estimada por los
+# sketches basta para dejar una columna como texto sin contar sus valores únicos
+MARGEN_CARDINALIDAD = 0.1
+
+def cargar_datos(archivo_subido=None, modo_streaming=False, tamano_bloque=TAMANO_BLOQUE):
     """
     Carga datos desde el dataset de supermercado o archivo subido.
     
     Args:
         archivo_subido: Archivo subido por el usuario (opcional)
+        modo_streaming: Si es True, lee el archivo por bloques de tamaño fijo
+            para acotar el pico de memoria
+        tamano_bloque: Filas por bloque en el modo streaming
     
     Returns:
         pandas.DataFrame: Dataset cargado
@@ -34,7 +66,9 @@ def cargar_datos(archivo_subido=None):
     if archivo_subido:
         # Cargar archivo subido por el usuario
         try:
-            if archivo_subido.name.endswith('.xlsx'):
+            if modo_streaming and archivo_subido.name.endswith(('.xlsx', '.csv')):
+                df = cargar_por_bloques(archivo_subido, tamano_bloque)
+            elif archivo_subido.name.endswith('.xlsx'):
                 df = pd.read_excel(archivo_subido)
             elif archivo_subido.name.endswith('.csv'):
                 df = pd.read_csv(archivo_subido)
@@ -50,16 +84,18 @@ def cargar_datos(archivo_subido=None):
     
     # Intentar cargar el dataset principal
     if os.path.exists(DATASET_PATH):
-        df = _cargar_archivo(DATASET_PATH)
+        df = _cargar_archivo(DATASET_PATH, modo_streaming=modo_streaming, tamano_bloque=tamano_bloque)
         if df is not None:
             st.info(f"📊 Dataset principal cargado: {len(df)} registros")
+            st.caption(describir_carga(ULTIMA_CARGA))
             return df
     
     # Si no existe el principal, usar el backup
     if os.path.exists(DATASET_BACKUP_PATH):
-        df = _cargar_archivo(DATASET_BACKUP_PATH)
+        df = _cargar_archivo(DATASET_BACKUP_PATH, modo_streaming=modo_streaming, tamano_bloque=tamano_bloque)
         if df is not None:
             st.warning(f"📋 Usando dataset de respaldo: {len(df)} registros")
+            st.caption(describir_carga(ULTIMA_CARGA))
             return df
     
     # Como último recurso, generar datos sintéticos
@@ -73,36 +109,438 @@ def cargar_datos(archivo_subido=None):
         st.error(f"❌ Error generando datos sintéticos: {e}")
         return None
 
-def _cargar_archivo(ruta: str):
-    """Carga un archivo específico con manejo de errores y optimización de tipos"""
+def _cargar_archivo(ruta: str, usar_cache: bool = True, memory_map: bool = True,
+                    modo_streaming: bool = False, tamano_bloque: int = TAMANO_BLOQUE,
+                    ruta_manifiesto: str = None):
+    """
+    Carga un archivo específico con manejo de errores y optimización de tipos.
+    
+    Las cargas se sirven desde la caché columnar (Parquet) mientras el archivo
+    fuente no cambie; el estado de la caché y los tiempos quedan en ULTIMA_CARGA.
+    En modo streaming el archivo fuente se lee por bloques. Con caché se
+    construyen además el índice de hashes por fila (ver _indexar_filas) y los
+    sketches de las columnas categóricas (ver _indexar_categoricas).
+    `ruta_manifiesto` es el manifiesto del catálogo usado en modo streaming
+    (por defecto el del proyecto).
+    """
+    if modo_streaming:
+        lector = lambda r: cargar_por_bloques(r, tamano_bloque, ruta_manifiesto)
+    else:
+        lector = _leer_archivo
+    
     try:
-        if ruta.endswith('.xlsx'):
-            df = pd.read_excel(ruta)
-        elif ruta.endswith('.csv'):
-            df = pd.read_csv(ruta)
+        if usar_cache:
+            df, info = cargar_con_cache(ruta, lector, memory_map=memory_map)
+            info['cambios'] = _indexar_filas(ruta, df, info)
+            _indexar_categoricas(ruta, df, info)
         else:
-            # Auto-detectar formato
-            try:
-                df = pd.read_excel(ruta)
-            except:
-                df = pd.read_csv(ruta)
-        
-        # Optimizar tipos de datos para evitar problemas de PyArrow
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                # Mantener strings como strings optimizados
-                df[col] = df[col].astype(str)
-            elif pd.api.types.is_integer_dtype(df[col]):
-                df[col] = df[col].astype('int64')
-            elif pd.api.types.is_float_dtype(df[col]):
-                df[col] = df[col].astype('float64')
+            inicio = time.perf_counter()
+            df = lector(ruta)
+            info = {'cache': 'desactivada', 'segundos': time.perf_counter() - inicio}
         
+        ULTIMA_CARGA.clear()
+        ULTIMA_CARGA.update(info, ruta=ruta)
         return df
         
     except Exception as e:
         st.error(f"Error al cargar {ruta}: {e}")
         return None
 
+def _indexar_filas(ruta: str, df, info: dict, cache_dir: str = None):
+    """
+    Construye el índice de hashes por fila del DataFrame cargado y lo guarda
+    junto a la caché columnar.
+    
+    Los hashes guardados solo se reutilizan con caché hit y si se calcularon
+    a partir del mismo contenido de la fuente (info['huella_fuente']); en
+    cualquier otro caso se recalculan y se comparan con los de la carga
+    anterior antes de reemplazarlos. Si no se pueden guardar, el motivo queda
+    en info['avisos'].
+    
+    Returns:
+        dict o None: Filas nuevas/modificadas y eliminadas desde la última carga
+    """
+    huella_fuente = info.get('huella_fuente')
+    guardado = cargar_hashes(ruta, cache_dir)
+    anteriores, huella_anterior = guardado if guardado is not None else (None, None)
+    if (info.get('cache') == 'hit' and huella_fuente is not None
+            and huella_anterior == huella_fuente and len(anteriores) == len(df)):
+        register_row_index(df, build_row_index(df, hashes=anteriores))
+        return None
+    
+    indice = build_row_index(df)
+    register_row_index(df, indice)
+    if huella_fuente is not None:
+        try:
+            guardar_hashes(ruta, indice['hashes'], huella_fuente, cache_dir)
+        except OSError as e:
+            info.setdefault('avisos', []).append(f"no se pudo guardar el índice de filas: {e}")
+    if anteriores is None:
+        return None
+    return compare_row_hashes(anteriores, indice['hashes'])
+
+def _indexar_categoricas(ruta: str, df, info: dict, cache_dir: str = None):
+    """
+    Registra los sketches de las columnas categóricas del DataFrame cargado y
+    los guarda junto a la caché columnar.
+    
+    Los sketches guardados solo se reutilizan con caché hit y si se
+    construyeron a partir del mismo contenido de la fuente
+    (info['huella_fuente']); si no, se usan los construidos durante la
+    lectura por bloques o se construyen ahora.
+    """
+    huella_fuente = info.get('huella_fuente')
+    if info.get('cache') == 'hit' and huella_fuente is not None:
+        guardados = cargar_sketches(ruta, cache_dir)
+        if guardados is not None and guardados[1] == huella_fuente:
+            register_column_sketches(df, guardados[0])
+            return
+    
+    sketches = obtener_sketches(df, columnas_categoricas(df))
+    if huella_fuente is None:
+        return
+    try:
+        guardar_sketches(ruta, sketches, huella_fuente, cache_dir)
+    except OSError as e:
+        info.setdefault('avisos', []).append(f"no se pudieron guardar los sketches categóricos: {e}")
+
+def _leer_archivo(ruta: str):
+    """Lee el archivo fuente y normaliza sus tipos de datos"""
+    if ruta.endswith('.xlsx'):
+        df = pd.read_excel(ruta)
+    elif ruta.endswith('.csv'):
+        df = pd.read_csv(ruta)
+    else:
+        # Auto-detectar formato
+        try:
+            df = pd.read_excel(ruta)
+        except:
+            df = pd.read_csv(ruta)
+    
+    return _compactar_tipos(_normalizar_tipos(df))
+
+def _normalizar_tipos(df):
+    """Convierte columnas de tipo mixto a texto para evitar problemas de PyArrow"""
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].astype(str)
+    
+    return df
+
+def _compactar_tipos(df):
+    """Aplica el planificador de tipos compactos (categorías, downcast, fechas nativas)"""
+    df, _ = compact_dtypes(df)
+    return df
+
+def _nombre_fuente(fuente):
+    """Nombre de archivo de una ruta o de un archivo subido"""
+    return fuente if isinstance(fuente, str) else getattr(fuente, 'name', '')
+
+def leer_por_bloques(fuente, tamano_bloque: int = TAMANO_BLOQUE):
+    """
+    Lee un archivo CSV o XLSX por bloques de tamaño fijo.
+    
+    Los CSV se leen con `chunksize` y los XLSX en modo solo lectura fila a fila,
+    de forma que nunca se materializa más de un bloque a la vez. Cada bloque
+    se normaliza con `_normalizar_tipos`.
+    
+    Args:
+        fuente: Ruta o archivo subido (.csv o .xlsx)
+        tamano_bloque: Número de filas por bloque
+    
+    Yields:
+        pandas.DataFrame: Bloques de como máximo `tamano_bloque` filas
+    """
+    nombre = _nombre_fuente(fuente)
+    
+    if nombre.endswith('.csv'):
+        for bloque in pd.read_csv(fuente, chunksize=tamano_bloque):
+            yield _normalizar_tipos(bloque)
+    
+    elif nombre.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        
+        wb = load_workbook(fuente, read_only=True, data_only=True)
+        try:
+            filas = wb.worksheets[0].iter_rows(values_only=True)
+            columnas = [str(c) for c in next(filas, ())]
+            pendientes = []
+            for fila in filas:
+                pendientes.append(list(fila))
+                if len(pendientes) == tamano_bloque:
+                    yield _normalizar_tipos(_parsear_filas_excel(pendientes, columnas))
+                    pendientes = []
+            if pendientes:
+                yield _normalizar_tipos(_parsear_filas_excel(pendientes, columnas))
+        finally:
+            wb.close()
+    
+    else:
+        raise ValueError(f"Formato no soportado para lectura por bloques: {nombre}")
+
+def _parsear_filas_excel(filas, columnas):
+    """Convierte filas crudas de openpyxl en DataFrame con la misma inferencia que read_excel"""
+    from pandas.io.parsers import TextParser
+    return TextParser(filas, names=columnas).read()
+
+def _bloque_compacto(valores: np.ndarray) -> np.ndarray:
+    """Downcast de un bloque numérico con las reglas del planificador de tipos"""
+    if valores.dtype.kind in 'iu':
+        return pd.to_numeric(valores, downcast='integer')
+    if valores.dtype == np.float64 and _sin_perdida_float32(valores):
+        return valores.astype(np.float32)
+    return valores
+
+def _sin_perdida_float32(valores: np.ndarray) -> bool:
+    return np.array_equal(valores.astype(np.float32).astype(valores.dtype), valores, equal_nan=True)
+
+def _es_texto(valores: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(valores) or pd.api.types.is_string_dtype(valores)
+
+class _ColumnaNumerica:
+    """
+    Buffer preasignado de una columna numérica (o de fechas nativas).
+    
+    Cada bloque llega ya compactado (ver _bloque_compacto); si no cabe en el
+    tipo del buffer, este se promociona al tipo común más pequeño, de modo que
+    al terminar el tipo es el que el planificador elegiría para la columna
+    completa.
+    """
+    
+    def __init__(self, capacidad: int, dtype):
+        self.buffer = np.empty(capacidad, dtype=dtype)
+    
+    def admite(self, valores: np.ndarray) -> bool:
+        if valores.dtype == self.buffer.dtype:
+            return True
+        return valores.dtype.kind in 'iuf' and self.buffer.dtype.kind in 'iuf'
+    
+    def agregar(self, valores: np.ndarray, inicio: int, fin: int):
+        if valores.dtype != self.buffer.dtype:
+            comun = np.result_type(self.buffer.dtype, valores.dtype)
+            if (comun == np.float64 and valores.dtype != np.float64
+                    and _sin_perdida_float32(self.buffer[:inicio])):
+                comun = np.dtype(np.float32)
+            if comun != self.buffer.dtype:
+                self.buffer = self.buffer.astype(comun)
+        self.buffer[inicio:fin] = valores
+    
+    def crecer(self, capacidad: int, filas: int):
+        nuevo = np.empty(capacidad, dtype=self.buffer.dtype)
+        nuevo[:filas] = self.buffer[:filas]
+        self.buffer = nuevo
+    
+    def todo_nulo(self, filas: int) -> bool:
+        return self.buffer.dtype.kind == 'f' and bool(np.isnan(self.buffer[:filas]).all())
+    
+    def a_serie(self, filas: int) -> pd.Series:
+        valores = self.buffer[:filas] if filas == len(self.buffer) else self.buffer[:filas].copy()
+        self.buffer = None
+        return pd.Series(valores, copy=False)
+
+class _ColumnaCodigos:
+    """
+    Columna de texto guardada como códigos int32 y un índice de categorías
+    que crece con cada bloque.
+    
+    Al terminar es una columna 'category' (o fecha/hora en DATETIME_COLUMNS)
+    sin haber materializado nunca los textos de todas las filas.
+    """
+    
+    def __init__(self, capacidad: int, filas_previas: int = 0):
+        self.codigos = np.empty(capacidad, dtype=np.int32)
+        self.codigos[:filas_previas] = -1
+        self.indices = {}
+    
+    def agregar(self, valores: pd.Series, inicio: int, fin: int):
+        codigos, unicos = pd.factorize(valores)
+        mapa = np.fromiter((self.indices.setdefault(u, len(self.indices)) for u in unicos),
+                           dtype=np.int32, count=len(unicos))
+        # El último elemento recibe los nulos (código -1)
+        self.codigos[inicio:fin] = np.append(mapa, np.int32(-1))[codigos]
+    
+    def crecer(self, capacidad: int, filas: int):
+        nuevo = np.empty(capacidad, dtype=np.int32)
+        nuevo[:filas] = self.codigos[:filas]
+        self.codigos = nuevo
+    
+    def cardinalidad_alta(self, filas: int) -> bool:
+        return len(self.indices) > CATEGORY_MAX_RATIO * filas
+    
+    def _categorias(self) -> pd.Index:
+        return pd.Index(list(self.indices), dtype='str')
+    
+    def a_texto(self, filas: int) -> pd.Series:
+        """Textos de las filas leídas (para pasar a una columna de texto)"""
+        categorias = self._categorias().to_numpy(dtype=object)
+        valores = np.append(categorias, np.array([np.nan], dtype=object))[self.codigos[:filas]]
+        self.codigos = None
+        return pd.Series(valores, dtype='str')
+    
+    def a_serie(self, nombre: str, filas: int) -> pd.Series:
+        categorias = self._categorias()
+        codigos = self.codigos[:filas]
+        self.codigos = None
+        if nombre in DATETIME_COLUMNS:
+            # Cada categoría se interpreta una sola vez y se expande con los códigos
+            kind, formats = infer_datetime_formats(pd.Series(categorias))
+            if kind is not None:
+                fechas = parse_datetime_column(pd.Series(categorias), formats, kind)
+                # Solo se acepta si no genera nulos nuevos (como apply_dtype_plan)
+                if fechas.isna().sum() <= categorias.isin(NULL_TOKENS).sum():
+                    valores = fechas.to_numpy()
+                    valores = np.append(valores, np.array(['NaT'], dtype=valores.dtype))
+                    return pd.Series(valores[codigos], copy=False)
+        orden = categorias.argsort()
+        posicion = np.empty(len(orden) + 1, dtype=np.int32)
+        posicion[orden] = np.arange(len(orden), dtype=np.int32)
+        posicion[-1] = -1
+        return pd.Series(pd.Categorical.from_codes(posicion[codigos], categories=categorias[orden]),
+                         copy=False)
+
+class _ColumnaTexto:
+    """
+    Columna guardada como la lista de sus bloques (texto de alta cardinalidad
+    o valores de tipos mezclados); se compacta como columna completa al final.
+    """
+    
+    def __init__(self, previos: pd.Series = None):
+        self.bloques = [] if previos is None else [previos]
+    
+    def agregar(self, valores: pd.Series, inicio: int, fin: int):
+        self.bloques.append(valores.reset_index(drop=True))
+    
+    def a_serie(self, nombre: str, filas: int, sketch=None) -> pd.Series:
+        serie = pd.concat(self.bloques, ignore_index=True) if self.bloques else pd.Series(dtype='str')
+        self.bloques = None
+        if serie.dtype == 'object':
+            serie = serie.astype(str)
+        # Con una cardinalidad estimada claramente por encima del umbral de
+        # 'category' se evita contar los valores únicos de la columna completa
+        umbral = CATEGORY_MAX_RATIO * (1 + MARGEN_CARDINALIDAD) * filas
+        if sketch is not None and nombre not in DATETIME_COLUMNS and sketch.cardinalidad() > umbral:
+            return serie
+        return _compactar_tipos(serie.to_frame(nombre))[nombre]
+
+class _BuffersColumnares:
+    """
+    Columnas del dataset en construcción, llenadas bloque a bloque.
+    
+    El plan de tipos se aplica por bloque: los números se compactan al
+    llegar y el texto se guarda como códigos de categoría, de modo que nunca
+    existe una copia del dataset con los tipos de lectura. Una columna de
+    texto que supera CATEGORY_MAX_RATIO valores únicos por fila pasa a
+    guardarse como texto; una numérica que recibe texto, también.
+    """
+    
+    def __init__(self, capacidad: int):
+        self.capacidad = max(int(capacidad), 1)
+        self.filas = 0
+        self.columnas = {}
+    
+    def _crecer(self, minimo: int):
+        nueva = max(minimo, self.capacidad * 2)
+        for columna in self.columnas.values():
+            if not isinstance(columna, _ColumnaTexto):
+                columna.crecer(nueva, self.filas)
+        self.capacidad = nueva
+    
+    def _columna_para(self, columna, valores: pd.Series):
+        """Columna (nueva o convertida) capaz de recibir este bloque"""
+        if columna is None:
+            if _es_texto(valores):
+                return _ColumnaCodigos(self.capacidad)
+            return _ColumnaNumerica(self.capacidad, _bloque_compacto(valores.to_numpy()).dtype)
+        if isinstance(columna, _ColumnaNumerica):
+            if not _es_texto(valores):
+                if columna.admite(_bloque_compacto(valores.to_numpy())):
+                    return columna
+            elif columna.todo_nulo(self.filas):
+                return _ColumnaCodigos(self.capacidad, self.filas)
+            return _ColumnaTexto(columna.a_serie(self.filas))
+        return columna
+    
+    def agregar(self, bloque: pd.DataFrame):
+        inicio, fin = self.filas, self.filas + len(bloque)
+        if fin > self.capacidad:
+            self._crecer(fin)
+        
+        for nombre in bloque.columns:
+            valores = bloque[nombre]
+            columna = self._columna_para(self.columnas.get(nombre), valores)
+            if isinstance(columna, _ColumnaNumerica):
+                columna.agregar(_bloque_compacto(valores.to_numpy()), inicio, fin)
+            else:
+                if isinstance(columna, _ColumnaCodigos) and not _es_texto(valores):
+                    # Bloque sin textos (p. ej. solo nulos) en una columna de texto
+                    valores = valores.astype('str')
+                columna.agregar(valores, inicio, fin)
+                if isinstance(columna, _ColumnaCodigos) and columna.cardinalidad_alta(fin):
+                    columna = _ColumnaTexto(columna.a_texto(fin))
+            self.columnas[nombre] = columna
+        self.filas = fin
+    
+    def a_dataframe(self, sketches: dict = None) -> pd.DataFrame:
+        """
+        DataFrame final; cada buffer se libera en cuanto su columna está lista.
+        
+        `sketches` son los sketches categóricos de la ingesta, con los que se
+        estima la cardinalidad de las columnas guardadas como texto.
+        """
+        sketches = sketches or {}
+        series = {}
+        for nombre in list(self.columnas):
+            columna = self.columnas.pop(nombre)
+            if isinstance(columna, _ColumnaNumerica):
+                series[nombre] = columna.a_serie(self.filas)
+            elif isinstance(columna, _ColumnaTexto):
+                series[nombre] = columna.a_serie(nombre, self.filas, sketches.get(nombre))
+            else:
+                series[nombre] = columna.a_serie(nombre, self.filas)
+        return pd.DataFrame(series, copy=False)
+
+def cargar_por_bloques(fuente, tamano_bloque: int = TAMANO_BLOQUE, ruta_manifiesto: str = None):
+    """
+    Carga un archivo completo leyéndolo por bloques.
+    
+    Cada bloque se compacta al llegar (ver _BuffersColumnares) y se copia en
+    buffers preasignados con el número de registros del catálogo: el texto
+    de baja cardinalidad se guarda como códigos de categoría y los números
+    con el tipo más pequeño que los contiene. El resultado tiene los mismos
+    tipos que la lectura completa seguida de compact_dtypes, sin pasar nunca
+    por el DataFrame con los tipos de lectura: el pico de memoria queda en el
+    tamaño final del dataset más unos pocos bloques (en un CSV de 2 millones
+    de filas del esquema de ventas, por debajo del de pd.read_csv). Los
+    sketches de las columnas categóricas (top de categorías y cardinalidad)
+    se actualizan con cada bloque y quedan registrados para el DataFrame
+    resultante.
+    
+    Args:
+        fuente: Ruta o archivo subido (.csv o .xlsx)
+        tamano_bloque: Número de filas por bloque
+        ruta_manifiesto: Manifiesto del catálogo del que se toma el número de
+            registros (por defecto catalogo_datos.MANIFIESTO_PATH)
+    
+    Returns:
+        pandas.DataFrame: Dataset cargado
+    """
+    capacidad = tamano_bloque
+    if isinstance(fuente, str):
+        try:
+            capacidad = obtener_metadatos(fuente, ruta_manifiesto)['registros'] or tamano_bloque
+        except Exception:
+            pass
+    
+    buffers = _BuffersColumnares(capacidad)
+    sketches = {}
+    for bloque in leer_por_bloques(fuente, tamano_bloque):
+        buffers.agregar(bloque)
+        actualizar_sketches(sketches, bloque, columnas_categoricas(bloque))
+    
+    df = buffers.a_dataframe(sketches)
+    register_column_sketches(df, sketches)
+    return df
+
 def generar_dataset_automatico():
     """
     Genera automáticamente un dataset sintético para el análisis
@@ -116,88 +554,50 @@ def generar_dataset_automatico():
         st.error(f"Error al generar dataset sintético: {e}")
         return None
 
-def verificar_dataset_real():
+def _info_dataset(ruta: str, lista_columnas: bool = False):
     """
-    Verifica si el dataset principal está disponible y retorna información básica.
+    Retorna la información básica de un dataset a partir del catálogo,
+    sin leer los datos completos del archivo.
     """
-    if os.path.exists(DATASET_PATH):
-        try:
-            df = pd.read_excel(DATASET_PATH)
-            return {
-                'disponible': True,
-                'registros': len(df),
-                'columnas': list(df.columns),
-                'ruta': DATASET_PATH,
-                'tamaño_mb': round(os.path.getsize(DATASET_PATH) / 1024 / 1024, 2)
-            }
-        except Exception as e:
-            return {
-                'disponible': False,
-                'error': str(e),
-                'ruta': DATASET_PATH
-            }
-    else:
+    if not os.path.exists(ruta):
         return {
             'disponible': False,
-            'ruta': DATASET_PATH,
+            'ruta': ruta,
             'mensaje': 'Archivo no encontrado'
         }
+    
+    try:
+        metadatos = obtener_metadatos(ruta)
+        return {
+            'disponible': True,
+            'registros': metadatos['registros'],
+            'registros_exactos': metadatos['registros_exactos'],
+            'columnas': metadatos['columnas'] if lista_columnas else len(metadatos['columnas']),
+            'tipos': metadatos['tipos'],
+            'ruta': ruta,
+            'tamaño_mb': metadatos['tamaño_mb']
+        }
+    except Exception as e:
+        return {
+            'disponible': False,
+            'error': str(e),
+            'ruta': ruta
+        }
+
+def verificar_dataset_real():
+    """
+    Verifica si el dataset principal está disponible y retorna información básica.
+    """
+    return _info_dataset(DATASET_PATH, lista_columnas=True)
 
 def verificar_datasets_disponibles():
     """
     Verifica los datasets disponibles en el proyecto
     """
-    datasets_info = {}
-    
-    # Verificar dataset principal
-    if os.path.exists(DATASET_PATH):
-        try:
-            df = pd.read_excel(DATASET_PATH)
-            datasets_info['principal'] = {
-                'disponible': True,
-                'registros': len(df),
-                'columnas': len(df.columns),
-                'ruta': DATASET_PATH,
-                'tamaño_mb': round(os.path.getsize(DATASET_PATH) / 1024 / 1024, 2)
-            }
-        except Exception as e:
-            datasets_info['principal'] = {
-                'disponible': False,
-                'error': str(e),
-                'ruta': DATASET_PATH
-            }
-    else:
-        datasets_info['principal'] = {
-            'disponible': False,
-            'ruta': DATASET_PATH,
-            'mensaje': 'Archivo no encontrado'
-        }
-    
-    # Verificar dataset de respaldo
-    if os.path.exists(DATASET_BACKUP_PATH):
-        try:
-            df = pd.read_csv(DATASET_BACKUP_PATH)
-            datasets_info['respaldo'] = {
-                'disponible': True,
-                'registros': len(df),
-                'columnas': len(df.columns),
-                'ruta': DATASET_BACKUP_PATH,
-                'tamaño_mb': round(os.path.getsize(DATASET_BACKUP_PATH) / 1024 / 1024, 2)
-            }
-        except Exception as e:
-            datasets_info['respaldo'] = {
-                'disponible': False,
-                'error': str(e),
-                'ruta': DATASET_BACKUP_PATH
-            }
-    else:
-        datasets_info['respaldo'] = {
-            'disponible': False,
-            'ruta': DATASET_BACKUP_PATH,
-            'mensaje': 'Archivo no encontrado'
-        }
-    
-    return datasets_info
+    return {
+        'principal': _info_dataset(DATASET_PATH),
+        'respaldo': _info_dataset(DATASET_BACKUP_PATH)
+    }
 
 def inicializar_datasets():
     """
@@ -3,55 +3,494 @@
 Utilidades para manejo de datos y corrección de problemas de serialización
 """
 
+import hashlib
+import weakref
+from collections import OrderedDict
+
 import pandas as pd
 import numpy as np
 import streamlit as st
-from typing import Any
 
-def fix_pyarrow_serialization(df: pd.DataFrame) -> pd.DataFrame:
+# Proporción máxima de valores únicos para convertir texto en 'category'
+CATEGORY_MAX_RATIO = 0.5
+# Valores muestreados para detectar columnas de fecha/hora
+DATETIME_SAMPLE_SIZE = 200
+# Formatos explícitos candidatos (en orden de preferencia)
+DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y',
+    '%m/%d/%Y %H:%M', '%d/%m/%Y %H:%M', '%Y/%m/%d', '%d-%m-%Y'
+)
+TIME_FORMATS = ('%H:%M:%S', '%H:%M')
+# Textos que representan nulos tras convertir objetos a str
+NULL_TOKENS = ('nan', 'NaN', 'NaT', 'None', '')
+# Filas muestreadas para calcular la huella de un DataFrame
+FINGERPRINT_SAMPLE_SIZE = 1000
+# Número máximo de DataFrames optimizados que se mantienen en memoria
+OPTIMIZE_CACHE_SIZE = 4
+# Número máximo de objetos DataFrame con valores asociados por identidad
+OBJECT_REGISTRY_SIZE = 16
+# Número máximo de índices de filas (hashes) que se mantienen en memoria
+ROW_INDEX_CACHE_SIZE = 8
+# Columnas combinadas en una marca de tiempo única
+DATE_COLUMN = 'Date'
+TIME_COLUMN = 'Time'
+TIMESTAMP_COLUMN = 'Datetime'
+# Columnas de texto en las que se buscan fechas u horas
+DATETIME_COLUMNS = (DATE_COLUMN, TIME_COLUMN)
+
+def _is_text(series: pd.Series) -> bool:
+    return pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)
+
+def _sample_text_values(series: pd.Series, sample_size: int = DATETIME_SAMPLE_SIZE) -> np.ndarray:
+    """Muestra aleatoria (reproducible) de valores de texto no nulos"""
+    n = len(series)
+    if n > sample_size:
+        positions = np.random.default_rng(0).integers(0, n, size=sample_size)
+        series = series.iloc[positions]
+    values = series.dropna().astype(str)
+    return values[~values.isin(NULL_TOKENS)].unique()
+
+def infer_datetime_formats(series: pd.Series, sample_size: int = DATETIME_SAMPLE_SIZE):
+    """
+    Infiere formatos explícitos de fecha u hora a partir de una muestra
+    
+    Se elige primero el formato que cubre más valores de la muestra y, si la
+    columna mezcla formatos (p. ej. fechas de Excel y texto M/D/YYYY), se
+    añaden formatos hasta cubrirla por completo.
+    
+    Args:
+        series: Columna de texto
+        sample_size: Número de valores muestreados
+        
+    Returns:
+        tuple: ('datetime' o 'time', lista de formatos), o (None, []) si la
+        muestra no corresponde a fechas/horas
+    """
+    sample = _sample_text_values(series, sample_size)
+    if len(sample) == 0:
+        return None, []
+    
+    for kind, candidates in (('datetime', DATETIME_FORMATS), ('time', TIME_FORMATS)):
+        pending = pd.Index(sample)
+        formats = []
+        while len(pending):
+            coverage = {
+                fmt: pd.to_datetime(pending, format=fmt, errors='coerce').notna()
+                for fmt in candidates if fmt not in formats
+            }
+            best = max(coverage, key=lambda fmt: coverage[fmt].sum(), default=None)
+            if best is None or not coverage[best].any():
+                break
+            formats.append(best)
+            pending = pending[~coverage[best]]
+        if formats and not len(pending):
+            return kind, formats
+    
+    return None, []
+
+def parse_datetime_column(series: pd.Series, formats, kind: str = 'datetime') -> pd.Series:
+    """
+    Convierte una columna de texto a datetime64 (o timedelta64 si kind='time')
+    
+    Cada valor único se interpreta una sola vez con los formatos explícitos
+    (sin inferencia por elemento) y el resultado se expande con los códigos
+    de factorización.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=True)
+    uniques = pd.Index(uniques).astype(str)
+    parsed = pd.Series(pd.NaT, index=range(len(uniques)), dtype='datetime64[ns]')
+    for fmt in formats:
+        missing = parsed.isna().to_numpy()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(uniques[missing], format=fmt, errors='coerce')
+    
+    if kind == 'time':
+        parsed = parsed - parsed.dt.normalize()
+    
+    values = parsed.to_numpy()
+    result = values.take(codes, mode='clip')
+    result[codes == -1] = np.datetime64('NaT') if kind != 'time' else np.timedelta64('NaT')
+    return pd.Series(result, index=series.index, name=series.name)
+
+def add_timestamp_column(df: pd.DataFrame, date_col: str = DATE_COLUMN, time_col: str = TIME_COLUMN,
+                         name: str = TIMESTAMP_COLUMN) -> pd.DataFrame:
+    """
+    Combina las columnas de fecha y hora en una única marca de tiempo
+    
+    Returns:
+        DataFrame con la columna `name` (datetime64) si ambas columnas son nativas
+    """
+    if name in df.columns or date_col not in df.columns or time_col not in df.columns:
+        return df
+    if not (pd.api.types.is_datetime64_any_dtype(df[date_col])
+            and pd.api.types.is_timedelta64_dtype(df[time_col])):
+        return df
+    
+    df = df.copy(deep=False)
+    df[name] = df[date_col].dt.normalize() + df[time_col]
+    return df
+
+def _plan_column(series: pd.Series, name: str, datetime_columns=DATETIME_COLUMNS):
+    """Retorna el plan de una columna, o None si no conviene cambiarla"""
+    n = len(series)
+    
+    if _is_text(series):
+        kind, formats = infer_datetime_formats(series) if name in datetime_columns else (None, [])
+        if kind == 'datetime':
+            return {'dtype': 'datetime64[ns]', 'reason': f"fecha ({', '.join(formats)})", 'formats': formats}
+        if kind == 'time':
+            return {'dtype': 'timedelta64[ns]', 'reason': f"hora ({', '.join(formats)})", 'formats': formats}
+        
+        n_unique = series.nunique(dropna=True)
+        if n and n_unique / n <= CATEGORY_MAX_RATIO:
+            return {'dtype': 'category', 'reason': f'{n_unique} valores únicos'}
+        return None
+    
+    if pd.api.types.is_bool_dtype(series):
+        return None
+    
+    if pd.api.types.is_integer_dtype(series):
+        downcast = pd.to_numeric(series, downcast='integer')
+        if downcast.dtype != series.dtype:
+            return {'dtype': str(downcast.dtype), 'reason': 'rango de enteros'}
+        return None
+    
+    if pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+        values = series.to_numpy()
+        if np.array_equal(values.astype(np.float32).astype(values.dtype), values, equal_nan=True):
+            return {'dtype': 'float32', 'reason': 'sin pérdida en float32'}
+    
+    return None
+
+def plan_compact_dtypes(df: pd.DataFrame, datetime_columns=DATETIME_COLUMNS) -> dict:
+    """
+    Planifica tipos de datos compactos para cada columna
+    
+    - Texto con fechas u horas (solo en `datetime_columns`) -> datetime64 /
+      timedelta64 con formato explícito
+    - Texto con pocos valores únicos -> 'category'
+    - Enteros -> el entero más pequeño que contiene su rango
+    - Flotantes -> float32 solo si la conversión no pierde precisión
+    
+    Args:
+        df: DataFrame a analizar
+        datetime_columns: Columnas conocidas de fecha/hora; en las demás no se
+            intenta inferir formatos (p. ej. identificadores de alta cardinalidad)
+        
+    Returns:
+        dict: {columna: {'dtype', 'reason'[, 'formats']}} para las columnas a convertir
+    """
+    plan = {}
+    for col in df.columns:
+        target = _plan_column(df[col], col, datetime_columns)
+        if target is not None:
+            plan[col] = target
+    return plan
+
+def _null_count(series: pd.Series) -> int:
+    nulls = series.isna()
+    if _is_text(series):
+        nulls |= series.isin(NULL_TOKENS)
+    return int(nulls.sum())
+
+def apply_dtype_plan(df: pd.DataFrame, plan: dict):
+    """
+    Aplica un plan de tipos y mide la memoria ahorrada por columna
+    
+    Args:
+        df: DataFrame original (no se modifica)
+        plan: Plan generado por plan_compact_dtypes
+        
+    Returns:
+        tuple: (DataFrame convertido, DataFrame con el ahorro de memoria por columna)
+    """
+    df_compact = df.copy(deep=False)
+    report = []
+    
+    for col, target in plan.items():
+        original = df_compact[col]
+        dtype = target['dtype']
+        try:
+            if dtype.startswith('datetime64'):
+                converted = parse_datetime_column(original, target['formats'])
+            elif dtype.startswith('timedelta64'):
+                converted = parse_datetime_column(original, target['formats'], kind='time')
+            else:
+                converted = original.astype(dtype)
+        except (TypeError, ValueError):
+            continue
+        
+        # Las conversiones de fecha/hora solo se aceptan si no generan nulos nuevos
+        if converted.isna().sum() > _null_count(original):
+            continue
+        
+        df_compact[col] = converted
+        bytes_before = original.memory_usage(index=False, deep=True)
+        bytes_after = converted.memory_usage(index=False, deep=True)
+        report.append({
+            'column': col,
+            'from': str(original.dtype),
+            'to': str(converted.dtype),
+            'reason': target['reason'],
+            'bytes_before': bytes_before,
+            'bytes_after': bytes_after,
+            'saved_bytes': bytes_before - bytes_after
+        })
+    
+    report_df = pd.DataFrame(report, columns=['column', 'from', 'to', 'reason',
+                                              'bytes_before', 'bytes_after', 'saved_bytes'])
+    return df_compact, report_df
+
+def compact_dtypes(df: pd.DataFrame, datetime_columns=DATETIME_COLUMNS, add_timestamp: bool = False):
+    """
+    Planifica y aplica tipos compactos en un solo paso
+    
+    Args:
+        df: DataFrame a compactar
+        datetime_columns: Columnas conocidas de fecha/hora
+        add_timestamp: Si es True, combina Date/Time en la marca de tiempo
+            TIMESTAMP_COLUMN (solo cuando ambas columnas existen); por defecto
+            el esquema no cambia
+    
+    Returns:
+        tuple: (DataFrame compacto, reporte de memoria ahorrada por columna)
+    """
+    df_compact, report = apply_dtype_plan(df, plan_compact_dtypes(df, datetime_columns))
+    if add_timestamp:
+        df_compact = add_timestamp_column(df_compact)
+    return df_compact, report
+
+def fix_pyarrow_serialization(df: pd.DataFrame, return_report: bool = False):
     """
     Corrige problemas de serialización PyArrow en Streamlit
     
     Args:
         df: DataFrame con posibles problemas de serialización
+        return_report: Si es True, retorna también el reporte de memoria ahorrada
         
     Returns:
         DataFrame con tipos de datos optimizados para Streamlit
+        (y el reporte de compactación si return_report es True)
     """
-    df_fixed = df.copy()
+    # Copia superficial: las columnas se reemplazan, nunca se modifican en el original
+    df_fixed = df.copy(deep=False)
     
     for col in df_fixed.columns:
-        # Manejar fechas problemáticas
         if df_fixed[col].dtype == 'object':
-            # Intentar detectar si es una fecha en formato string
-            try:
-                # Verificar si parece una fecha (formato MM/DD/YYYY)
-                sample_val = str(df_fixed[col].iloc[0])
-                if '/' in sample_val and len(sample_val.split('/')) == 3:
-                    # Convertir a datetime y luego a string optimizado
-                    df_fixed[col] = pd.to_datetime(df_fixed[col], errors='ignore').dt.strftime('%Y-%m-%d')
-                    continue
-            except:
-                pass
-            
-            # Para otros objetos, asegurar que sean strings
+            # Asegurar que los objetos sean strings (evita tipos mixtos)
             df_fixed[col] = df_fixed[col].astype(str)
+    
+    # Compactar tipos: fechas/horas nativas con formato inferido por muestreo,
+    # categorías y enteros/flotantes reducidos
+    df_fixed, report = compact_dtypes(df_fixed)
+    
+    if return_report:
+        return df_fixed, report
+    return df_fixed
+
+class _ObjectRegistry:
+    """
+    Valores asociados a objetos DataFrame concretos, no a su contenido
+    
+    La clave es id(df) junto a una referencia débil (un id reciclado por otro
+    objeto no se confunde) y la huella muestreada del objeto al registrarlo,
+    que descarta la entrada si se editó en el lugar en las filas muestreadas.
+    Un DataFrame distinto nunca recibe el valor de otro, aunque coincidan su
+    forma y sus filas muestreadas.
+    """
+    
+    def __init__(self, max_size: int = OBJECT_REGISTRY_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+    
+    def get(self, df: pd.DataFrame):
+        entry = self._entries.get(id(df))
+        if entry is None:
+            return None
+        ref, fingerprint, value = entry
+        if ref() is not df or fingerprint != dataframe_fingerprint(df):
+            del self._entries[id(df)]
+            return None
+        self._entries.move_to_end(id(df))
+        return value
+    
+    def register(self, df: pd.DataFrame, value):
+        for key in [key for key, (ref, _, _) in self._entries.items() if ref() is None]:
+            del self._entries[key]
+        self._entries[id(df)] = (weakref.ref(df), dataframe_fingerprint(df), value)
+        self._entries.move_to_end(id(df))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+# Índices de filas por objeto DataFrame
+_row_indexes = _ObjectRegistry(ROW_INDEX_CACHE_SIZE)
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Hash uint64 por fila (vectorizado, sin incluir el índice)"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+def build_row_index(df: pd.DataFrame, hashes: np.ndarray = None) -> dict:
+    """
+    Construye el índice de huellas de filas de un DataFrame
+    
+    Args:
+        df: DataFrame a indexar
+        hashes: Hashes ya calculados (p. ej. leídos de la caché en disco)
         
-        # Manejar tipos de datos numéricos problemáticos
-        elif pd.api.types.is_integer_dtype(df_fixed[col]):
-            # Convertir enteros a int64 estándar
-            df_fixed[col] = df_fixed[col].astype('int64')
+    Returns:
+        dict: Hashes por fila, máscara de duplicados (como df.duplicated())
+        y número de filas duplicadas
+    """
+    hashes = row_hashes(df) if hashes is None else np.asarray(hashes, dtype=np.uint64)
+    duplicated = pd.Series(hashes).duplicated(keep='first').to_numpy()
+    return {
+        'hashes': hashes,
+        'duplicated': duplicated,
+        'duplicate_count': int(duplicated.sum())
+    }
+
+def register_row_index(df: pd.DataFrame, index: dict):
+    """Asocia un índice de filas a un DataFrame (al objeto, no a su huella)"""
+    _row_indexes.register(df, index)
+
+def get_row_index(df: pd.DataFrame) -> dict:
+    """Retorna el índice de filas del DataFrame, construyéndolo una sola vez por objeto"""
+    index = _row_indexes.get(df)
+    if index is not None:
+        return index
+    index = build_row_index(df)
+    register_row_index(df, index)
+    return index
+
+# Sketches de columnas categóricas por objeto DataFrame (ver sketches_categoricos)
+_column_sketches = _ObjectRegistry(ROW_INDEX_CACHE_SIZE)
+
+def register_column_sketches(df: pd.DataFrame, sketches: dict):
+    """Asocia los sketches de columnas categóricas a un DataFrame (al objeto, no a su huella)"""
+    _column_sketches.register(df, sketches)
+
+def get_column_sketches(df: pd.DataFrame):
+    """Sketches registrados para el DataFrame (None si no hay)"""
+    return _column_sketches.get(df)
+
+def find_duplicate_rows(df: pd.DataFrame, position: int) -> np.ndarray:
+    """Posiciones de todas las filas idénticas a la fila indicada (incluida ella)"""
+    hashes = get_row_index(df)['hashes']
+    return np.flatnonzero(hashes == hashes[position])
+
+def compare_row_hashes(previous: np.ndarray, current: np.ndarray) -> dict:
+    """
+    Compara los hashes de dos versiones de un dataset
+    
+    Una fila modificada cuenta como nueva en la versión actual y como
+    eliminada en la anterior.
+    
+    Returns:
+        dict: Posiciones de filas nuevas o modificadas en la versión actual,
+        su número y el número de filas de la versión anterior que ya no están
+    """
+    changed = ~np.isin(current, previous)
+    return {
+        'changed_rows': np.flatnonzero(changed),
+        'new_or_modified': int(changed.sum()),
+        'removed': int((~np.isin(previous, current)).sum())
+    }
+
+def dataframe_fingerprint(df: pd.DataFrame, sample_size: int = FINGERPRINT_SAMPLE_SIZE) -> str:
+    """
+    Calcula una huella barata de un DataFrame: esquema más hash de una muestra de filas
+    
+    La muestra usa posiciones equiespaciadas (incluye primera y última fila),
+    por lo que el costo no depende del número de registros. No se memoriza
+    por objeto: una edición en el lugar (df.loc[...] = ..., astype de una
+    columna) cambia la huella en la siguiente llamada.
+    
+    Args:
+        df: DataFrame a identificar
+        sample_size: Número de filas muestreadas (None = todas las filas)
         
-        elif pd.api.types.is_float_dtype(df_fixed[col]):
-            # Convertir flotantes a float64 estándar
-            df_fixed[col] = df_fixed[col].astype('float64')
+    Returns:
+        str: Huella hexadecimal
+    """
+    shape = df.shape
+    columns = tuple(df.columns)
+    hasher = hashlib.blake2b(digest_size=16)
+    hasher.update(repr((shape, columns, tuple(str(t) for t in df.dtypes))).encode('utf-8'))
+    if len(df):
+        if sample_size is None or sample_size >= len(df):
+            sample = df
+        else:
+            positions = np.unique(np.linspace(0, len(df) - 1, num=sample_size, dtype=np.int64))
+            sample = df.iloc[positions]
+        hasher.update(pd.util.hash_pandas_object(sample, index=True).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+# Huella completa por objeto (ver content_fingerprint)
+_content_fingerprints = _ObjectRegistry()
+# Huella completa de entrada -> (DataFrame optimizado, reporte)
+_optimize_cache = OrderedDict()
+# DataFrames entregados por la optimización (ya optimizados)
+_optimized_frames = _ObjectRegistry()
+
+def content_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Huella del contenido completo de un DataFrame (esquema, índice y todas las filas)
     
-    return df_fixed
+    Es la clave de las cachés que devuelven datos o resultados calculados a
+    partir de ellos. Se calcula una sola vez por objeto (p. ej. al cargar el
+    dataset) y se reutiliza mientras sea el mismo objeto sin editar; otro
+    DataFrame se hashea completo aunque coincida la huella muestreada.
+    """
+    fingerprint = _content_fingerprints.get(df)
+    if fingerprint is None:
+        fingerprint = dataframe_fingerprint(df, sample_size=None)
+        _content_fingerprints.register(df, fingerprint)
+    return fingerprint
+
+def _optimize_memoized(df: pd.DataFrame):
+    """
+    Retorna (DataFrame optimizado, reporte) reutilizando resultados previos
+    
+    Un DataFrame entregado por esta función (el mismo objeto) se reconoce sin
+    hashearlo y se devuelve tal cual. Cualquier otro se identifica por su
+    huella completa: los resultados guardados nunca se entregan por una
+    coincidencia de la muestra. Se entregan como copia superficial: con
+    copy-on-write, modificar el DataFrame retornado no altera la caché.
+    """
+    if _optimized_frames.get(df):
+        return df, None
+    
+    # La compactación de tipos conserva las filas: el índice de filas y los
+    # sketches siguen siendo válidos para el DataFrame optimizado
+    row_index = _row_indexes.get(df)
+    sketches = _column_sketches.get(df)
+    fingerprint = content_fingerprint(df)
+    if fingerprint in _optimize_cache:
+        _optimize_cache.move_to_end(fingerprint)
+        df_optimized, report = _optimize_cache[fingerprint]
+    else:
+        df_optimized, report = fix_pyarrow_serialization(df, return_report=True)
+        _optimize_cache[fingerprint] = (df_optimized, report)
+        while len(_optimize_cache) > OPTIMIZE_CACHE_SIZE:
+            _optimize_cache.popitem(last=False)
+    
+    result = df_optimized.copy(deep=False)
+    _optimized_frames.register(result, True)
+    if row_index is not None:
+        register_row_index(result, row_index)
+    if sketches is not None:
+        register_column_sketches(result, sketches)
+    return result, report
 
 def optimize_dataframe_for_streamlit(df: pd.DataFrame) -> pd.DataFrame:
     """
     Optimiza un DataFrame para uso en Streamlit eliminando problemas de serialización
     
+    La optimización es idempotente y se memoriza por huella completa del
+    DataFrame: en cada rerun de Streamlit el DataFrame ya optimizado (el mismo
+    objeto) se devuelve sin copiarlo ni hashearlo.
+    
     Args:
         df: DataFrame original
         
@@ -59,11 +498,15 @@ def optimize_dataframe_for_streamlit(df: pd.DataFrame) -> pd.DataFrame:
         DataFrame optimizado
     """
     try:
-        # Aplicar correcciones de serialización
-        df_optimized = fix_pyarrow_serialization(df)
+        # Aplicar correcciones de serialización (o reutilizar las ya aplicadas)
+        df_optimized, report = _optimize_memoized(df)
         
         # Mensaje informativo para el usuario
         st.sidebar.info("🔧 **Optimización aplicada:** Tipos de datos compatibles con Streamlit")
+        if report is not None and not report.empty:
+            saved_mb = report['saved_bytes'].sum() / 1024 / 1024
+            with st.sidebar.expander(f"💾 Memoria ahorrada: {saved_mb:.2f} MB", expanded=False):
+                st.dataframe(report, use_container_width=True)
         
         return df_optimized
         
@@ -85,11 +528,11 @@ def validate_data_quality(df: pd.DataFrame) -> dict:
         'total_rows': len(df),
         'total_columns': len(df.columns),
         'null_values': df.isnull().sum().sum(),
-        'duplicate_rows': df.duplicated().sum(),
+        'duplicate_rows': get_row_index(df)['duplicate_count'],
         'data_types': df.dtypes.value_counts().to_dict(),
         'memory_usage': df.memory_usage(deep=True).sum() / 1024 / 1024,  # MB
         'numeric_columns': len(df.select_dtypes(include=[np.number]).columns),
-        'categorical_columns': len(df.select_dtypes(include=['object']).columns)
+        'categorical_columns': len(df.select_dtypes(include=['object', 'string', 'category']).columns)
     }
     
     return quality_report
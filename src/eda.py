@@ -10,28 +10,54 @@ import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 
+try:
+    from .data_utils import content_fingerprint
+    from .perfil_eda import calcular_perfil, matriz_correlacion, top_pares_correlacion, MUESTRA_CORRELACION
+except ImportError:
+    from data_utils import content_fingerprint
+    from perfil_eda import calcular_perfil, matriz_correlacion, top_pares_correlacion, MUESTRA_CORRELACION
+
 # Configurar estilo de visualización
 plt.style.use('seaborn-v0_8-whitegrid')
 sns.set_palette("husl")
 
+@st.cache_data(show_spinner="Calculando perfil del dataset...", max_entries=8)
+def _perfil_cacheado(huella, _df):
+    # _df no se hashea: la clave de la caché (compartida entre sesiones) es la
+    # huella completa del dataset, calculada una vez por objeto cargado
+    return calcular_perfil(_df)
+
+def obtener_perfil(df):
+    """Perfil exploratorio del dataset, calculado una vez por contenido (ver perfil_eda)"""
+    return _perfil_cacheado(content_fingerprint(df), df)
+
+@st.cache_data(show_spinner="Calculando correlaciones...", max_entries=16)
+def _correlacion_cacheada(huella, metodo, muestra, columnas, _df):
+    return matriz_correlacion(_df, list(columnas), metodo=metodo, muestra=muestra)
+
+# Por encima de este número de variables el mapa de calor no muestra los valores
+MAX_VARIABLES_TEXTO_CORRELACION = 15
+
 def analisis_descriptivo(df: pd.DataFrame):
     """
     Análisis exploratorio de datos modernizado con visualizaciones interactivas
     y análisis específicos para datos de supermercado
     """
     
+    perfil = obtener_perfil(df)
+    
     # Información general del dataset
     st.markdown("### 📊 Resumen General del Dataset")
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Filas", f"{df.shape[0]:,}")
+        st.metric("Filas", f"{perfil['filas']:,}")
     with col2:
-        st.metric("Columnas", df.shape[1])
+        st.metric("Columnas", perfil['columnas'])
     with col3:
-        st.metric("Variables Numéricas", len(df.select_dtypes(include=['number']).columns))
+        st.metric("Variables Numéricas", len(perfil['num_cols']))
     with col4:
-        st.metric("Variables Categóricas", len(df.select_dtypes(include=['object']).columns))
+        st.metric("Variables Categóricas", len(perfil['cat_cols']))
     
     # Vista previa de los datos con mejor formato
     st.markdown("### 👀 Vista Previa de los Datos")
@@ -60,9 +86,10 @@ def analisis_descriptivo(df: pd.DataFrame):
 
 def calidad_datos(df):
     """Análisis de calidad de datos con visualizaciones"""
+    perfil = obtener_perfil(df)
     
     # Valores nulos
-    nulos = df.isnull().sum()
+    nulos = perfil['nulos']
     if nulos.sum() > 0:
         col1, col2 = st.columns([1, 1])
         
@@ -70,7 +97,7 @@ def calidad_datos(df):
             st.markdown("**Valores Nulos por Columna:**")
             nulos_df = nulos[nulos > 0].reset_index()
             nulos_df.columns = ['Columna', 'Valores Nulos']
-            nulos_df['Porcentaje'] = (nulos_df['Valores Nulos'] / len(df) * 100).round(2)
+            nulos_df['Porcentaje'] = (nulos_df['Valores Nulos'] / perfil['filas'] * 100).round(2)
             st.dataframe(nulos_df, use_container_width=True)
         
         with col2:
@@ -84,16 +111,61 @@ def calidad_datos(df):
         st.success("✅ No se encontraron valores nulos en el dataset")
     
     # Duplicados
-    duplicados = df.duplicated().sum()
+    duplicados = perfil['duplicados']
     if duplicados > 0:
-        st.warning(f"⚠️ Se encontraron {duplicados} filas duplicadas ({duplicados/len(df)*100:.2f}%)")
+        st.warning(f"⚠️ Se encontraron {duplicados} filas duplicadas ({duplicados/perfil['filas']*100:.2f}%)")
     else:
         st.success("✅ No se encontraron filas duplicadas")
 
+def _figura_histograma(var, dist):
+    """Histograma con boxplot marginal dibujado a partir de los agregados del perfil"""
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.2, 0.8], vertical_spacing=0.03)
+    fig.add_trace(go.Box(
+        q1=[dist['q1']], median=[dist['mediana']], q3=[dist['q3']],
+        lowerfence=[dist['bigote_inferior']], upperfence=[dist['bigote_superior']],
+        y=[var], orientation='h', name=var, boxpoints=False
+    ), row=1, col=1)
+    if len(dist['atipicos']):
+        fig.add_trace(go.Scatter(
+            x=dist['atipicos'], y=[var] * len(dist['atipicos']), mode='markers',
+            marker=dict(size=4), name='Atípicos'
+        ), row=1, col=1)
+    bordes = dist['bordes']
+    fig.add_trace(go.Bar(
+        x=(bordes[:-1] + bordes[1:]) / 2, y=dist['conteos'], width=np.diff(bordes),
+        opacity=0.7, name=var
+    ), row=2, col=1)
+    fig.update_yaxes(showticklabels=False, row=1, col=1)
+    fig.update_yaxes(title_text='count', row=2, col=1)
+    fig.update_xaxes(title_text=var, row=2, col=1)
+    fig.update_layout(title=f'Distribución de {var}', bargap=0)
+    return fig
+
+def _figura_boxplots_normalizados(variables, distribuciones):
+    """Boxplots comparativos con cuartiles normalizados (z-score) precalculados"""
+    fig = go.Figure()
+    for var in variables:
+        dist = distribuciones[var]
+        if dist is None:
+            continue
+        desviacion = dist['desviacion'] or 1.0
+        z = lambda valor: (np.asarray(valor) - dist['media']) / desviacion
+        fig.add_trace(go.Box(
+            q1=[z(dist['q1'])], median=[z(dist['mediana'])], q3=[z(dist['q3'])],
+            lowerfence=[z(dist['bigote_inferior'])], upperfence=[z(dist['bigote_superior'])],
+            x=[var], name=var, boxpoints=False
+        ))
+        if len(dist['atipicos']):
+            fig.add_trace(go.Scatter(
+                x=[var] * len(dist['atipicos']), y=z(dist['atipicos']), mode='markers',
+                marker=dict(size=4), showlegend=False
+            ))
+    return fig
+
 def analisis_variables_numericas(df):
     """Análisis modernizado de variables numéricas"""
-    
-    num_cols = df.select_dtypes(include=['number']).columns.tolist()
+    perfil = obtener_perfil(df)
+    num_cols = perfil['num_cols']
     
     # Mensaje destacado
     st.markdown("---")
@@ -125,7 +197,7 @@ def analisis_variables_numericas(df):
     if selected_vars:
         # Estadísticas descriptivas
         with st.expander("📋 Estadísticas Descriptivas", expanded=False):
-            st.dataframe(df[selected_vars].describe().round(3), use_container_width=True)
+            st.dataframe(perfil['describe'][selected_vars].round(3), use_container_width=True)
         
         # Distribuciones con plotly
         st.markdown("**Distribuciones de Variables:**")
@@ -140,10 +212,12 @@ def analisis_variables_numericas(df):
                 col1, col2 = st.columns(2)
             
             with col1 if i % 2 == 0 else col2:
-                # Histograma interactivo
-                fig = px.histogram(df, x=var, marginal="box", 
-                                 title=f'Distribución de {var}',
-                                 nbins=30, opacity=0.7)
+                # Histograma interactivo a partir de los intervalos precalculados
+                dist = perfil['distribuciones'][var]
+                if dist is None:
+                    st.info(f"'{var}' no tiene valores numéricos válidos")
+                    continue
+                fig = _figura_histograma(var, dist)
                 fig.update_layout(height=400, showlegend=False)
                 st.plotly_chart(fig, use_container_width=True)
         
@@ -151,14 +225,8 @@ def analisis_variables_numericas(df):
         if len(selected_vars) > 1:
             st.markdown("**Comparación de Distribuciones (Boxplots):**")
             
-            # Normalizar datos para comparación
-            df_norm = df[selected_vars].copy()
-            for col in selected_vars:
-                df_norm[col] = (df_norm[col] - df_norm[col].mean()) / df_norm[col].std()
-            
-            fig = go.Figure()
-            for var in selected_vars:
-                fig.add_trace(go.Box(y=df_norm[var], name=var, boxpoints='outliers'))
+            # Cuartiles normalizados del perfil: el tamaño de la figura no depende de las filas
+            fig = _figura_boxplots_normalizados(selected_vars, perfil['distribuciones'])
             
             fig.update_layout(
                 title="Comparación de Distribuciones (Datos Normalizados)",
@@ -169,8 +237,8 @@ def analisis_variables_numericas(df):
 
 def analisis_variables_categoricas(df):
     """Análisis modernizado de variables categóricas"""
-    
-    cat_cols = df.select_dtypes(include=['object']).columns.tolist()
+    perfil = obtener_perfil(df)
+    cat_cols = perfil['cat_cols']
     
     if len(cat_cols) == 0:
         st.info("No se encontraron variables categóricas en el dataset")
@@ -187,13 +255,27 @@ def analisis_variables_categoricas(df):
     if selected_cats:
         for var in selected_cats:
             with st.expander(f"📊 Análisis de {var}", expanded=False):
+                resumen = perfil['cardinalidad'][var]
+                freq_table = perfil['frecuencias'][var].reset_index()
+                freq_table.columns = ['Categoría', 'Frecuencia']
+                
+                if resumen['exacto']:
+                    freq_table['Porcentaje'] = (freq_table['Frecuencia'] / perfil['filas'] * 100).round(2)
+                    st.caption(f"{resumen['distintos']:,} categorías distintas")
+                else:
+                    # Columna de alta cardinalidad: valores de los sketches. La frecuencia
+                    # es una cota superior; el porcentaje se da sobre la cota inferior
+                    freq_table['Frecuencia mínima'] = freq_table['Frecuencia'] - resumen['errores'].to_numpy()
+                    freq_table['Porcentaje mínimo'] = (freq_table['Frecuencia mínima'] / perfil['filas'] * 100).round(2)
+                    st.caption(f"≈ {resumen['distintos']:,} categorías distintas (estimación HyperLogLog). "
+                               f"Se muestran las {len(freq_table):,} más frecuentes; cada frecuencia es una "
+                               f"estimación que puede sobreestimar la real (hasta {resumen['error_maximo']:,}), "
+                               f"y la real está entre la frecuencia mínima y la estimada")
+                
                 col1, col2 = st.columns([1, 2])
                 
                 with col1:
                     # Tabla de frecuencias
-                    freq_table = df[var].value_counts().reset_index()
-                    freq_table.columns = ['Categoría', 'Frecuencia']
-                    freq_table['Porcentaje'] = (freq_table['Frecuencia'] / len(df) * 100).round(2)
                     st.dataframe(freq_table, use_container_width=True)
                 
                 with col2:
@@ -212,25 +294,40 @@ def analisis_variables_categoricas(df):
                                    color='Frecuencia', color_continuous_scale='viridis')
                         fig.update_layout(height=400)
                         st.plotly_chart(fig, use_container_width=True)
-                        st.info(f"Mostrando solo las 15 categorías más frecuentes de {len(freq_table)} total")
+                        st.info(f"Mostrando solo las 15 categorías más frecuentes de {resumen['distintos']:,} total")
 
 def analisis_correlaciones(df):
     """Análisis de correlaciones interactivo"""
+    perfil = obtener_perfil(df)
     
-    num_cols = df.select_dtypes(include=['number']).columns.tolist()
-    
-    if len(num_cols) < 2:
+    if len(perfil['num_cols']) < 2:
         st.info("Se necesitan al menos 2 variables numéricas para calcular correlaciones")
         return
     
-    # Calcular matriz de correlación
-    corr_matrix = df[num_cols].corr()
+    col1, col2 = st.columns(2)
+    with col1:
+        metodo = st.selectbox("Método:", ['pearson', 'spearman'],
+                              format_func=str.capitalize, key="corr_metodo")
+    with col2:
+        muestra = int(st.number_input("Filas muestreadas:", min_value=1000,
+                                      value=MUESTRA_CORRELACION, step=50_000, key="corr_muestra",
+                                      help="Las correlaciones se calculan sobre una muestra aleatoria de filas"))
+    
+    # La matriz de Pearson con la muestra por defecto ya está en el perfil
+    if metodo == 'pearson' and muestra == MUESTRA_CORRELACION:
+        corr_matrix = perfil['correlacion']
+    else:
+        corr_matrix = _correlacion_cacheada(content_fingerprint(df), metodo, muestra,
+                                            tuple(perfil['num_cols']), df)
+    if perfil['filas'] > muestra:
+        st.caption(f"Calculado sobre una muestra de {muestra:,} de {perfil['filas']:,} filas")
     
-    # Mapa de calor interactivo
+    # Mapa de calor interactivo (valores escritos solo en matrices pequeñas)
     fig = px.imshow(corr_matrix, 
-                    text_auto=True, 
+                    text_auto='.2f' if len(corr_matrix) <= MAX_VARIABLES_TEXTO_CORRELACION else False, 
                     aspect="auto",
                     color_continuous_scale='RdBu_r',
+                    zmin=-1, zmax=1,
                     title="Matriz de Correlación",
                     labels=dict(color="Correlación"))
     fig.update_layout(height=600)
@@ -238,22 +335,7 @@ def analisis_correlaciones(df):
     
     # Correlaciones más fuertes
     st.markdown("**Correlaciones más Fuertes:**")
-    
-    # Obtener correlaciones sin la diagonal
-    corr_pairs = []
-    for i in range(len(corr_matrix.columns)):
-        for j in range(i+1, len(corr_matrix.columns)):
-            var1 = corr_matrix.columns[i]
-            var2 = corr_matrix.columns[j]
-            corr_val = corr_matrix.iloc[i, j]
-            corr_pairs.append({'Variable 1': var1, 'Variable 2': var2, 'Correlación': corr_val})
-    
-    corr_df = pd.DataFrame(corr_pairs)
-    corr_df['Correlación Abs'] = abs(corr_df['Correlación'])
-    corr_df = corr_df.sort_values('Correlación Abs', ascending=False)
-    
-    # Mostrar top 10 correlaciones
-    top_corr = corr_df.head(10)[['Variable 1', 'Variable 2', 'Correlación']]
+    top_corr = top_pares_correlacion(corr_matrix, k=10)
     top_corr['Correlación'] = top_corr['Correlación'].round(3)
     st.dataframe(top_corr, use_container_width=True)
 
@@ -0,0 +1,154 @@
+# Este módulo está alineado y documentado según la arquitectura conceptual ubicada en:
+# C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
+"""
+Modos de entrenamiento para las redes MLP (regresión y clasificación).
+
+- 'completo': `fit` de scikit-learn con tamaño de lote explícito y parada
+  temprana opcional (`early_stopping` + `n_iter_no_change`).
+- 'streaming': épocas de `partial_fit` sobre bloques de filas (o sobre un
+  iterable de bloques leídos de disco), con presupuesto de tiempo y parada
+  cuando la pérdida deja de mejorar.
+
+Con `tiempo_maximo` definido el entrenamiento siempre usa el modo streaming,
+que es el único que puede interrumpirse entre bloques.
+"""
+
+import time
+
+import numpy as np
+
+# Configuración por defecto: equivale al entrenamiento original (fit completo)
+CONFIG_ENTRENAMIENTO = {
+    'modo': 'completo',
+    'batch_size': 'auto',
+    'early_stopping': False,
+    'n_iter_no_change': 10,
+    'max_iter': 500,
+    'tiempo_maximo': None,
+    'tamano_bloque': 10_000,
+    'tol': 1e-4
+}
+
+
+def resolver_config(config=None) -> dict:
+    """Completa una configuración parcial con los valores por defecto"""
+    resuelta = dict(CONFIG_ENTRENAMIENTO)
+    if config:
+        resuelta.update({k: v for k, v in config.items() if v is not None})
+    if resuelta['tiempo_maximo']:
+        resuelta['modo'] = 'streaming'
+    return resuelta
+
+
+def parametros_mlp(config=None) -> dict:
+    """
+    Parámetros del constructor de MLPRegressor/MLPClassifier según la configuración.
+    """
+    config = resolver_config(config)
+    return {
+        'batch_size': config['batch_size'],
+        # En modo streaming la parada la controla entrenar_por_bloques
+        'early_stopping': config['early_stopping'] and config['modo'] == 'completo',
+        'n_iter_no_change': config['n_iter_no_change'],
+        'max_iter': config['max_iter'],
+        'tol': config['tol']
+    }
+
+
+def _bloques(X, y, tamano_bloque):
+    for inicio in range(0, X.shape[0], tamano_bloque):
+        yield X[inicio:inicio + tamano_bloque], y[inicio:inicio + tamano_bloque]
+
+
+def entrenar_por_bloques(modelo, bloques, config=None, clases=None, epocas=None):
+    """
+    Entrena una MLP con `partial_fit` sobre una secuencia de bloques.
+
+    Args:
+        modelo: MLPRegressor o MLPClassifier sin ajustar (o a continuar)
+        bloques: Función sin argumentos que retorna un iterable de (X, y);
+            se llama una vez por época, de modo que puede releer de disco
+        config: Configuración de entrenamiento (ver CONFIG_ENTRENAMIENTO)
+        clases: Clases del problema (obligatorio para clasificación)
+        epocas: Número máximo de épocas (por defecto config['max_iter'])
+
+    Returns:
+        dict: Épocas, bloques procesados, segundos y motivo de parada
+    """
+    config = resolver_config(config)
+    epocas = epocas or config['max_iter']
+    tiempo_maximo = config['tiempo_maximo']
+    inicio = time.perf_counter()
+
+    mejor_perdida = np.inf
+    sin_mejora = 0
+    n_bloques = 0
+    detenido_por = 'max_iter'
+    epoca = 0
+
+    for epoca in range(1, epocas + 1):
+        perdidas = []
+        for X_bloque, y_bloque in bloques():
+            if clases is not None:
+                modelo.partial_fit(X_bloque, y_bloque, classes=clases)
+            else:
+                modelo.partial_fit(X_bloque, y_bloque)
+            perdidas.append(modelo.loss_)
+            n_bloques += 1
+            if tiempo_maximo and time.perf_counter() - inicio >= tiempo_maximo:
+                detenido_por = 'tiempo'
+                break
+        if detenido_por == 'tiempo':
+            break
+
+        perdida = float(np.mean(perdidas)) if perdidas else np.inf
+        if perdida < mejor_perdida - config['tol']:
+            mejor_perdida = perdida
+            sin_mejora = 0
+        else:
+            sin_mejora += 1
+            if sin_mejora >= config['n_iter_no_change']:
+                detenido_por = 'convergencia'
+                break
+
+    return {
+        'modo': 'streaming',
+        'epocas': epoca,
+        'bloques': n_bloques,
+        'segundos': time.perf_counter() - inicio,
+        'detenido_por': detenido_por
+    }
+
+
+def entrenar_mlp(modelo, X, y, config=None, clases=None) -> dict:
+    """
+    Entrena una MLP sobre una matriz en memoria según el modo configurado.
+
+    Args:
+        modelo: MLPRegressor o MLPClassifier creado con parametros_mlp(config)
+        X: Matriz de características (densa o dispersa)
+        y: Variable objetivo
+        config: Configuración de entrenamiento (ver CONFIG_ENTRENAMIENTO)
+        clases: Clases del problema (solo clasificación, modo streaming)
+
+    Returns:
+        dict: Información del entrenamiento (modo, épocas, segundos, motivo de parada)
+    """
+    config = resolver_config(config)
+    y = np.asarray(y)
+
+    if config['modo'] == 'streaming':
+        if clases is not None:
+            clases = np.unique(clases)
+        return entrenar_por_bloques(
+            modelo, lambda: _bloques(X, y, config['tamano_bloque']), config, clases=clases
+        )
+
+    inicio = time.perf_counter()
+    modelo.fit(X, y)
+    return {
+        'modo': 'completo',
+        'epocas': modelo.n_iter_,
+        'segundos': time.perf_counter() - inicio,
+        'detenido_por': 'convergencia' if modelo.n_iter_ < config['max_iter'] else 'max_iter'
+    }
@@ -7,6 +7,141 @@ Mapea las columnas del dataset actual a las columnas esperadas por los modelos
 para mantener compatibilidad sin cambiar los algoritmos ML.
 """
 
+import functools
+
+import numpy as np
+import pandas as pd
+
+# Mapeo principal: columnas comunes -> inglés (esperado por los modelos)
+MAPEO_COLUMNAS = {
+    # Mapeo para dataset estándar de Kaggle
+    'Invoice ID': 'Invoice ID',  # Mantener
+    'Branch': 'Branch',  # Ya correcto
+    'City': 'City',      # Ya correcto
+    'Customer type': 'Customer type',  # Ya correcto
+    'Gender': 'Gender',  # Ya correcto
+    'Product line': 'Product line',  # Ya correcto
+    'Unit price': 'Unit price',  # Ya correcto
+    'Quantity': 'Quantity',  # Ya correcto
+    'Tax 5%': 'Tax 5%',  # Ya correcto
+    'Total': 'Total',    # Ya correcto
+    'Date': 'Date',      # Ya correcto
+    'Time': 'Time',      # Ya correcto
+    'Payment': 'Payment', # Ya correcto
+    'cogs': 'cogs',      # Ya correcto
+    'gross margin percentage': 'gross margin percentage',  # Mantener
+    'gross income': 'gross income',  # Ya correcto
+    'Rating': 'Rating',  # Ya correcto
+    
+    # Mapeo para dataset en español (si existe)
+    'tienda_id': 'Branch',
+    'ciudad': 'City',
+    'genero_cliente': 'Gender', 
+    'categoria': 'Product line',
+    'metodo_pago': 'Payment',
+    'frecuencia_compra': 'Customer type',
+    'canal_marketing': 'City',  # Backup para City si no existe
+    'precio': 'Unit price',
+    'cantidad_vendida': 'Quantity', 
+    'descuento': 'Tax 5%',
+    'total': 'Total',
+    'costo_producto': 'cogs',
+    'margen': 'gross income',
+    'satisfaccion_cliente': 'Rating',
+    'calificacion': 'Rating',
+    
+    # Mapeo adicional para variaciones comunes
+    'producto': 'Product line',
+    'linea_producto': 'Product line',
+    'tipo_cliente': 'Customer type',
+    'sucursal': 'Branch',
+    'tienda': 'Branch',
+    'sexo': 'Gender',
+    'genero': 'Gender',
+    'precio_unitario': 'Unit price',
+    'cantidad': 'Quantity',
+    'impuesto': 'Tax 5%',
+    'fecha': 'Date',
+    'hora': 'Time',
+    'pago': 'Payment',
+    'forma_pago': 'Payment',
+    'ingreso_bruto': 'gross income',
+    'margen_bruto': 'gross income'
+}
+
+# Columnas derivadas: destino = factor_a * factor_b (nombres originales)
+COLUMNAS_DERIVADAS = [
+    ('Total', 'precio', 'cantidad_vendida'),
+    ('cogs', 'costo_producto', 'cantidad_vendida'),
+    ('gross income', 'margen', 'cantidad_vendida'),
+]
+
+# Columnas necesarias para los modelos y su valor por defecto
+COLUMNAS_REQUERIDAS = {
+    'Branch': 'T001',
+    'City': 'Email',
+    'Customer type': 'Normal',
+    'Gender': 'M',
+    'Product line': 'General',
+    'Payment': 'Cash',
+    'Unit price': 10.0,
+    'Quantity': 1,
+    'Tax 5%': 0.05,
+    'Total': 10.0,
+    'cogs': 8.0,
+    'gross income': 2.0,
+    'Rating': 4.0
+}
+
+@functools.lru_cache(maxsize=32)
+def compilar_plan_mapeo(columnas: tuple) -> dict:
+    """
+    Resuelve la tabla de sinónimos contra un conjunto de columnas.
+    
+    El plan se calcula una sola vez por esquema y contiene los renombres
+    (aplicados como alias: la columna original se conserva), las columnas
+    derivadas y las columnas constantes que faltan.
+    
+    Args:
+        columnas (tuple): Nombres de columnas del dataset
+        
+    Returns:
+        dict: {'renombres', 'derivadas', 'constantes'}
+    """
+    presentes = set(columnas)
+    renombres = {}
+    
+    # Solo se renombra si el destino no existe; el primer sinónimo gana
+    for col_orig, col_nuevo in MAPEO_COLUMNAS.items():
+        if col_orig == col_nuevo or col_orig in renombres:
+            continue
+        if col_orig in presentes and col_nuevo not in presentes:
+            renombres[col_orig] = col_nuevo
+            presentes.add(col_nuevo)
+    
+    derivadas = [
+        (destino, a, b)
+        for destino, a, b in COLUMNAS_DERIVADAS
+        if a in columnas and b in columnas
+    ]
+    presentes.update(destino for destino, _, _ in derivadas)
+    
+    constantes = {col: valor for col, valor in COLUMNAS_REQUERIDAS.items() if col not in presentes}
+    
+    return {'renombres': renombres, 'derivadas': derivadas, 'constantes': constantes}
+
+def _columna_constante(valor, n: int, index) -> pd.Series:
+    """
+    Columna constante compacta:
+    texto -> categórica de una sola categoría (1 byte por fila),
+    número -> arreglo escribible de tipo reducido (float32 / int8)
+    """
+    if isinstance(valor, str):
+        return pd.Series(pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[valor]),
+                         index=index)
+    dtype = np.float32 if isinstance(valor, float) else np.int8
+    return pd.Series(np.full(n, valor, dtype=dtype), index=index, copy=False)
+
 def mapear_columnas_dataset(df):
     """
     Mapea las columnas del dataset actual a las columnas esperadas por los modelos ML.
@@ -16,112 +151,31 @@ def mapear_columnas_dataset(df):
     - Dataset personalizado en español
     - Otros formatos comunes
     
+    Los sinónimos se añaden como alias sobre una copia superficial: las
+    columnas originales se conservan y, con copy-on-write, el alias comparte
+    los datos de la original sin copiarlos. Las columnas por defecto se
+    representan como constantes compactas.
+    
     Args:
         df (pandas.DataFrame): Dataset con columnas originales
         
     Returns:
         pandas.DataFrame: Dataset con columnas mapeadas para compatibilidad
     """
+    plan = compilar_plan_mapeo(tuple(df.columns))
     
-    # Mapeo principal: columnas comunes -> inglés (esperado por los modelos)
-    mapeo_columnas = {
-        # Mapeo para dataset estándar de Kaggle
-        'Invoice ID': 'Invoice ID',  # Mantener
-        'Branch': 'Branch',  # Ya correcto
-        'City': 'City',      # Ya correcto
-        'Customer type': 'Customer type',  # Ya correcto
-        'Gender': 'Gender',  # Ya correcto
-        'Product line': 'Product line',  # Ya correcto
-        'Unit price': 'Unit price',  # Ya correcto
-        'Quantity': 'Quantity',  # Ya correcto
-        'Tax 5%': 'Tax 5%',  # Ya correcto
-        'Total': 'Total',    # Ya correcto
-        'Date': 'Date',      # Ya correcto
-        'Time': 'Time',      # Ya correcto
-        'Payment': 'Payment', # Ya correcto
-        'cogs': 'cogs',      # Ya correcto
-        'gross margin percentage': 'gross margin percentage',  # Mantener
-        'gross income': 'gross income',  # Ya correcto
-        'Rating': 'Rating',  # Ya correcto
-        
-        # Mapeo para dataset en español (si existe)
-        'tienda_id': 'Branch',
-        'ciudad': 'City',
-        'genero_cliente': 'Gender', 
-        'categoria': 'Product line',
-        'metodo_pago': 'Payment',
-        'frecuencia_compra': 'Customer type',
-        'canal_marketing': 'City',  # Backup para City si no existe
-        'precio': 'Unit price',
-        'cantidad_vendida': 'Quantity', 
-        'descuento': 'Tax 5%',
-        'total': 'Total',
-        'costo_producto': 'cogs',
-        'margen': 'gross income',
-        'satisfaccion_cliente': 'Rating',
-        'calificacion': 'Rating',
-        
-        # Mapeo adicional para variaciones comunes
-        'producto': 'Product line',
-        'linea_producto': 'Product line',
-        'tipo_cliente': 'Customer type',
-        'sucursal': 'Branch',
-        'tienda': 'Branch',
-        'sexo': 'Gender',
-        'genero': 'Gender',
-        'precio_unitario': 'Unit price',
-        'cantidad': 'Quantity',
-        'impuesto': 'Tax 5%',
-        'fecha': 'Date',
-        'hora': 'Time',
-        'pago': 'Payment',
-        'forma_pago': 'Payment',
-        'ingreso_bruto': 'gross income',
-        'margen_bruto': 'gross income'
-    }
-    
-    # Crear una copia del dataframe original
-    df_mapped = df.copy()
-    
-    # Aplicar mapeo solo si la columna original existe y la nueva no existe
-    for col_orig, col_nuevo in mapeo_columnas.items():
-        if col_orig in df_mapped.columns and col_nuevo not in df_mapped.columns:
-            df_mapped[col_nuevo] = df_mapped[col_orig]
+    # Alias sobre una copia superficial: no se copian datos
+    df_mapped = df.copy(deep=False)
+    for col_orig, col_nuevo in plan['renombres'].items():
+        df_mapped[col_nuevo] = df_mapped[col_orig]
     
     # Calcular columnas derivadas necesarias
-    if 'precio' in df.columns and 'cantidad_vendida' in df.columns:
-        df_mapped['Total'] = df['precio'] * df['cantidad_vendida']
-        
-    if 'costo_producto' in df.columns and 'cantidad_vendida' in df.columns:
-        df_mapped['cogs'] = df['costo_producto'] * df['cantidad_vendida']
-        
-    if 'margen' in df.columns and 'cantidad_vendida' in df.columns:
-        df_mapped['gross income'] = df['margen'] * df['cantidad_vendida']
-    
-    # Asegurar que tengamos las columnas necesarias con valores por defecto
-    columnas_requeridas = {
-        'Branch': df_mapped.get('tienda_id', 'T001'),
-        'City': df_mapped.get('canal_marketing', 'Email'), 
-        'Customer type': df_mapped.get('frecuencia_compra', 'Normal'),
-        'Gender': df_mapped.get('genero_cliente', 'M'),
-        'Product line': df_mapped.get('categoria', 'General'),
-        'Payment': df_mapped.get('metodo_pago', 'Cash'),
-        'Unit price': df_mapped.get('precio', 10.0),
-        'Quantity': df_mapped.get('cantidad_vendida', 1),
-        'Tax 5%': df_mapped.get('descuento', 0.05),
-        'Total': df_mapped.get('Total', 10.0),
-        'cogs': df_mapped.get('cogs', 8.0),
-        'gross income': df_mapped.get('gross income', 2.0),
-        'Rating': df_mapped.get('satisfaccion_cliente', 4.0)
-    }
+    for destino, factor_a, factor_b in plan['derivadas']:
+        df_mapped[destino] = df_mapped[factor_a] * df_mapped[factor_b]
     
-    # Añadir columnas faltantes
-    for col, valor_default in columnas_requeridas.items():
-        if col not in df_mapped.columns:
-            if isinstance(valor_default, str):
-                df_mapped[col] = valor_default
-            else:
-                df_mapped[col] = valor_default
+    # Añadir columnas faltantes con valores por defecto
+    for col, valor_default in plan['constantes'].items():
+        df_mapped[col] = _columna_constante(valor_default, len(df_mapped), df_mapped.index)
     
     return df_mapped
 
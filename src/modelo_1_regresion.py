@@ -6,15 +6,33 @@
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.neural_network import MLPRegressor
-from sklearn.impute import SimpleImputer
+import joblib
 
-# Función para preparar los datos para regresión
-def preparar_datos_regresion(df):
+try:
+    from .cache_modelos import clave_modelo, cargar_artefacto, guardar_artefacto
+    from .data_utils import dataframe_fingerprint
+    from .entrenamiento_mlp import entrenar_mlp, parametros_mlp, resolver_config
+    from .preprocesamiento import crear_preprocesador
+except ImportError:
+    from cache_modelos import clave_modelo, cargar_artefacto, guardar_artefacto
+    from data_utils import dataframe_fingerprint
+    from entrenamiento_mlp import entrenar_mlp, parametros_mlp, resolver_config
+    from preprocesamiento import crear_preprocesador
+
+# Hiperparámetros del modelo de regresión (forman parte de la clave de caché)
+HIPERPARAMETROS_REGRESION = {
+    'hidden_layer_sizes': (128, 64, 32),
+    'activation': 'relu',
+    'max_iter': 500,
+    'random_state': 42
+}
+TEST_SIZE = 0.2
+
+# Función para seleccionar las variables de regresión disponibles en el dataset
+def seleccionar_variables_regresion(df):
     # Variables ideales para regresión
     ideal_cat_features = ['Branch', 'City', 'Customer type', 'Gender', 'Product line', 'Payment']
     ideal_num_features = ['Unit price', 'Quantity', 'Tax 5%', 'Total', 'cogs', 'gross income']
@@ -39,38 +57,122 @@ def preparar_datos_regresion(df):
         num_features = [col for col in available_columns 
                        if pd.api.types.is_numeric_dtype(df[col]) and col != target][:6]
     
-    all_features = cat_features + num_features
-    
-    if len(all_features) == 0:
+    if len(cat_features + num_features) == 0:
         raise ValueError("No se encontraron características válidas para regresión")
     
-    X = df[all_features].copy()
-    y = df[target].copy()
+    return cat_features, num_features, target
 
-    # Crear preprocesador dinámicamente
-    transformers = []
-    if cat_features:
-        transformers.append(('cat', OneHotEncoder(handle_unknown='ignore'), cat_features))
-    if num_features:
-        transformers.append(('num', StandardScaler(), num_features))
-    
-    preprocessor = ColumnTransformer(transformers)
+# Función para crear el preprocesador (sin ajustar) de las variables de regresión
+def crear_preprocesador_regresion(cat_features, num_features):
+    return crear_preprocesador(cat_features, num_features, perfil='red_neuronal')
+
+# Función para construir el Pipeline completo (preprocesador + red neuronal)
+def construir_pipeline_regresion(cat_features, num_features, config_entrenamiento=None):
+    hiperparametros = dict(HIPERPARAMETROS_REGRESION, **parametros_mlp(config_entrenamiento))
+    return Pipeline([
+        ('preprocesador', crear_preprocesador_regresion(cat_features, num_features)),
+        ('modelo', MLPRegressor(**hiperparametros))
+    ])
 
-    X_processed = preprocessor.fit_transform(X)
-    return X_processed, y, preprocessor
+# Función para preparar los datos para regresión
+def preparar_datos_regresion(df):
+    """
+    Selecciona las variables de regresión.
+    
+    Returns:
+        tuple: (X con las columnas crudas, y, preprocesador sin ajustar). El
+        preprocesador se ajusta dentro del Pipeline solo con el conjunto de
+        entrenamiento, para no filtrar información del conjunto de prueba.
+    """
+    cat_features, num_features, target = seleccionar_variables_regresion(df)
+    X = df[cat_features + num_features]
+    y = df[target]
+    return X, y, crear_preprocesador_regresion(cat_features, num_features)
 
 # Función para crear y entrenar el modelo de regresión
-def entrenar_regresion(df):
-    X, y, preprocessor = preparar_datos_regresion(df)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    model = MLPRegressor(hidden_layer_sizes=(128, 64, 32), activation='relu', max_iter=500, random_state=42)
-    model.fit(X_train, y_train)
-    y_pred = model.predict(X_test)
+def entrenar_regresion(df, usar_cache=False, cache_dir=None, config_entrenamiento=None, almacen=None):
+    """
+    Entrena el modelo de regresión como un único Pipeline de scikit-learn.
+    
+    El Pipeline ajustado queda en resultados['pipeline'] y acepta DataFrames
+    crudos en `predict` (ver predecir_regresion). `config_entrenamiento`
+    selecciona el modo de entrenamiento de la red (lotes, parada temprana,
+    presupuesto de tiempo o streaming; ver entrenamiento_mlp) y la
+    información del entrenamiento queda en resultados['entrenamiento'].
+    
+    Con usar_cache=True el Pipeline y las métricas se guardan en disco bajo la
+    huella del dataset, las variables y los hiperparámetros; una llamada
+    repetida con los mismos datos devuelve el artefacto guardado sin
+    reentrenar (resultados['desde_cache'] es True).
+    
+    almacen: AlmacenCaracteristicas opcional; si se indica, las columnas se
+    toman de sus bloques base y el paso del perfil (categorías, imputación y
+    escalado) se ajusta solo con las filas de entrenamiento. El preprocesador
+    del Pipeline es entonces un CodificadorPorColumnas.
+    """
+    if usar_cache:
+        clave = clave_modelo(
+            'regresion',
+            dataframe_fingerprint(df, sample_size=None),
+            df.columns,
+            dict(HIPERPARAMETROS_REGRESION, test_size=TEST_SIZE, formato='pipeline', perfil='red_neuronal',
+                 entrenamiento=resolver_config(config_entrenamiento))
+        )
+        artefacto = cargar_artefacto(clave, cache_dir)
+        if artefacto is not None:
+            pipeline = artefacto['pipeline']
+            resultados = artefacto['resultados']
+            resultados.update(pipeline=pipeline, desde_cache=True)
+            return pipeline.named_steps['modelo'], pipeline.named_steps['preprocesador'], resultados
+    
+    cat_features, num_features, target = seleccionar_variables_regresion(df)
+    X = df[cat_features + num_features]
+    y = df[target]
+    
+    # Ajustar el Pipeline paso a paso para aplicar el modo de entrenamiento de la red
+    pipeline = construir_pipeline_regresion(cat_features, num_features, config_entrenamiento)
+    if almacen is not None:
+        # Misma partición que train_test_split sobre X, pero por posiciones
+        pos_train, pos_test = train_test_split(np.arange(len(X)), test_size=TEST_SIZE, random_state=42)
+        X_processed, preprocesador = almacen.codificar(X, cat_features, num_features, 'red_neuronal',
+                                                       filas_ajuste=pos_train)
+        pipeline.steps[0] = ('preprocesador', preprocesador)
+        X_train_processed, X_test_processed = X_processed[pos_train], X_processed[pos_test]
+        y_train, y_test = y.iloc[pos_train], y.iloc[pos_test]
+    else:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=42)
+        X_train_processed = pipeline.named_steps['preprocesador'].fit_transform(X_train)
+        X_test_processed = pipeline.named_steps['preprocesador'].transform(X_test)
+    info_entrenamiento = entrenar_mlp(pipeline.named_steps['modelo'], X_train_processed, y_train,
+                                      config_entrenamiento)
+    y_pred = pipeline.named_steps['modelo'].predict(X_test_processed)
     resultados = {
         'MSE': mean_squared_error(y_test, y_pred),
         'MAE': mean_absolute_error(y_test, y_pred),
         'R2': r2_score(y_test, y_pred),
         'y_test': y_test,
-        'y_pred': y_pred
+        'y_pred': y_pred,
+        'entrenamiento': info_entrenamiento,
+        'desde_cache': False
     }
-    return model, preprocessor, resultados
+    
+    if usar_cache:
+        guardar_artefacto(clave, {'pipeline': pipeline, 'resultados': resultados}, cache_dir)
+    
+    resultados['pipeline'] = pipeline
+    return pipeline.named_steps['modelo'], pipeline.named_steps['preprocesador'], resultados
+
+# Función para predecir sobre nuevas transacciones con el Pipeline ajustado
+def predecir_regresion(pipeline, df_nuevo):
+    """
+    Predice la calificación para un DataFrame crudo en una sola llamada vectorizada.
+    """
+    columnas = list(pipeline.named_steps['preprocesador'].feature_names_in_)
+    return pipeline.predict(df_nuevo[columnas])
+
+# Funciones para persistir el Pipeline ajustado
+def guardar_pipeline_regresion(pipeline, ruta):
+    joblib.dump(pipeline, ruta)
+
+def cargar_pipeline_regresion(ruta):
+    return joblib.load(ruta)
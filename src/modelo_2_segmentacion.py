@@ -6,15 +6,44 @@ import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.pipeline import Pipeline
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, TruncatedSVD
+from scipy import sparse
 from sklearn.neural_network import MLPRegressor
 import matplotlib.pyplot as plt
 import seaborn as sns
+import time
+from joblib import Parallel, delayed
+from sklearn.metrics import silhouette_score
+
+try:
+    from .preprocesamiento import crear_preprocesador
+except ImportError:
+    from preprocesamiento import crear_preprocesador
+
+# Filas a partir de las cuales el motor 'auto' usa MiniBatchKMeans
+UMBRAL_MINIBATCH = 100_000
+# Tamaño de lote por defecto de MiniBatchKMeans
+TAMANO_LOTE_KMEANS = 4096
+MOTORES_CLUSTERING = ('auto', 'kmeans', 'minibatch', 'streaming')
+# Tamaño de la submuestra fija usada para el silhouette del barrido de k
+MUESTRA_SILHOUETTE = 2000
+
+def _rellenar_nulos(serie, rol):
+    if rol == 'cat':
+        return serie.fillna('Unknown')
+    return serie.fillna(serie.median())
 
 # Función para preparar los datos para clustering/autoencoder
-def preparar_datos_segmentacion(df):
+def preparar_datos_segmentacion(df, almacen=None):
+    """
+    Codifica las variables de segmentación con el perfil 'distancias'.
+    
+    almacen: AlmacenCaracteristicas opcional; si se indica, la matriz se arma
+    con los bloques por columna del almacén y el preprocesador retornado es
+    un CodificadorPorColumnas.
+    """
     # Verificar que el DataFrame no esté vacío
     if df.empty:
         raise ValueError("El DataFrame está vacío")
@@ -51,85 +80,281 @@ def preparar_datos_segmentacion(df):
         if col not in df.columns:
             raise ValueError(f"La columna {col} no existe en el DataFrame")
     
+    # Con almacén de características, cada columna se codifica solo si no
+    # está ya en el almacén para estas filas (nulos: 'Unknown' y mediana)
+    if almacen is not None:
+        return almacen.codificar(df, cat_features, num_features, 'distancias')
+    
     X = df[all_features].copy()
     
     # Manejar valores nulos
     for col in cat_features:
         if col in X.columns:
-            X[col] = X[col].fillna('Unknown')
+            X[col] = _rellenar_nulos(X[col], 'cat')
     
     for col in num_features:
         if col in X.columns:
-            X[col] = X[col].fillna(X[col].median())
+            X[col] = _rellenar_nulos(X[col], 'num')
     
-    # Crear preprocesador solo con las columnas disponibles
-    transformers = []
-    if cat_features:
-        transformers.append(('cat', OneHotEncoder(handle_unknown='ignore'), cat_features))
-    if num_features:
-        transformers.append(('num', StandardScaler(), num_features))
-    
-    if not transformers:
-        raise ValueError("No se pueden crear transformadores para las características")
-    
-    preprocessor = ColumnTransformer(transformers)
+    # Perfil 'distancias': con variables one-hot la salida se mantiene dispersa
+    # (CSR, float32) siempre, en lugar de densificarse según la densidad
+    preprocessor = crear_preprocesador(cat_features, num_features, perfil='distancias')
     
     try:
         X_processed = preprocessor.fit_transform(X)
         return X_processed, preprocessor
     except Exception as e:
         raise ValueError(f"Error en el preprocesamiento: {str(e)}")
+
+# Función para crear el reductor de dimensionalidad adecuado a la matriz
+def crear_reductor(X, n_components=6):
+    """
+    TruncatedSVD aleatorizado para matrices dispersas (trabaja sobre los valores
+    no nulos, sin densificar) y PCA aleatorizado para matrices densas.
+    """
+    n_components = max(1, min(n_components, X.shape[1] - 1))
+    if sparse.issparse(X):
+        return TruncatedSVD(n_components=n_components, algorithm='randomized', random_state=42)
+    return PCA(n_components=n_components, svd_solver='randomized', random_state=42)
+
+# Función para elegir el motor de clustering
+def resolver_motor(motor, n_filas):
+    if motor not in MOTORES_CLUSTERING:
+        raise ValueError(f"Motor de clustering no soportado: {motor}")
+    if motor == 'auto':
+        return 'minibatch' if n_filas > UMBRAL_MINIBATCH else 'kmeans'
+    return motor
+
+# Función para crear el modelo de clustering según el motor
+def crear_modelo_clustering(n_clusters, motor='kmeans', batch_size=TAMANO_LOTE_KMEANS):
+    if motor == 'kmeans':
+        return KMeans(n_clusters=n_clusters, random_state=42)
+    return MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, n_init=3, random_state=42)
+
+# Función para ajustar MiniBatchKMeans con partial_fit sobre bloques
+def ajustar_kmeans_por_bloques(bloques, n_clusters, batch_size=TAMANO_LOTE_KMEANS, epocas=1):
+    """
+    Ajusta MiniBatchKMeans en modo streaming.
     
-    preprocessor = ColumnTransformer(transformers)
-    X_processed = preprocessor.fit_transform(X)
+    Args:
+        bloques: Función sin argumentos que retorna un iterable de matrices
+            latentes (se llama una vez por época, puede leer de disco)
+        n_clusters: Número de segmentos
+        batch_size: Tamaño de lote del modelo
+        epocas: Pasadas completas sobre los bloques
     
-    return X_processed, preprocessor
+    Returns:
+        MiniBatchKMeans ajustado
+    """
+    kmeans = crear_modelo_clustering(n_clusters, 'minibatch', batch_size)
+    pendiente = None
+    for _ in range(epocas):
+        for X_bloque in bloques():
+            # El primer partial_fit necesita al menos n_clusters filas
+            if pendiente is not None:
+                X_bloque = np.vstack([pendiente, X_bloque])
+                pendiente = None
+            if not hasattr(kmeans, 'cluster_centers_') and X_bloque.shape[0] < n_clusters:
+                pendiente = X_bloque
+                continue
+            kmeans.partial_fit(X_bloque)
+    if not hasattr(kmeans, 'cluster_centers_'):
+        raise ValueError("No hay suficientes registros para formar los segmentos")
+    return kmeans
+
+def _bloques_en_memoria(X, tamano_bloque):
+    return lambda: (X[i:i + tamano_bloque] for i in range(0, X.shape[0], tamano_bloque))
+
+# Función para agrupar la matriz latente con el motor indicado
+def agrupar(X_latent, n_clusters, motor='auto', batch_size=TAMANO_LOTE_KMEANS):
+    motor = resolver_motor(motor, X_latent.shape[0])
+    if motor == 'streaming':
+        kmeans = ajustar_kmeans_por_bloques(_bloques_en_memoria(X_latent, batch_size * 10),
+                                            n_clusters, batch_size)
+        return kmeans, kmeans.predict(X_latent)
+    kmeans = crear_modelo_clustering(n_clusters, motor, batch_size)
+    return kmeans, kmeans.fit_predict(X_latent)
 
 # Función para segmentar clientes usando KMeans sobre reducción PCA (simulación de autoencoder)
-def segmentar_clientes(df, n_clusters=3):
-    X, preprocessor = preparar_datos_segmentacion(df)
-    # Reducción de dimensionalidad (simulación de embeddings de autoencoder)
-    pca = PCA(n_components=6, random_state=42)
-    X_latent = pca.fit_transform(X)
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42)
-    clusters = kmeans.fit_predict(X_latent)
+def segmentar_clientes(df, n_clusters=3, motor='auto', batch_size=TAMANO_LOTE_KMEANS, almacen=None):
+    """
+    Segmenta clientes con KMeans sobre el espacio latente.
+    
+    motor: 'kmeans' (lote completo), 'minibatch' (MiniBatchKMeans),
+    'streaming' (MiniBatchKMeans con partial_fit por bloques) o 'auto'
+    (MiniBatchKMeans a partir de UMBRAL_MINIBATCH filas).
+    almacen: AlmacenCaracteristicas opcional para reutilizar columnas codificadas.
+    """
+    X_latent, pca, preprocessor = calcular_espacio_latente(df, almacen)
+    kmeans, clusters = agrupar(X_latent, n_clusters, motor, batch_size)
     df_segmentado = df.copy()
     df_segmentado['Segmento'] = clusters
     return df_segmentado, kmeans, pca, preprocessor
 
+# Función para obtener el espacio latente (preprocesamiento + reducción)
+def calcular_espacio_latente(df, almacen=None):
+    X, preprocessor = preparar_datos_segmentacion(df, almacen)
+    # Reducción de dimensionalidad (simulación de embeddings de autoencoder);
+    # sobre la matriz dispersa se usa TruncatedSVD para no densificarla
+    pca = crear_reductor(X)
+    X_latent = pca.fit_transform(X)
+    return X_latent, pca, preprocessor
+
+def _evaluar_k(X_latent, k, motor, batch_size, indices_muestra):
+    inicio = time.perf_counter()
+    kmeans, etiquetas = agrupar(X_latent, k, motor, batch_size)
+    muestra = etiquetas[indices_muestra]
+    silhouette = (silhouette_score(X_latent[indices_muestra], muestra)
+                  if len(np.unique(muestra)) > 1 else np.nan)
+    return {
+        'k': k,
+        'inercia': -kmeans.score(X_latent),
+        'silhouette': silhouette,
+        'segundos': time.perf_counter() - inicio,
+        'modelo': kmeans,
+        'etiquetas': etiquetas.astype(np.int16)
+    }
+
+# Función para evaluar un rango de k en paralelo sobre el mismo espacio latente
+def evaluar_rango_k(df, k_min=2, k_max=8, motor='auto', batch_size=TAMANO_LOTE_KMEANS,
+                    muestra_silhouette=MUESTRA_SILHOUETTE, n_jobs=-1, semilla=42, almacen=None):
+    """
+    Evalúa varios números de segmentos con una sola llamada.
+    
+    El preprocesamiento y la reducción se calculan una vez; la matriz latente
+    se comparte con los procesos del pool (joblib la mapea en memoria cuando
+    es grande) y cada proceso solo ajusta KMeans para su k. El silhouette se
+    calcula sobre la misma submuestra fija para todos los k.
+    
+    Args:
+        df: DataFrame con las variables de segmentación
+        k_min, k_max: Rango de segmentos a evaluar (ambos incluidos)
+        motor: Motor de clustering (ver MOTORES_CLUSTERING)
+        batch_size: Tamaño de lote para MiniBatchKMeans
+        muestra_silhouette: Filas de la submuestra para el silhouette
+        n_jobs: Procesos del pool (-1 usa todos los núcleos)
+        semilla: Semilla de la submuestra
+        almacen: AlmacenCaracteristicas opcional para reutilizar columnas codificadas
+    
+    Returns:
+        dict: 'resumen' (DataFrame con k, inercia, silhouette y segundos),
+        'asignaciones' y 'modelos' por k, 'mejor_k' (máximo silhouette),
+        'reductor' y 'preprocesador'
+    """
+    X_latent, pca, preprocessor = calcular_espacio_latente(df, almacen)
+    n_filas = X_latent.shape[0]
+    k_max = min(k_max, n_filas - 1)
+    if k_max < k_min:
+        raise ValueError("No hay suficientes registros para el rango de segmentos indicado")
+    
+    rng = np.random.default_rng(semilla)
+    indices_muestra = np.sort(rng.choice(n_filas, size=min(muestra_silhouette, n_filas), replace=False))
+    
+    evaluaciones = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(_evaluar_k)(X_latent, k, motor, batch_size, indices_muestra)
+        for k in range(k_min, k_max + 1)
+    )
+    
+    resumen = pd.DataFrame([
+        {clave: e[clave] for clave in ('k', 'inercia', 'silhouette', 'segundos')}
+        for e in evaluaciones
+    ])
+    mejor_k = int(resumen.loc[resumen['silhouette'].idxmax(), 'k']) if resumen['silhouette'].notna().any() else k_min
+    return {
+        'resumen': resumen,
+        'asignaciones': {e['k']: e['etiquetas'] for e in evaluaciones},
+        'modelos': {e['k']: e['modelo'] for e in evaluaciones},
+        'mejor_k': mejor_k,
+        'reductor': pca,
+        'preprocesador': preprocessor
+    }
+
+# Función para construir la segmentación de un k a partir del barrido
+def segmentacion_desde_barrido(df, barrido, n_clusters):
+    """
+    Retorna lo mismo que segmentar_clientes sin volver a ajustar, usando el
+    resultado de evaluar_rango_k calculado sobre el mismo DataFrame.
+    """
+    df_segmentado = df.copy()
+    df_segmentado['Segmento'] = barrido['asignaciones'][n_clusters]
+    return df_segmentado, barrido['modelos'][n_clusters], barrido['reductor'], barrido['preprocesador']
+
+# Función para comparar inercia y tiempo de los motores de clustering
+def comparar_motores(df, n_clusters=3, batch_size=TAMANO_LOTE_KMEANS, motores=('kmeans', 'minibatch', 'streaming'),
+                     almacen=None):
+    """
+    Ajusta cada motor sobre el mismo espacio latente y mide inercia y tiempo.
+    
+    La inercia se evalúa siempre sobre la matriz completa para que los
+    motores sean comparables.
+    
+    Returns:
+        pandas.DataFrame: Motor, inercia, segundos e inercia relativa a KMeans
+    """
+    X_latent, _, _ = calcular_espacio_latente(df, almacen)
+    
+    filas = []
+    for motor in motores:
+        inicio = time.perf_counter()
+        kmeans, _ = agrupar(X_latent, n_clusters, motor, batch_size)
+        segundos = time.perf_counter() - inicio
+        filas.append({'motor': motor, 'inercia': -kmeans.score(X_latent), 'segundos': segundos})
+    
+    comparacion = pd.DataFrame(filas)
+    if 'kmeans' in comparacion['motor'].values:
+        referencia = comparacion.loc[comparacion['motor'] == 'kmeans', 'inercia'].iloc[0]
+        comparacion['inercia_relativa'] = comparacion['inercia'] / referencia
+    return comparacion
+
+def _modas_por_segmento(codigos_segmento, n_segmentos, serie):
+    """
+    Moda de una columna categórica en cada segmento mediante una tabla
+    cruzada construida con bincount (una sola pasada sobre los datos).
+    """
+    codigos, categorias = pd.factorize(serie, sort=True)
+    validos = codigos >= 0
+    n_categorias = len(categorias)
+    if n_categorias == 0:
+        return np.full(n_segmentos, 'N/A', dtype=object)
+    
+    tabla = np.bincount(
+        codigos_segmento[validos].astype(np.int64) * n_categorias + codigos[validos],
+        minlength=n_segmentos * n_categorias
+    ).reshape(n_segmentos, n_categorias)
+    modas = np.asarray(categorias, dtype=object)[tabla.argmax(axis=1)]
+    modas[tabla.sum(axis=1) == 0] = 'N/A'
+    return modas
+
 # Función para caracterizar segmentos
 def caracterizar_segmentos(df_segmentado):
+    """
+    Resume cada segmento: número de registros, media de todas las columnas
+    numéricas disponibles y moda de todas las categóricas disponibles.
+    
+    Las medias se calculan con un único groupby().agg y las modas con una
+    tabla cruzada por bincount, sin recorrer los grupos en Python.
+    """
     # Verificar qué columnas están disponibles para caracterización
     available_cols = df_segmentado.columns.tolist()
+    numeric_cols = ['Total', 'Unit price', 'Quantity', 'Tax 5%', 'cogs', 'gross income', 'Rating']
+    available_numeric = [col for col in numeric_cols if col in available_cols
+                         and pd.api.types.is_numeric_dtype(df_segmentado[col])]
+    categorical_cols = ['Product line', 'Customer type', 'Gender', 'Payment']
+    available_categorical = [col for col in categorical_cols if col in available_cols]
     
-    # Crear caracterización básica por segmento
     try:
-        # Contar número de elementos por segmento
-        segment_summary = df_segmentado.groupby('Segmento').size().to_frame('count')
-        
-        # Agregar estadísticas para columnas numéricas disponibles
-        numeric_cols = ['Total', 'Unit price', 'Quantity', 'Tax 5%', 'cogs', 'gross income', 'Rating']
-        available_numeric = [col for col in numeric_cols if col in available_cols]
-        
-        if available_numeric:
-            for col in available_numeric[:3]:  # Limitar a 3 columnas para evitar sobrecarga
-                try:
-                    segment_summary[f'{col}_mean'] = df_segmentado.groupby('Segmento')[col].mean()
-                except Exception:
-                    continue
-        
-        # Agregar moda para columnas categóricas disponibles
-        categorical_cols = ['Product line', 'Customer type', 'Gender', 'Payment']
-        available_categorical = [col for col in categorical_cols if col in available_cols]
+        # Conteo y medias en una sola agregación
+        agregaciones = {'count': ('Segmento', 'size')}
+        agregaciones.update({f'{col}_mean': (col, 'mean') for col in available_numeric})
+        segment_summary = df_segmentado.groupby('Segmento', sort=True, observed=True).agg(**agregaciones)
         
+        # Modas de todas las categóricas con una tabla cruzada por columna
         if available_categorical:
-            for col in available_categorical[:2]:  # Limitar a 2 columnas categóricas
-                try:
-                    segment_summary[f'{col}_mode'] = df_segmentado.groupby('Segmento')[col].apply(
-                        lambda x: x.value_counts().index[0] if len(x.value_counts()) > 0 else 'N/A'
-                    )
-                except Exception:
-                    continue
+            codigos_segmento = pd.Index(segment_summary.index).get_indexer(df_segmentado['Segmento'])
+            for col in available_categorical:
+                segment_summary[f'{col}_mode'] = _modas_por_segmento(
+                    codigos_segmento, len(segment_summary), df_segmentado[col]
+                )
         
         return segment_summary
         
@@ -4,14 +4,31 @@
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, OneHotEncoder, LabelEncoder
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 from sklearn.neural_network import MLPClassifier
 
-# Función para preparar los datos para clasificación
-def preparar_datos_clasificacion(df):
+try:
+    from .entrenamiento_mlp import entrenar_mlp, entrenar_por_bloques, parametros_mlp, resolver_config
+    from .data_loader import leer_por_bloques, TAMANO_BLOQUE
+    from .preprocesamiento import crear_preprocesador, crear_transformador_numerico
+except ImportError:
+    from entrenamiento_mlp import entrenar_mlp, entrenar_por_bloques, parametros_mlp, resolver_config
+    from data_loader import leer_por_bloques, TAMANO_BLOQUE
+    from preprocesamiento import crear_preprocesador, crear_transformador_numerico
+
+# Hiperparámetros de la red de clasificación
+HIPERPARAMETROS_CLASIFICACION = {
+    'hidden_layer_sizes': (128, 64, 32),
+    'activation': 'relu',
+    'max_iter': 500,
+    'random_state': 42
+}
+# Filas de prueba retenidas como máximo en el entrenamiento incremental
+MAX_FILAS_PRUEBA = 50_000
+
+# Función para seleccionar las variables de clasificación disponibles en el dataset
+def seleccionar_variables_clasificacion(df):
     # Variables ideales para clasificación
     ideal_cat_features = ['Branch', 'City', 'Customer type', 'Gender', 'Payment']
     ideal_num_features = ['Unit price', 'Quantity', 'Tax 5%', 'Total', 'cogs', 'gross income']
@@ -37,11 +54,16 @@ def preparar_datos_clasificacion(df):
         num_features = [col for col in available_columns 
                        if pd.api.types.is_numeric_dtype(df[col]) and col != target][:6]
     
-    all_features = cat_features + num_features
-    
-    if len(all_features) == 0:
+    if len(cat_features + num_features) == 0:
         raise ValueError("No se encontraron características válidas para clasificación")
     
+    return cat_features, num_features, target
+
+# Función para preparar los datos para clasificación
+def preparar_datos_clasificacion(df):
+    cat_features, num_features, target = seleccionar_variables_clasificacion(df)
+    all_features = cat_features + num_features
+    
     X = df[all_features].copy()
     y = df[target].copy()
     
@@ -49,24 +71,39 @@ def preparar_datos_clasificacion(df):
     le = LabelEncoder()
     y_encoded = le.fit_transform(y)
     
-    # Crear preprocesador dinámicamente
-    transformers = []
-    if cat_features:
-        transformers.append(('cat', OneHotEncoder(handle_unknown='ignore'), cat_features))
-    if num_features:
-        transformers.append(('num', StandardScaler(), num_features))
-    
-    preprocessor = ColumnTransformer(transformers)
+    # Crear preprocesador con el perfil de redes neuronales (float32)
+    preprocessor = crear_preprocesador(cat_features, num_features, perfil='red_neuronal')
     X_processed = preprocessor.fit_transform(X)
     
     return X_processed, y_encoded, preprocessor, le
 
 # Función para crear y entrenar el modelo de clasificación
-def entrenar_clasificacion(df):
-    X, y, preprocessor, le = preparar_datos_clasificacion(df)
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    model = MLPClassifier(hidden_layer_sizes=(128, 64, 32), activation='relu', max_iter=500, random_state=42)
-    model.fit(X_train, y_train)
+def entrenar_clasificacion(df, config_entrenamiento=None, almacen=None):
+    """
+    Entrena el modelo de clasificación.
+    
+    `config_entrenamiento` selecciona el modo de entrenamiento de la red
+    (lotes, parada temprana, presupuesto de tiempo o streaming; ver
+    entrenamiento_mlp) y la información queda en resultados['entrenamiento'].
+    
+    almacen: AlmacenCaracteristicas opcional; si se indica, las columnas se
+    toman de sus bloques base y el paso del perfil (categorías, imputación y
+    escalado) se ajusta solo con las filas de entrenamiento.
+    """
+    if almacen is not None:
+        cat_features, num_features, target = seleccionar_variables_clasificacion(df)
+        le = LabelEncoder()
+        y = le.fit_transform(df[target])
+        # Misma partición que train_test_split sobre X, pero por posiciones
+        pos_train, pos_test = train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+        X, preprocessor = almacen.codificar(df[cat_features + num_features], cat_features, num_features,
+                                            'red_neuronal', filas_ajuste=pos_train)
+        X_train, X_test, y_train, y_test = X[pos_train], X[pos_test], y[pos_train], y[pos_test]
+    else:
+        X, y, preprocessor, le = preparar_datos_clasificacion(df)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = MLPClassifier(**dict(HIPERPARAMETROS_CLASIFICACION, **parametros_mlp(config_entrenamiento)))
+    info_entrenamiento = entrenar_mlp(model, X_train, y_train, config_entrenamiento, clases=y)
     y_pred = model.predict(X_test)
     resultados = {
         'accuracy': accuracy_score(y_test, y_pred),
@@ -74,6 +111,172 @@ def entrenar_clasificacion(df):
         'matriz_confusion': confusion_matrix(y_test, y_pred),
         'y_test': y_test,
         'y_pred': y_pred,
-        'label_encoder': le
+        'label_encoder': le,
+        'entrenamiento': info_entrenamiento
+    }
+    return model, preprocessor, resultados
+
+# Función para obtener un iterador de bloques a partir de una ruta, un archivo, un DataFrame o una función
+def _iterar_bloques(fuente, tamano_bloque):
+    if isinstance(fuente, str) or hasattr(fuente, 'read'):
+        if hasattr(fuente, 'seek'):
+            # Archivo subido: se relee desde el inicio en cada época
+            fuente.seek(0)
+        return leer_por_bloques(fuente, tamano_bloque)
+    if isinstance(fuente, pd.DataFrame):
+        return (fuente.iloc[inicio:inicio + tamano_bloque] for inicio in range(0, len(fuente), tamano_bloque))
+    return fuente()
+
+# Filas de prueba de un bloque: misma partición en el ajuste del preprocesador y en el entrenamiento
+def _mascara_prueba(indice_bloque, n_filas, fraccion_prueba, semilla):
+    return np.random.default_rng(semilla + indice_bloque).random(n_filas) < fraccion_prueba
+
+# Primera pasada: categorías, clases y estadísticas de escalado en streaming
+def ajustar_preprocesador_incremental(fuente, tamano_bloque=TAMANO_BLOQUE, fraccion_prueba=0.0, semilla=42):
+    """
+    Ajusta el preprocesador de clasificación en una sola pasada sobre los bloques.
+    
+    Las categorías de cada variable y las clases del objetivo se acumulan como
+    conjuntos, y el StandardScaler se ajusta con `partial_fit`, de modo que
+    nunca hay más de un bloque en memoria. Las filas reservadas para prueba
+    (la misma partición que usa entrenar_clasificacion_incremental) no
+    intervienen en las categorías ni en el escalado; las clases del objetivo
+    sí se toman de todas las filas para poder codificar las de prueba.
+    
+    Args:
+        fuente: Ruta o archivo CSV/XLSX, DataFrame o función sin argumentos
+            que retorna un iterable de DataFrames
+        tamano_bloque: Filas por bloque
+        fraccion_prueba: Proporción de filas de cada bloque reservadas para prueba
+        semilla: Semilla de la partición entrenamiento/prueba
+    
+    Returns:
+        tuple: (preprocesador ajustado, LabelEncoder, variables categóricas,
+        variables numéricas, variable objetivo)
+    """
+    cat_features = num_features = target = None
+    categorias = {}
+    clases = set()
+    scaler = StandardScaler()
+    primer_bloque = None
+    
+    for i, bloque in enumerate(_iterar_bloques(fuente, tamano_bloque)):
+        if cat_features is None:
+            cat_features, num_features, target = seleccionar_variables_clasificacion(bloque)
+            categorias = {col: set() for col in cat_features}
+        bloque = bloque[cat_features + num_features + [target]].dropna()
+        if bloque.empty:
+            continue
+        clases.update(bloque[target].unique().tolist())
+        bloque = bloque[~_mascara_prueba(i, len(bloque), fraccion_prueba, semilla)]
+        if bloque.empty:
+            continue
+        if primer_bloque is None:
+            primer_bloque = bloque
+        for col in cat_features:
+            categorias[col].update(bloque[col].unique().tolist())
+        if num_features:
+            scaler.partial_fit(bloque[num_features].to_numpy(np.float32))
+    
+    if primer_bloque is None:
+        raise ValueError("La fuente de datos no contiene registros válidos para clasificación")
+    
+    preprocessor = crear_preprocesador(
+        cat_features, num_features, perfil='red_neuronal',
+        categorias=[sorted(categorias[col], key=str) for col in cat_features]
+    )
+    
+    # Con las categorías fijadas basta un bloque para ajustar la estructura;
+    # luego se sustituye el escalador por el ajustado en streaming
+    preprocessor.fit(primer_bloque[cat_features + num_features])
+    if num_features:
+        numerico = crear_transformador_numerico('red_neuronal', scaler)
+        numerico.steps[0][1].fit(primer_bloque[num_features])
+        preprocessor.transformers_ = [
+            (nombre, numerico if nombre == 'num' else transformador, columnas)
+            for nombre, transformador, columnas in preprocessor.transformers_
+        ]
+    
+    le = LabelEncoder()
+    le.fit(sorted(clases, key=str))
+    return preprocessor, le, cat_features, num_features, target
+
+# Entrenamiento incremental (fuera de memoria) del modelo de clasificación
+def entrenar_clasificacion_incremental(fuente, tamano_bloque=TAMANO_BLOQUE, config_entrenamiento=None,
+                                       fraccion_prueba=0.2, semilla=42):
+    """
+    Entrena el modelo de clasificación sobre bloques, sin cargar todo el dataset.
+    
+    En cada bloque una fracción fija de filas (elegida con una semilla por
+    bloque) se reserva para evaluación; se retienen como máximo
+    MAX_FILAS_PRUEBA filas. El preprocesador se ajusta en una pasada solo con
+    las filas de entrenamiento (ajustar_preprocesador_incremental) y luego el
+    MLPClassifier se entrena con `partial_fit` bloque a bloque.
+    
+    Args:
+        fuente: Ruta o archivo CSV/XLSX, DataFrame o función sin argumentos
+            que retorna un iterable de DataFrames (se relee una vez por época)
+        tamano_bloque: Filas por bloque
+        config_entrenamiento: Configuración de entrenamiento (ver entrenamiento_mlp)
+        fraccion_prueba: Proporción de filas de cada bloque reservadas para prueba
+        semilla: Semilla de la partición entrenamiento/prueba
+    
+    Returns:
+        tuple: (modelo, preprocesador, resultados) con el mismo formato que entrenar_clasificacion
+    """
+    config = resolver_config(dict(config_entrenamiento or {}, modo='streaming'))
+    preprocessor, le, cat_features, num_features, target = ajustar_preprocesador_incremental(
+        fuente, tamano_bloque, fraccion_prueba, semilla
+    )
+    features = cat_features + num_features
+    
+    model = MLPClassifier(**dict(HIPERPARAMETROS_CLASIFICACION, **parametros_mlp(config)))
+    clases = np.arange(len(le.classes_))
+    prueba_X, prueba_y = [], []
+    filas_prueba = [0]
+    epoca = [0]
+    
+    def bloques_entrenamiento():
+        epoca[0] += 1
+        for i, bloque in enumerate(_iterar_bloques(fuente, tamano_bloque)):
+            bloque = bloque[features + [target]].dropna()
+            if bloque.empty:
+                continue
+            es_prueba = _mascara_prueba(i, len(bloque), fraccion_prueba, semilla)
+            X_bloque = preprocessor.transform(bloque[features])
+            y_bloque = le.transform(bloque[target])
+            
+            # Las filas de prueba se guardan solo durante la primera época
+            if epoca[0] == 1 and es_prueba.any() and filas_prueba[0] < MAX_FILAS_PRUEBA:
+                restantes = MAX_FILAS_PRUEBA - filas_prueba[0]
+                indices = np.flatnonzero(es_prueba)[:restantes]
+                prueba_X.append(X_bloque[indices])
+                prueba_y.append(y_bloque[indices])
+                filas_prueba[0] += len(indices)
+            
+            if (~es_prueba).any():
+                yield X_bloque[~es_prueba], y_bloque[~es_prueba]
+    
+    info_entrenamiento = entrenar_por_bloques(model, bloques_entrenamiento, config, clases=clases)
+    
+    if not prueba_X:
+        raise ValueError("No quedaron filas de prueba para evaluar el modelo")
+    if hasattr(prueba_X[0], 'tocsr'):
+        from scipy import sparse
+        X_test = sparse.vstack(prueba_X)
+    else:
+        X_test = np.vstack(prueba_X)
+    y_test = np.concatenate(prueba_y)
+    y_pred = model.predict(X_test)
+    
+    resultados = {
+        'accuracy': accuracy_score(y_test, y_pred),
+        'reporte': classification_report(y_test, y_pred, labels=clases, target_names=[str(c) for c in le.classes_],
+                                         output_dict=True, zero_division=0),
+        'matriz_confusion': confusion_matrix(y_test, y_pred, labels=clases),
+        'y_test': y_test,
+        'y_pred': y_pred,
+        'label_encoder': le,
+        'entrenamiento': info_entrenamiento
     }
     return model, preprocessor, resultados
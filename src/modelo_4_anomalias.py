@@ -11,56 +11,301 @@ Este modelo utiliza el algoritmo Isolation Forest, una técnica basada en árbol
 - El parámetro `contamination` controla la proporción esperada de anomalías en el conjunto de datos.
 '''
 
+import copy
+import time
+
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
-from sklearn.compose import ColumnTransformer
+import joblib
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.ensemble import IsolationForest
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import classification_report
+from joblib import Parallel, delayed, effective_n_jobs
 
-# Función para preparar los datos para detección de anomalías
-def preparar_datos_anomalias(df, variables):
-    X = df[variables].copy()
+try:
+    from .cache_modelos import clave_modelo, cargar_artefacto, guardar_artefacto
+    from .data_utils import dataframe_fingerprint
+    from .data_loader import leer_por_bloques
+    from .preprocesamiento import crear_preprocesador
+except ImportError:
+    from cache_modelos import clave_modelo, cargar_artefacto, guardar_artefacto
+    from data_utils import dataframe_fingerprint
+    from data_loader import leer_por_bloques
+    from preprocesamiento import crear_preprocesador
+
+# Hiperparámetros por defecto del Isolation Forest
+HIPERPARAMETROS_ANOMALIAS = {
+    'n_estimators': 200,
+    'max_samples': 'auto',
+    'n_jobs': -1
+}
+# Filas por bloque al puntuar la matriz completa
+TAMANO_BLOQUE_PUNTUACION = 50_000
+# Categorías de la columna 'Anomalía' (código 0 = normal, 1 = anomalía)
+CATEGORIAS_ANOMALIA = ['No', 'Sí']
+# Filas por micro-lote al puntuar transacciones en streaming
+TAMANO_LOTE_STREAMING = 1000
 
-    # Convertir todos los tipos de datos de manera simple y robusta
+# Segundos enteros de una columna de fechas (también si llega como texto,
+# p. ej. al puntuar lotes leídos de un CSV)
+def _segundos_fecha(serie):
+    serie = serie if pd.api.types.is_datetime64_any_dtype(serie) else pd.to_datetime(serie)
+    return serie.astype('datetime64[s]').astype(np.int64)
+
+# Conversión de tipos previa a la codificación (función de módulo para poder serializarla)
+def convertir_columna_anomalias(serie, es_fecha=False, origen=0):
+    if pd.api.types.is_datetime64_any_dtype(serie) or es_fecha:
+        # Segundos desde `origen`: el bosque trabaja en float32 y con el epoch
+        # absoluto (~1.5e9 s) la resolución caería a 128 s
+        return _segundos_fecha(serie) - origen
+    if serie.dtype == 'object':
+        # Convertir todos los objetos a string para evitar tipos mixtos
+        return serie.astype(str)
+    return serie
+
+def convertir_tipos_anomalias(X, columnas_fecha=(), origenes=None):
+    origenes = origenes or {}
+    X = X.copy(deep=False)
     for col in X.columns:
-        if pd.api.types.is_datetime64_any_dtype(X[col]):
-            # Convertir datetime a timestamp numérico
-            X[col] = pd.to_datetime(X[col]).astype(np.int64) // 10**9
-        elif X[col].dtype == 'object':
-            # Convertir todos los objetos a string para evitar tipos mixtos
-            X[col] = X[col].astype(str)
-    
-    # Identificar columnas numéricas y categóricas después de la conversión
-    num_features = [col for col in X.columns if pd.api.types.is_numeric_dtype(X[col])]
-    cat_features = [col for col in X.columns if col not in num_features]
-    
-    # Crear preprocesador
-    transformers = []
-    if cat_features:
-        transformers.append(('cat', OneHotEncoder(handle_unknown='ignore'), cat_features))
-    if num_features:
-        transformers.append(('num', StandardScaler(), num_features))
-    
-    if not transformers:
-        raise ValueError("No se encontraron variables válidas para procesar")
-    
-    preprocessor = ColumnTransformer(transformers)
+        X[col] = convertir_columna_anomalias(X[col], col in columnas_fecha, origenes.get(col, 0))
+    return X
+
+class ConversorTiposAnomalias(BaseEstimator, TransformerMixin):
+    """
+    Conversión de tipos con origen ajustado para las fechas.
+
+    Al ajustar guarda la fecha mínima de cada columna de fechas; al
+    transformar las fechas pasan a segundos desde ese origen, que en float32
+    conservan la resolución de 1 s durante ~194 días de rango.
+    """
+
+    def __init__(self, columnas_fecha=()):
+        self.columnas_fecha = columnas_fecha
+
+    def fit(self, X, y=None):
+        self.origenes_ = {}
+        for col in self.columnas_fecha:
+            segundos = _segundos_fecha(X[col])
+            self.origenes_[col] = int(segundos.min()) if len(segundos) else 0
+        return self
+
+    def transform(self, X):
+        return convertir_tipos_anomalias(X, self.columnas_fecha, self.origenes_)
+
+# Función para preparar los datos para detección de anomalías
+def preparar_datos_anomalias(df, variables, almacen=None):
+    """
+    Codifica las variables para el Isolation Forest.
+    
+    Usa el perfil 'arboles' de preprocesamiento: las categóricas se codifican
+    como enteros ordinales (una columna por variable, suficiente para
+    particiones de árboles) y las numéricas pasan sin escalar, ya que el
+    Isolation Forest es invariante a la escala. La salida es una matriz
+    float32 contigua: el bosque trabaja en float32, así que no vuelve a
+    copiarla al ajustar ni al puntuar.
+    
+    El preprocesador retornado incluye la conversión de tipos, de modo que
+    transforma directamente DataFrames nuevos con las mismas variables.
+    
+    almacen: AlmacenCaracteristicas opcional; si se indica, cada columna se
+    codifica solo si no está ya en el almacén para estas filas, y el
+    preprocesador retornado es un CodificadorPorColumnas.
+    """
+    X = df[variables]
+    
+    # Tipos decididos sobre las columnas originales: las fechas pasan a numéricas
+    columnas_fecha = [col for col in variables if pd.api.types.is_datetime64_any_dtype(X[col])]
+    num_features = [col for col in variables
+                    if col in columnas_fecha or (pd.api.types.is_numeric_dtype(X[col])
+                                                 and not pd.api.types.is_bool_dtype(X[col]))]
+    cat_features = [col for col in variables if col not in num_features]
+    
+    if almacen is not None:
+        # El almacén hace su propia conversión base (fechas en segundos desde la mínima)
+        return almacen.codificar(X, cat_features, num_features, 'arboles')
+    
+    # Perfil 'arboles': códigos ordinales y numéricas sin escalar, en float32
+    preprocessor = Pipeline([
+        ('tipos', ConversorTiposAnomalias(columnas_fecha)),
+        ('columnas', crear_preprocesador(cat_features, num_features, perfil='arboles'))
+    ])
     X_processed = preprocessor.fit_transform(X)
     return X_processed, preprocessor
 
+# Función para puntuar una matriz por bloques de filas en paralelo
+def puntuar_por_bloques(model, X, tamano_bloque=TAMANO_BLOQUE_PUNTUACION, n_jobs=-1):
+    """
+    Calcula decision_function por bloques de filas repartidos entre núcleos.
+    
+    Los bloques se procesan con hilos (la evaluación de los árboles libera el
+    GIL), así que la matriz no se copia a otros procesos y la memoria temporal
+    queda acotada por el tamaño del bloque.
+    
+    Returns:
+        numpy.ndarray: Puntuaciones float32 (negativas = anomalía)
+    """
+    n_filas = X.shape[0]
+    inicios = range(0, n_filas, tamano_bloque)
+    if len(inicios) <= 1 or effective_n_jobs(n_jobs) == 1:
+        puntuaciones = [model.decision_function(X[i:i + tamano_bloque]) for i in inicios]
+    else:
+        puntuaciones = Parallel(n_jobs=n_jobs, prefer='threads')(
+            delayed(model.decision_function)(X[i:i + tamano_bloque]) for i in inicios
+        )
+    if not puntuaciones:
+        return np.empty(0, dtype=np.float32)
+    return np.concatenate(puntuaciones).astype(np.float32, copy=False)
+
+# Función para construir las columnas compactas de resultado
+def columnas_anomalia(puntuaciones):
+    """
+    Retorna la etiqueta 'Sí'/'No' como categórica (1 byte por fila) y la
+    puntuación continua en float32.
+    """
+    codigos = (puntuaciones < 0).astype(np.int8)
+    etiqueta = pd.Categorical.from_codes(codigos, categories=CATEGORIAS_ANOMALIA)
+    return etiqueta, puntuaciones
+
+# Función para crear el Isolation Forest con los hiperparámetros del módulo
+def crear_isolation_forest(contamination=0.05, n_jobs=None, max_samples=None):
+    return IsolationForest(
+        n_estimators=HIPERPARAMETROS_ANOMALIAS['n_estimators'],
+        max_samples=HIPERPARAMETROS_ANOMALIAS['max_samples'] if max_samples is None else max_samples,
+        contamination=contamination,
+        n_jobs=HIPERPARAMETROS_ANOMALIAS['n_jobs'] if n_jobs is None else n_jobs,
+        random_state=42
+    )
+
 # Modelo avanzado: Isolation Forest para detección de anomalías
-def detectar_anomalias(df, variables, contamination=0.05):
-    X, preprocessor = preparar_datos_anomalias(df, variables)
-    model = IsolationForest(n_estimators=200, contamination=contamination, random_state=42)
+def detectar_anomalias(df, variables, contamination=0.05, n_jobs=None, max_samples=None,
+                       tamano_bloque=TAMANO_BLOQUE_PUNTUACION, almacen=None):
+    """
+    Ajusta un Isolation Forest y marca las anomalías.
+    
+    Args:
+        df: DataFrame con los datos
+        variables: Variables usadas para la detección
+        contamination: Proporción esperada de anomalías
+        n_jobs: Núcleos para ajustar los árboles y puntuar (-1 = todos)
+        max_samples: Muestras por árbol ('auto' = min(256, n_filas), entero o fracción)
+        tamano_bloque: Filas por bloque al puntuar
+        almacen: AlmacenCaracteristicas opcional para reutilizar columnas codificadas
+    
+    Returns:
+        tuple: (DataFrame con las columnas 'Anomalía' y 'Puntuación anomalía',
+        modelo, preprocesador)
+    """
+    X, preprocessor = preparar_datos_anomalias(df, variables, almacen)
+    n_jobs = HIPERPARAMETROS_ANOMALIAS['n_jobs'] if n_jobs is None else n_jobs
+    model = crear_isolation_forest(contamination, n_jobs, max_samples)
     model.fit(X)
-    pred = model.predict(X)
-    # -1 es anomalía, 1 es normal
-    df_result = df.copy()
-    df_result['Anomalía'] = np.where(pred == -1, 'Sí', 'No')
+    # decision_function < 0 equivale a predict == -1 (anomalía)
+    puntuaciones = puntuar_por_bloques(model, X, tamano_bloque, n_jobs)
+    
+    # Copia superficial: solo se agregan dos columnas compactas
+    df_result = df.copy(deep=False)
+    df_result['Anomalía'], df_result['Puntuación anomalía'] = columnas_anomalia(puntuaciones)
     return df_result, model, preprocessor
 
+# Función para construir el detector persistible (preprocesador + Isolation Forest)
+def construir_detector(preprocessor, model):
+    return Pipeline([('preprocesador', preprocessor), ('modelo', model)])
+
+# Función para entrenar (o recuperar de la caché) el detector de anomalías
+def entrenar_detector(df, variables, contamination=0.05, n_jobs=None, max_samples=None,
+                      usar_cache=False, cache_dir=None, almacen=None):
+    """
+    Ajusta el detector completo: preprocesador e Isolation Forest en un Pipeline
+    que acepta DataFrames crudos y expone decision_function.
+    
+    Con usar_cache=True el detector se guarda en disco bajo la huella del
+    dataset, las variables y los hiperparámetros, y una llamada posterior con
+    los mismos datos lo recupera sin reentrenar.
+    
+    Returns:
+        tuple: (detector, dict con variables, hiperparámetros y 'desde_cache')
+    """
+    hiperparametros = {
+        'contamination': contamination,
+        'n_estimators': HIPERPARAMETROS_ANOMALIAS['n_estimators'],
+        'max_samples': HIPERPARAMETROS_ANOMALIAS['max_samples'] if max_samples is None else max_samples
+    }
+    info = {'variables': list(variables), 'hiperparametros': hiperparametros, 'desde_cache': False}
+    
+    if usar_cache:
+        clave = clave_modelo('anomalias', dataframe_fingerprint(df, sample_size=None), variables, hiperparametros)
+        detector = cargar_artefacto(clave, cache_dir)
+        if detector is not None:
+            info['desde_cache'] = True
+            return detector, info
+    
+    X, preprocessor = preparar_datos_anomalias(df, variables, almacen)
+    model = crear_isolation_forest(contamination, n_jobs, max_samples)
+    model.fit(X)
+    detector = construir_detector(preprocessor, model)
+    
+    if usar_cache:
+        guardar_artefacto(clave, detector, cache_dir)
+    return detector, info
+
+# Función para puntuar un DataFrame con un detector ya ajustado
+def puntuar_detector(detector, df, tamano_bloque=TAMANO_BLOQUE_PUNTUACION, n_jobs=None):
+    """
+    Puntúa nuevas transacciones sin reentrenar.
+    
+    Returns:
+        tuple: (etiqueta 'No'/'Sí' categórica, puntuaciones float32)
+    """
+    X = detector.named_steps['preprocesador'].transform(df)
+    n_jobs = HIPERPARAMETROS_ANOMALIAS['n_jobs'] if n_jobs is None else n_jobs
+    return columnas_anomalia(puntuar_por_bloques(detector.named_steps['modelo'], X, tamano_bloque, n_jobs))
+
+def _lotes(fuente, tamano_lote):
+    if isinstance(fuente, str) or hasattr(fuente, 'read'):
+        # Ruta o archivo subido: lectura por bloques sin cargarlo completo
+        return leer_por_bloques(fuente, tamano_lote)
+    if isinstance(fuente, pd.DataFrame):
+        return (fuente.iloc[i:i + tamano_lote] for i in range(0, len(fuente), tamano_lote))
+    return iter(fuente)
+
+# Función para puntuar transacciones en micro-lotes (archivo, DataFrame o generador)
+def puntuar_en_streaming(detector, fuente, tamano_lote=TAMANO_LOTE_STREAMING):
+    """
+    Puntúa transacciones en micro-lotes con un detector persistido.
+    
+    Args:
+        detector: Pipeline retornado por entrenar_detector o cargar_detector
+        fuente: Ruta o archivo subido (.csv/.xlsx), DataFrame o iterable de DataFrames
+        tamano_lote: Filas por micro-lote al leer archivos o DataFrames
+    
+    Yields:
+        tuple: (DataFrame del lote con 'Anomalía' y 'Puntuación anomalía',
+        dict con número de lote, filas y segundos de puntuación)
+    """
+    # Un solo hilo: con lotes pequeños el reparto entre núcleos cuesta más que puntuar.
+    # Se ajusta en una copia superficial (comparte los árboles) para no tocar el detector,
+    # que puede estar compartido con otras sesiones o puntuaciones en curso
+    preprocesador = detector.named_steps['preprocesador']
+    modelo = copy.copy(detector.named_steps['modelo']).set_params(n_jobs=1)
+    for numero, lote in enumerate(_lotes(fuente, tamano_lote)):
+        if len(lote) == 0:
+            continue
+        inicio = time.perf_counter()
+        puntuaciones = puntuar_por_bloques(modelo, preprocesador.transform(lote), len(lote), n_jobs=1)
+        resultado = lote.copy(deep=False)
+        resultado['Anomalía'], resultado['Puntuación anomalía'] = columnas_anomalia(puntuaciones)
+        yield resultado, {'lote': numero, 'filas': len(lote), 'segundos': time.perf_counter() - inicio}
+
+def guardar_detector(detector, ruta):
+    joblib.dump(detector, ruta)
+
+def cargar_detector(ruta):
+    return joblib.load(ruta)
+
 # Ejemplo de uso en notebook o script:
 # df_anom, modelo, preproc = detectar_anomalias(df, variables, contamination=0.05)
 # print(df_anom[df_anom['Anomalía']=='Sí'])
+# detector, _ = entrenar_detector(df, variables, usar_cache=True)
+# for lote, info in puntuar_en_streaming(detector, 'data/transacciones_nuevas.csv'):
+#     print(info, lote[lote['Anomalía']=='Sí'])
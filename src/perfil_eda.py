@@ -0,0 +1,240 @@
+# Este módulo está alineado y documentado según la arquitectura conceptual ubicada en:
+# C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
+"""
+Motor de perfil para el análisis exploratorio.
+
+Calcula de una vez todas las estadísticas que muestran las secciones del EDA
+(resumen, nulos, duplicados, describe, frecuencias y correlaciones). El
+resultado es un diccionario de objetos pequeños (tablas de resumen, no
+datos), de modo que eda.py puede guardarlo en caché por huella del dataset y
+las funciones de visualización solo dan formato a lo ya calculado.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .data_utils import get_row_index, content_fingerprint
+    from .sketches_categoricos import obtener_sketches
+except ImportError:
+    from data_utils import get_row_index, content_fingerprint
+    from sketches_categoricos import obtener_sketches
+
+# Intervalos de los histogramas precalculados
+BINS_HISTOGRAMA = 30
+# Atípicos enviados como puntos en los boxplots (muestra)
+MAX_ATIPICOS = 200
+# Filas muestreadas para las correlaciones (None = todas)
+MUESTRA_CORRELACION = 200_000
+# Rangos por columna guardados para Spearman
+RANGOS_CACHE_SIZE = 64
+
+# (huella completa, columna, hash de las posiciones muestreadas) -> rangos float32 de la columna muestreada
+_rangos_cache = OrderedDict()
+
+
+def columnas_numericas(df: pd.DataFrame) -> list:
+    return [col for col in df.columns
+            if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])]
+
+
+def columnas_categoricas(df: pd.DataFrame) -> list:
+    return [col for col in df.columns
+            if isinstance(df[col].dtype, pd.CategoricalDtype)
+            or pd.api.types.is_object_dtype(df[col])
+            or pd.api.types.is_string_dtype(df[col])]
+
+
+def resumen_distribucion(serie: pd.Series, bins: int = BINS_HISTOGRAMA,
+                         max_atipicos: int = MAX_ATIPICOS, semilla: int = 42) -> dict:
+    """
+    Agregados de una variable numérica para dibujar histograma y boxplot sin
+    enviar los datos crudos al navegador.
+
+    Returns:
+        dict: Conteos y bordes del histograma, cuartiles, bigotes (regla de
+        1.5 IQR), media, desviación y una muestra de los atípicos
+    """
+    valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    valores = valores[np.isfinite(valores)]
+    if valores.size == 0:
+        return None
+
+    conteos, bordes = np.histogram(valores, bins=bins)
+    minimo, q1, mediana, q3, maximo = np.quantile(valores, [0, 0.25, 0.5, 0.75, 1])
+    iqr = q3 - q1
+    dentro = valores[(valores >= q1 - 1.5 * iqr) & (valores <= q3 + 1.5 * iqr)]
+    atipicos = valores[(valores < q1 - 1.5 * iqr) | (valores > q3 + 1.5 * iqr)]
+    n_atipicos = atipicos.size
+    if n_atipicos > max_atipicos:
+        atipicos = np.random.default_rng(semilla).choice(atipicos, size=max_atipicos, replace=False)
+
+    return {
+        'conteos': conteos,
+        'bordes': bordes,
+        'min': minimo,
+        'q1': q1,
+        'mediana': mediana,
+        'q3': q3,
+        'max': maximo,
+        'bigote_inferior': dentro.min() if dentro.size else minimo,
+        'bigote_superior': dentro.max() if dentro.size else maximo,
+        'media': valores.mean(),
+        'desviacion': valores.std(ddof=1) if valores.size > 1 else 0.0,
+        'atipicos': atipicos,
+        'n_atipicos': int(n_atipicos)
+    }
+
+
+def _posiciones_muestra(n_filas, muestra, semilla=42):
+    if muestra is None or n_filas <= muestra:
+        return None
+    return np.sort(np.random.default_rng(semilla).choice(n_filas, size=muestra, replace=False))
+
+
+def _columna_muestreada(df, columna, posiciones):
+    valores = df[columna].to_numpy(dtype=np.float32, na_value=np.nan)
+    return valores if posiciones is None else valores[posiciones]
+
+
+def _clave_muestra(posiciones):
+    # Identifica las filas muestreadas (tamaño y semilla), no solo cuántas son
+    if posiciones is None:
+        return None
+    return hashlib.blake2b(posiciones.tobytes(), digest_size=16).hexdigest()
+
+
+def _rangos(df, columna, posiciones, huella, clave_muestra):
+    clave = (huella, columna, clave_muestra)
+    if clave in _rangos_cache:
+        _rangos_cache.move_to_end(clave)
+        return _rangos_cache[clave]
+    valores = pd.Series(_columna_muestreada(df, columna, posiciones))
+    rangos = valores.rank(method='average').to_numpy(dtype=np.float32)
+    _rangos_cache[clave] = rangos
+    while len(_rangos_cache) > RANGOS_CACHE_SIZE:
+        _rangos_cache.popitem(last=False)
+    return rangos
+
+
+def matriz_correlacion(df: pd.DataFrame, columnas: list, metodo: str = 'pearson',
+                       muestra: int = MUESTRA_CORRELACION, semilla: int = 42) -> pd.DataFrame:
+    """
+    Matriz de correlación aproximada sobre una muestra de filas, en float32.
+
+    Pearson se calcula como producto matricial de las columnas centradas y
+    normalizadas. Spearman es Pearson sobre los rangos; los rangos de cada
+    columna se guardan por huella completa del dataset, de modo que cambiar la
+    selección de variables no vuelve a ordenarlas. Si hay nulos se usa
+    pandas sobre la muestra (correlación por pares completos).
+
+    Args:
+        df: DataFrame con las variables numéricas
+        columnas: Variables a correlacionar
+        metodo: 'pearson' o 'spearman'
+        muestra: Filas muestreadas (None = todas)
+        semilla: Semilla de la muestra
+
+    Returns:
+        pandas.DataFrame: Matriz de correlación
+    """
+    if metodo not in ('pearson', 'spearman'):
+        raise ValueError(f"Método de correlación no soportado: {metodo}")
+    posiciones = _posiciones_muestra(len(df), muestra, semilla)
+
+    if metodo == 'spearman':
+        huella = content_fingerprint(df)
+        clave_muestra = _clave_muestra(posiciones)
+        X = np.column_stack([_rangos(df, col, posiciones, huella, clave_muestra) for col in columnas])
+    else:
+        X = np.column_stack([_columna_muestreada(df, col, posiciones) for col in columnas])
+
+    if np.isnan(X).any():
+        return pd.DataFrame(X, columns=columnas).corr(method=metodo)
+
+    X = X - X.mean(axis=0, dtype=np.float64).astype(np.float32)
+    normas = np.sqrt(np.einsum('ij,ij->j', X, X))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = (X.T @ X) / np.outer(normas, normas)
+    corr = np.clip(corr, -1, 1)
+    np.fill_diagonal(corr, np.where(normas > 0, 1.0, np.nan))
+    return pd.DataFrame(corr, index=columnas, columns=columnas)
+
+
+def top_pares_correlacion(corr: pd.DataFrame, k: int = 10) -> pd.DataFrame:
+    """
+    Los k pares de variables con mayor correlación absoluta.
+
+    Usa el triángulo superior (np.triu_indices) y np.argpartition, sin
+    recorrer los pares en Python.
+    """
+    valores = corr.to_numpy()
+    filas, columnas = np.triu_indices(len(corr), k=1)
+    pares = valores[filas, columnas]
+    validos = np.flatnonzero(~np.isnan(pares))
+    k = min(k, validos.size)
+    if k == 0:
+        return pd.DataFrame(columns=['Variable 1', 'Variable 2', 'Correlación'])
+
+    absolutos = np.abs(pares[validos])
+    mejores = validos[np.argpartition(-absolutos, k - 1)[:k]]
+    mejores = mejores[np.argsort(-np.abs(pares[mejores]), kind='stable')]
+    return pd.DataFrame({
+        'Variable 1': corr.columns[filas[mejores]],
+        'Variable 2': corr.columns[columnas[mejores]],
+        'Correlación': pares[mejores]
+    })
+
+
+def resumen_categoricas(df: pd.DataFrame, columnas: list) -> tuple:
+    """
+    Top de categorías y cardinalidad de cada columna a partir de sus sketches
+    (construidos en la ingesta o, si faltan, por bloques), sin value_counts().
+
+    Returns:
+        tuple: (frecuencias por columna, dict por columna con errores por
+        categoría, distintos, exacto, error_maximo y nulos)
+    """
+    frecuencias, cardinalidad = {}, {}
+    for col, sketch in obtener_sketches(df, columnas).items():
+        resumen = sketch.resumen()
+        frecuencias[col] = resumen.pop('top').rename('count').rename_axis(col)
+        cardinalidad[col] = resumen
+    return frecuencias, cardinalidad
+
+
+def calcular_perfil(df: pd.DataFrame) -> dict:
+    """
+    Calcula el perfil exploratorio completo de un DataFrame.
+
+    Args:
+        df: DataFrame a perfilar
+
+    Returns:
+        dict: Dimensiones, columnas numéricas y categóricas, nulos por
+        columna, filas duplicadas, describe() de las numéricas, agregados de
+        histograma y boxplot por numérica, top de categorías y cardinalidad
+        por categórica (ver resumen_categoricas) y matriz de correlación de
+        Pearson (muestreada, ver matriz_correlacion)
+    """
+    num_cols = columnas_numericas(df)
+    cat_cols = columnas_categoricas(df)
+    frecuencias, cardinalidad = resumen_categoricas(df, cat_cols)
+
+    return {
+        'filas': len(df),
+        'columnas': df.shape[1],
+        'num_cols': num_cols,
+        'cat_cols': cat_cols,
+        'nulos': df.isnull().sum(),
+        # Índice de hashes por fila: construido en la carga o una sola vez por objeto
+        'duplicados': get_row_index(df)['duplicate_count'],
+        'describe': df[num_cols].describe() if num_cols else pd.DataFrame(),
+        'distribuciones': {col: resumen_distribucion(df[col]) for col in num_cols},
+        'frecuencias': frecuencias,
+        'cardinalidad': cardinalidad,
+        'correlacion': matriz_correlacion(df, num_cols) if len(num_cols) >= 2 else pd.DataFrame()
+    }
@@ -0,0 +1,89 @@
+# Este módulo está alineado y documentado según la arquitectura conceptual ubicada en:
+# C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
+"""
+Preprocesamiento compartido por los cuatro modelos.
+
+Cada modelo pide un perfil según el tipo de algoritmo:
+
+- 'red_neuronal' (regresión y clasificación MLP): one-hot para categóricas y
+  StandardScaler para numéricas.
+- 'distancias' (segmentación PCA/SVD + KMeans): igual que el anterior, pero la
+  salida se mantiene siempre dispersa.
+- 'arboles' (Isolation Forest): códigos ordinales para categóricas y numéricas
+  sin escalar; las particiones de los árboles no dependen de la escala ni
+  necesitan una columna por categoría.
+
+Todas las salidas son float32: las redes, KMeans y los árboles trabajan en
+float32 sin convertir, y la matriz ocupa la mitad que en float64.
+"""
+
+import numpy as np
+from scipy import sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, OrdinalEncoder, StandardScaler
+
+# Perfiles de preprocesamiento por tipo de modelo
+PERFILES = {
+    'red_neuronal': {'categoricas': 'onehot', 'escalar': True, 'sparse_threshold': 0.3},
+    'distancias': {'categoricas': 'onehot', 'escalar': True, 'sparse_threshold': 1.0},
+    'arboles': {'categoricas': 'ordinal', 'escalar': False, 'sparse_threshold': 0.0}
+}
+DTYPE = np.float32
+
+
+def a_float32(X):
+    """Convierte una matriz (densa o dispersa) a float32 sin copiar si ya lo es"""
+    if sparse.issparse(X):
+        return X.astype(DTYPE, copy=False)
+    return np.ascontiguousarray(X, dtype=DTYPE)
+
+
+def _conversor_float32():
+    return FunctionTransformer(a_float32, feature_names_out='one-to-one')
+
+
+def crear_codificador_categorico(perfil='red_neuronal', categorias='auto'):
+    """Codificador de variables categóricas según el perfil"""
+    if PERFILES[perfil]['categoricas'] == 'ordinal':
+        return OrdinalEncoder(categories=categorias, handle_unknown='use_encoded_value',
+                              unknown_value=-1, encoded_missing_value=-1, dtype=DTYPE)
+    return OneHotEncoder(categories=categorias, handle_unknown='ignore', dtype=DTYPE)
+
+
+def crear_transformador_numerico(perfil='red_neuronal', scaler=None):
+    """
+    Transformador de variables numéricas según el perfil. La conversión a
+    float32 va antes del escalado para que el escalador también produzca float32.
+    """
+    if not PERFILES[perfil]['escalar']:
+        return _conversor_float32()
+    return Pipeline([('float32', _conversor_float32()), ('escalar', scaler or StandardScaler())])
+
+
+def crear_preprocesador(cat_features, num_features, perfil='red_neuronal', categorias=None):
+    """
+    Crea el preprocesador (sin ajustar) de un modelo.
+
+    Args:
+        cat_features: Variables categóricas
+        num_features: Variables numéricas
+        perfil: Clave de PERFILES ('red_neuronal', 'distancias' o 'arboles')
+        categorias: Lista de categorías por variable categórica, si ya se
+            conocen (p. ej. acumuladas en streaming); por defecto se infieren
+
+    Returns:
+        ColumnTransformer con salida float32
+    """
+    if perfil not in PERFILES:
+        raise ValueError(f"Perfil de preprocesamiento no soportado: {perfil}")
+
+    transformers = []
+    if cat_features:
+        transformers.append(('cat', crear_codificador_categorico(perfil, categorias or 'auto'), cat_features))
+    if num_features:
+        transformers.append(('num', crear_transformador_numerico(perfil), num_features))
+    if not transformers:
+        raise ValueError("No se encontraron variables válidas para procesar")
+
+    return ColumnTransformer(transformers, sparse_threshold=PERFILES[perfil]['sparse_threshold'])
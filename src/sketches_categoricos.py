@@ -0,0 +1,214 @@
+# Este módulo está alineado y documentado según la arquitectura conceptual ubicada en:
+# C:\Users\efren\Downloads\supermarket_nn_models_entrega\home\ubuntu\supermarket_nn_models\docs\modelos_conceptuales.md
+"""
+Resúmenes (sketches) de variables categóricas construidos por bloques.
+
+Cada columna categórica lleva dos estructuras de tamaño fijo que se actualizan
+bloque a bloque durante la ingesta:
+
+- ContadorFrecuentes (Space-Saving): las `capacidad` categorías más
+  frecuentes con su conteo. Mientras la columna tenga menos categorías que la
+  capacidad los conteos son exactos; si no, cada conteo sobreestima el real
+  como mucho en su error (y el error nunca supera filas / capacidad).
+- ContadorDistintos (HyperLogLog): número de categorías distintas con un error
+  relativo de ~1.04 / sqrt(2 ** precision) (0.8 % con la precisión por defecto).
+
+Así el EDA muestra el top de categorías y la cardinalidad de columnas como
+Invoice ID sin un value_counts() completo sobre millones de valores únicos.
+Los sketches se registran para cada objeto DataFrame (ver
+data_utils.register_column_sketches) y data_loader los guarda junto a la
+caché columnar con el hash del contenido de la fuente.
+"""
+
+import numpy as np
+import pandas as pd
+
+try:
+    from .data_utils import NULL_TOKENS, register_column_sketches, get_column_sketches
+except ImportError:
+    from data_utils import NULL_TOKENS, register_column_sketches, get_column_sketches
+
+# Categorías vigiladas por el contador de frecuentes
+CAPACIDAD_FRECUENTES = 1000
+# Bits del índice de registro de HyperLogLog (2 ** 14 registros = 16 KB)
+PRECISION_HLL = 14
+# Filas por bloque al construir los sketches de un DataFrame en memoria
+TAMANO_BLOQUE_SKETCH = 100_000
+
+
+class ContadorFrecuentes:
+    """
+    Contador de categorías frecuentes (Space-Saving) combinable por bloques.
+
+    Cada bloque se cuenta de forma exacta y se combina con el resumen: las
+    categorías nuevas entran con el conteo mínimo del resumen como error y,
+    si se supera la capacidad, se conservan las de mayor conteo.
+    """
+
+    def __init__(self, capacidad: int = CAPACIDAD_FRECUENTES):
+        self.capacidad = capacidad
+        self.conteos = pd.Series(dtype='int64')
+        self.errores = pd.Series(dtype='int64')
+        # Cota del conteo de cualquier categoría que no está en el resumen
+        self.minimo = 0
+
+    @property
+    def exacto(self) -> bool:
+        """True si nunca se descartó una categoría (conteos exactos)"""
+        return self.minimo == 0
+
+    def agregar_conteos(self, conteos: pd.Series):
+        """
+        Agrega los conteos exactos de un bloque. El bloque se reduce antes a
+        sus `capacidad` categorías mayores; la siguiente es la cota de las
+        descartadas, de modo que la combinación nunca pasa de 2 * capacidad.
+        """
+        minimo = 0
+        if len(conteos) > self.capacidad:
+            conteos = conteos.nlargest(self.capacidad + 1)
+            minimo = int(conteos.iloc[-1])
+            conteos = conteos.iloc[:-1]
+        conteos = pd.Series(conteos.to_numpy(dtype='int64'), index=pd.Index(conteos.index, dtype=object))
+        self.combinar(conteos, pd.Series(0, index=conteos.index, dtype='int64'), minimo)
+
+    def combinar(self, conteos: pd.Series, errores: pd.Series, minimo: int = 0):
+        """Combina otro resumen (conteos, errores y su cota `minimo`)"""
+        union = self.conteos.index.union(conteos.index)
+        nuevos = (self.conteos.reindex(union, fill_value=self.minimo)
+                  + conteos.reindex(union, fill_value=minimo))
+        nuevos_errores = (self.errores.reindex(union, fill_value=self.minimo)
+                          + errores.reindex(union, fill_value=minimo))
+
+        if len(union) > self.capacidad:
+            conservar = np.argsort(-nuevos.to_numpy(), kind='stable')[:self.capacidad]
+            nuevos = nuevos.iloc[conservar]
+            nuevos_errores = nuevos_errores.iloc[conservar]
+            self.minimo = int(nuevos.iloc[-1])
+        else:
+            self.minimo += minimo
+        self.conteos = nuevos
+        self.errores = nuevos_errores
+
+    def top(self, k: int = None) -> pd.Series:
+        """Categorías más frecuentes ordenadas por conteo (estimado)"""
+        top = self.conteos.sort_values(ascending=False, kind='stable')
+        return top if k is None else top.head(k)
+
+
+class ContadorDistintos:
+    """
+    Contador de valores distintos (HyperLogLog) sobre hashes uint64.
+
+    Los primeros `precision` bits del hash eligen el registro y el registro
+    guarda la posición máxima del primer bit a 1 del resto del hash.
+    """
+
+    def __init__(self, precision: int = PRECISION_HLL):
+        # El resto del hash debe caber exacto en un float64 (ver actualizar_hashes)
+        if not 11 <= precision <= 18:
+            raise ValueError(f"Precisión de HyperLogLog fuera de rango: {precision}")
+        self.precision = precision
+        self.registros = np.zeros(1 << precision, dtype=np.uint8)
+
+    def actualizar_hashes(self, hashes: np.ndarray):
+        bits_resto = 64 - self.precision
+        indices = (hashes >> np.uint64(bits_resto)).astype(np.intp)
+        resto = hashes & np.uint64((1 << bits_resto) - 1)
+        # frexp da la longitud en bits exacta porque resto < 2 ** 53
+        _, longitud = np.frexp(resto.astype(np.float64))
+        rangos = (bits_resto - longitud + 1).astype(np.uint8)
+        np.maximum.at(self.registros, indices, rangos)
+
+    def combinar(self, otro: 'ContadorDistintos'):
+        np.maximum(self.registros, otro.registros, out=self.registros)
+
+    def estimar(self) -> int:
+        m = len(self.registros)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimacion = alpha * m * m / np.sum(np.ldexp(1.0, -self.registros.astype(np.int64)))
+        ceros = int(np.count_nonzero(self.registros == 0))
+        # Corrección de rango pequeño: conteo lineal
+        if estimacion <= 2.5 * m and ceros:
+            estimacion = m * np.log(m / ceros)
+        return int(round(estimacion))
+
+
+class SketchCategorico:
+    """Sketches de una columna categórica: frecuentes, distintos y nulos"""
+
+    def __init__(self, capacidad: int = CAPACIDAD_FRECUENTES, precision: int = PRECISION_HLL):
+        self.frecuentes = ContadorFrecuentes(capacidad)
+        self.distintos = ContadorDistintos(precision)
+        self.filas = 0
+        self.nulos = 0
+
+    def actualizar(self, serie: pd.Series):
+        """Actualiza los sketches con un bloque; todo se calcula sobre sus valores únicos"""
+        conteos = serie.value_counts(sort=False)
+        conteos = conteos[conteos.to_numpy() > 0]
+        if not pd.api.types.is_numeric_dtype(conteos.index):
+            # Tras _normalizar_tipos los nulos de texto llegan como 'nan'
+            conteos = conteos[~conteos.index.isin(NULL_TOKENS)]
+        self.filas += len(serie)
+        self.nulos += len(serie) - int(conteos.sum())
+        if len(conteos):
+            self.frecuentes.agregar_conteos(conteos)
+            self.distintos.actualizar_hashes(
+                pd.util.hash_array(conteos.index.to_numpy(dtype=object), categorize=False)
+            )
+
+    def cardinalidad(self) -> int:
+        if self.frecuentes.exacto:
+            return len(self.frecuentes.conteos)
+        return max(self.distintos.estimar(), len(self.frecuentes.conteos))
+
+    def resumen(self, k: int = None) -> dict:
+        """
+        Returns:
+            dict: Top de categorías, su error por categoría (el conteo real
+            está entre top - errores y top), cardinalidad, si ambos son
+            exactos, error máximo de los conteos y nulos
+        """
+        top = self.frecuentes.top(k)
+        return {
+            'top': top,
+            'errores': self.frecuentes.errores.reindex(top.index),
+            'distintos': self.cardinalidad(),
+            'exacto': self.frecuentes.exacto,
+            'error_maximo': int(self.frecuentes.errores.max()) if len(self.frecuentes.errores) else 0,
+            'nulos': self.nulos
+        }
+
+
+def actualizar_sketches(sketches: dict, bloque: pd.DataFrame, columnas: list):
+    """Actualiza (o crea) los sketches de `columnas` con un bloque de filas"""
+    for col in columnas:
+        if col not in sketches:
+            sketches[col] = SketchCategorico()
+        sketches[col].actualizar(bloque[col])
+
+
+def construir_sketches(df: pd.DataFrame, columnas: list,
+                       tamano_bloque: int = TAMANO_BLOQUE_SKETCH) -> dict:
+    """Construye los sketches de un DataFrame en memoria recorriéndolo por bloques"""
+    sketches = {}
+    for inicio in range(0, len(df), tamano_bloque):
+        actualizar_sketches(sketches, df.iloc[inicio:inicio + tamano_bloque], columnas)
+    for col in columnas:
+        sketches.setdefault(col, SketchCategorico())
+    return sketches
+
+
+def obtener_sketches(df: pd.DataFrame, columnas: list) -> dict:
+    """
+    Sketches de las columnas pedidas: los construidos en la ingesta si están
+    registrados para este DataFrame y cubren todas sus filas, o construidos
+    ahora (una sola vez por objeto) para las que falten.
+    """
+    sketches = dict(get_column_sketches(df) or {})
+    faltantes = [col for col in columnas
+                 if col not in sketches or sketches[col].filas != len(df)]
+    if faltantes:
+        sketches.update(construir_sketches(df, faltantes))
+        register_column_sketches(df, sketches)
+    return {col: sketches[col] for col in columnas}
@@ -0,0 +1,336 @@
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import pandas as pd
+from src import cache_datos
+
+# Prueba de la caché columnar: la segunda carga debe servirse desde Parquet
+def test_cache_columnar(tmp_path):
+    ruta = tmp_path / 'ventas.csv'
+    pd.DataFrame({'Branch': ['A', 'B'], 'Total': [10.5, 20.0]}).to_csv(ruta, index=False)
+    cache_dir = str(tmp_path / 'cache')
+
+    df1, info1 = cache_datos.cargar_con_cache(str(ruta), pd.read_csv, cache_dir=cache_dir)
+    df2, info2 = cache_datos.cargar_con_cache(str(ruta), pd.read_csv, cache_dir=cache_dir)
+    assert info1['cache'] == 'miss'
+    assert info2['cache'] == 'hit'
+    pd.testing.assert_frame_equal(df1, df2, check_dtype=False)
+
+    # Cambiar el archivo fuente invalida la caché
+    pd.DataFrame({'Branch': ['C'], 'Total': [1.0]}).to_csv(ruta, index=False)
+    df3, info3 = cache_datos.cargar_con_cache(str(ruta), pd.read_csv, cache_dir=cache_dir)
+    assert info3['cache'] == 'miss'
+    assert len(df3) == 1
+
+# Prueba del catálogo: los metadatos se obtienen sin cargar el archivo y se guardan en el manifiesto
+def test_catalogo_metadatos(tmp_path):
+    import json
+    from src import catalogo_datos
+    ruta = tmp_path / 'ventas.xlsx'
+    pd.DataFrame({'Branch': ['A', 'B', 'C'], 'Total': [10.5, 20.0, 7.25]}).to_excel(ruta, index=False)
+    manifiesto = str(tmp_path / 'catalogo.json')
+
+    info = catalogo_datos.obtener_metadatos(str(ruta), manifiesto)
+    assert info['registros'] == 3
+    assert info['columnas'] == ['Branch', 'Total']
+    assert os.path.exists(manifiesto)
+
+    # CSV con un campo entrecomillado de varias líneas: cuenta registros, no líneas
+    ruta_csv = tmp_path / 'notas.csv'
+    pd.DataFrame({'Nota': ['una\nnota', 'otra'], 'Total': [1.0, 2.0]}).to_csv(ruta_csv, index=False)
+    info_csv = catalogo_datos.obtener_metadatos(str(ruta_csv), manifiesto)
+    assert info_csv['registros'] == 2 and info_csv['registros_exactos']
+
+    # Las entradas de archivos borrados se eliminan al actualizar el manifiesto
+    os.remove(ruta)
+    catalogo_datos.obtener_metadatos(str(ruta_csv), manifiesto)
+    os.utime(ruta_csv, ns=(0, 0))
+    catalogo_datos.obtener_metadatos(str(ruta_csv), manifiesto)
+    with open(manifiesto, encoding='utf-8') as f:
+        assert list(json.load(f)) == [os.path.abspath(ruta_csv)]
+
+# Prueba de la ingesta por bloques: debe producir el mismo DataFrame que la lectura completa
+def test_carga_por_bloques(tmp_path):
+    from src import data_loader
+    ruta = tmp_path / 'ventas.csv'
+    pd.DataFrame({
+        'Branch': ['A', 'B', 'C', 'A', 'B'],
+        'Quantity': [1, 2, None, 4, 5],
+        'Total': [10.5, 20.0, 7.25, 1.0, 3.5]
+    }).to_csv(ruta, index=False)
+
+    df_completo = data_loader._leer_archivo(str(ruta))
+    df_bloques = data_loader.cargar_por_bloques(str(ruta), tamano_bloque=2,
+                                                ruta_manifiesto=str(tmp_path / 'catalogo.json'))
+    pd.testing.assert_frame_equal(df_completo, df_bloques)
+
+    # Tipos que cambian entre bloques: enteros que pasan a decimales, texto
+    # con bloques solo nulos, identificadores únicos y fechas/horas
+    n = 60
+    pd.DataFrame({
+        'Invoice ID': [f"{i:03d}-{i * 7 % 100:02d}" for i in range(n)],
+        'Branch': [None] * 10 + ['A', 'B', 'C'] * 16 + ['A', None],
+        'Quantity': list(range(20)) + [1000 + i / 2 for i in range(40)],
+        'Rating': [None] * 10 + [i % 10 / 2 for i in range(50)],
+        'Date': ['1/5/2019', '3/8/2019', '3/3/2019'] * 20,
+        'Time': ['13:08', '10:29', '13:23', '20:33'] * 15
+    }).to_csv(ruta, index=False)
+    df_completo = data_loader._leer_archivo(str(ruta))
+    df_bloques = data_loader.cargar_por_bloques(str(ruta), tamano_bloque=10,
+                                                ruta_manifiesto=str(tmp_path / 'catalogo.json'))
+    pd.testing.assert_frame_equal(df_completo, df_bloques)
+    assert str(df_bloques['Branch'].dtype) == 'category'
+    assert df_bloques['Rating'].dtype == 'float32'
+    assert df_bloques['Time'].dtype == 'timedelta64[ns]'
+
+# Prueba del planificador de tipos: categorías para texto repetido y downcast sin pérdida
+def test_tipos_compactos():
+    from src.data_utils import compact_dtypes
+    df = pd.DataFrame({
+        'Branch': ['A', 'B', 'C', 'A'] * 25,
+        'Quantity': [1, 5, 10, 3] * 25,
+        'Unit price': [74.69, 15.28, 46.33, 58.22] * 25,
+        'Date': ['1/5/2019', '3/8/2019', '3/3/2019', '1/27/2019'] * 25
+    })
+    df_compacto, reporte = compact_dtypes(df)
+    assert str(df_compacto['Branch'].dtype) == 'category'
+    assert df_compacto['Quantity'].dtype == 'int8'
+    # 74.69 no es representable en float32: se conserva float64
+    assert df_compacto['Unit price'].dtype == 'float64'
+    assert pd.api.types.is_datetime64_any_dtype(df_compacto['Date'])
+    assert (reporte.set_index('column').loc['Branch', 'saved_bytes']) > 0
+
+# Prueba de la detección de fechas: formatos mezclados y combinación Date + Time
+def test_fechas_y_marca_de_tiempo():
+    from src.data_utils import infer_datetime_formats, compact_dtypes
+    fechas = pd.Series(['1/27/2019', '2019-03-08 00:00:00', '2/25/2019', 'nan'])
+    tipo, formatos = infer_datetime_formats(fechas)
+    assert tipo == 'datetime'
+    assert set(formatos) == {'%m/%d/%Y', '%Y-%m-%d %H:%M:%S'}
+
+    df = pd.DataFrame({'Date': fechas, 'Time': ['13:08:00', '10:29:00', '20:33:00', '09:00:00'],
+                       'Invoice ID': ['1/1/2019', '1/2/2019', '1/3/2019', '1/4/2019']})
+    df_compacto, _ = compact_dtypes(df)
+    # Sin add_timestamp el esquema no cambia y solo se interpretan las columnas conocidas
+    assert 'Datetime' not in df_compacto.columns
+    assert not pd.api.types.is_datetime64_any_dtype(df_compacto['Invoice ID'])
+    df_compacto, _ = compact_dtypes(df, add_timestamp=True)
+    assert df_compacto['Datetime'].iloc[0] == pd.Timestamp('2019-01-27 13:08:00')
+    assert pd.isna(df_compacto['Datetime'].iloc[3])
+
+# Prueba de la optimización memorizada: un DataFrame ya optimizado se devuelve sin copiar
+def test_optimizacion_memorizada():
+    from src.data_utils import optimize_dataframe_for_streamlit, dataframe_fingerprint
+    df = pd.DataFrame({'Branch': ['A', 'B'] * 50, 'Quantity': list(range(100))})
+    df_opt = optimize_dataframe_for_streamlit(df)
+    assert str(df_opt['Branch'].dtype) == 'category'
+    assert optimize_dataframe_for_streamlit(df_opt) is df_opt
+    # El DataFrame original no se modifica
+    assert df['Quantity'].dtype == 'int64'
+
+    # Modificar el resultado no contamina la caché
+    df_opt.loc[0, 'Quantity'] = 99
+    assert optimize_dataframe_for_streamlit(df)['Quantity'].iloc[0] == 0
+
+    # Una edición en el lugar cambia la huella del mismo objeto
+    huella = dataframe_fingerprint(df)
+    df.loc[0, 'Quantity'] = 7
+    assert dataframe_fingerprint(df) != huella
+    assert optimize_dataframe_for_streamlit(df)['Quantity'].iloc[0] == 7
+
+    # Un DataFrame con la misma forma y las mismas filas muestreadas no recibe
+    # el resultado de otro: la caché se indexa por la huella completa
+    grande = pd.DataFrame({'Branch': ['A', 'B'] * 2500, 'Total': [1.0] * 5000})
+    optimize_dataframe_for_streamlit(grande)
+    editado = grande.copy()
+    editado.loc[1:2, 'Total'] = -999.0
+    assert dataframe_fingerprint(editado) == dataframe_fingerprint(grande)
+    assert optimize_dataframe_for_streamlit(editado)['Total'].iloc[1] == -999.0
+
+# Prueba del motor de mapeo: alias de sinónimos sin copiar y columnas derivadas
+def test_mapeo_columnas():
+    from src.mapeo_columnas import mapear_columnas_dataset
+    df = pd.DataFrame({'precio': [2.0, 3.0], 'cantidad_vendida': [4, 5], 'categoria': ['x', 'y']})
+    df_mapeado = mapear_columnas_dataset(df)
+    assert list(df.columns) == ['precio', 'cantidad_vendida', 'categoria']
+    assert df_mapeado['Total'].tolist() == [8.0, 15.0]
+    assert df_mapeado['Product line'].tolist() == ['x', 'y']
+    # Las columnas originales se conservan junto a sus alias
+    assert df_mapeado['categoria'].tolist() == ['x', 'y']
+    assert df_mapeado['Branch'].tolist() == ['T001', 'T001']
+    assert str(df_mapeado['Branch'].dtype) == 'category'
+    # Las constantes numéricas admiten asignaciones en el lugar
+    df_mapeado.loc[0, 'Rating'] = 9.0
+    assert df_mapeado['Rating'].tolist() == [9.0, 4.0]
+
+# Prueba del perfil exploratorio calculado en una pasada
+def test_perfil_eda():
+    from src.perfil_eda import calcular_perfil
+    df = pd.DataFrame({
+        'Branch': pd.Categorical(['A', 'B', 'A', 'A']), 'Payment': ['Cash', 'Cash', None, 'Cash'],
+        'Total': [10.0, 20.0, 10.0, 10.0], 'Quantity': [1, 2, 1, 1]
+    })
+    perfil = calcular_perfil(df)
+    assert perfil['num_cols'] == ['Total', 'Quantity']
+    assert perfil['cat_cols'] == ['Branch', 'Payment']
+    assert perfil['nulos']['Payment'] == 1
+    assert perfil['duplicados'] == 1
+    assert perfil['frecuencias']['Branch']['A'] == 3
+    assert perfil['describe'].loc['mean', 'Total'] == 12.5
+    assert perfil['correlacion'].shape == (2, 2)
+
+# Prueba de los agregados de histograma y boxplot calculados en el servidor
+def test_resumen_distribucion():
+    import numpy as np
+    from src.perfil_eda import resumen_distribucion
+    serie = pd.Series([float(i) for i in range(1, 101)] + [1000.0, None])
+    dist = resumen_distribucion(serie, bins=10, max_atipicos=5)
+    assert dist['conteos'].sum() == 101 and len(dist['bordes']) == 11
+    assert dist['mediana'] == 51.0
+    assert dist['bigote_superior'] == 100.0
+    assert list(dist['atipicos']) == [1000.0] and dist['n_atipicos'] == 1
+    muchos = pd.Series(np.r_[np.zeros(1000), np.full(50, 1e6)])
+    assert len(resumen_distribucion(muchos, max_atipicos=5)['atipicos']) == 5
+    assert resumen_distribucion(pd.Series([None, None], dtype=float)) is None
+
+# Prueba del motor de correlaciones muestreado y de los pares más fuertes
+def test_matriz_correlacion():
+    import numpy as np
+    from src.perfil_eda import matriz_correlacion, top_pares_correlacion
+    rng = np.random.default_rng(0)
+    x = rng.standard_normal(5000)
+    df = pd.DataFrame({'x': x, 'doble': 2 * x, 'cubo': x ** 3, 'ruido': rng.standard_normal(5000),
+                       'constante': 1.0})
+    columnas = list(df.columns)
+    for metodo in ('pearson', 'spearman'):
+        corr = matriz_correlacion(df, columnas, metodo=metodo, muestra=None)
+        esperado = df.corr(method=metodo)
+        assert np.allclose(corr.to_numpy(), esperado.to_numpy(), atol=1e-4, equal_nan=True)
+    assert matriz_correlacion(df, columnas, metodo='spearman', muestra=1000).loc['x', 'cubo'] > 0.999
+    # Otra semilla es otra muestra: sus rangos no salen de la caché de la primera
+    for semilla in (1, 2):
+        muestra = df.iloc[np.sort(np.random.default_rng(semilla).choice(len(df), size=1000, replace=False))]
+        esperado = muestra[['x', 'ruido']].corr(method='spearman').iloc[0, 1]
+        obtenido = matriz_correlacion(df, ['x', 'ruido'], metodo='spearman', muestra=1000, semilla=semilla).iloc[0, 1]
+        assert abs(obtenido - esperado) < 1e-4
+    top = top_pares_correlacion(matriz_correlacion(df, columnas, muestra=None), k=2)
+    assert list(top['Variable 2']) == ['doble', 'cubo']
+    # Datos con la misma huella muestreada pero otros valores no reutilizan los rangos
+    from src.data_utils import dataframe_fingerprint
+    editado = df.copy()
+    editado.loc[1:2, 'ruido'] = [100.0, 200.0]
+    assert dataframe_fingerprint(editado) == dataframe_fingerprint(df)
+    esperado = editado[['x', 'ruido']].corr(method='spearman').iloc[0, 1]
+    matriz_correlacion(df, ['x', 'ruido'], metodo='spearman', muestra=None)
+    obtenido = matriz_correlacion(editado, ['x', 'ruido'], metodo='spearman', muestra=None).iloc[0, 1]
+    assert abs(obtenido - esperado) < 1e-4
+    con_nulos = df.assign(x=df['x'].where(df.index % 10 > 0))
+    assert abs(matriz_correlacion(con_nulos, ['x', 'doble']).iloc[0, 1] - 1) < 1e-6
+
+# Prueba del índice de hashes por fila: duplicados, búsqueda y cambios entre cargas
+def test_indice_filas(tmp_path, monkeypatch):
+    import numpy as np
+    from src import data_utils, data_loader
+    df = pd.DataFrame({'Branch': ['A', 'B', 'A', 'C'], 'Total': [1.0, 2.0, 1.0, 3.0]})
+    indice = data_utils.build_row_index(df)
+    assert indice['duplicate_count'] == df.duplicated().sum() == 1
+    assert list(data_utils.find_duplicate_rows(df, 0)) == [0, 2]
+    assert data_utils.validate_data_quality(df)['duplicate_rows'] == 1
+    assert data_utils.validate_data_quality(df)['categorical_columns'] == 1
+
+    # Otro DataFrame con la misma forma y las mismas filas muestreadas no
+    # recibe el índice del primero
+    base = pd.DataFrame({'id': np.arange(5000), 'Total': np.arange(5000) * 1.5})
+    assert data_utils.validate_data_quality(base)['duplicate_rows'] == 0
+    copia = base.copy()
+    copia.iloc[1:4] = base.iloc[5].to_numpy()
+    assert data_utils.dataframe_fingerprint(copia) == data_utils.dataframe_fingerprint(base)
+    assert data_utils.validate_data_quality(copia)['duplicate_rows'] == 3
+    assert list(data_utils.find_duplicate_rows(copia, 5)) == [1, 2, 3, 5]
+    optimizado = data_utils.optimize_dataframe_for_streamlit(copia)
+    assert data_utils.validate_data_quality(optimizado)['duplicate_rows'] == 3
+
+    ruta = str(tmp_path / 'ventas.csv')
+    cache_dir = str(tmp_path / 'cache')
+    assert data_loader._indexar_filas(ruta, df, {'cache': 'miss', 'huella_fuente': 'v1'}, cache_dir) is None
+    hashes, huella = cache_datos.cargar_hashes(ruta, cache_dir)
+    assert len(hashes) == 4 and huella == 'v1'
+
+    df2 = pd.DataFrame({'Branch': ['A', 'B', 'A', 'D', 'E'], 'Total': [1.0, 2.5, 1.0, 3.0, 4.0]})
+    cambios = data_loader._indexar_filas(ruta, df2, {'cache': 'miss', 'huella_fuente': 'v2'}, cache_dir)
+    assert list(cambios['changed_rows']) == [1, 3, 4]
+    assert cambios['removed'] == 2
+
+    # Con caché hit y la misma fuente se reutilizan los hashes guardados
+    assert data_loader._indexar_filas(ruta, df2, {'cache': 'hit', 'huella_fuente': 'v2'}, cache_dir) is None
+    assert not isinstance(data_utils.get_row_index(df2)['hashes'], np.memmap)
+
+    # Hashes guardados de otra versión de la fuente no se reutilizan aunque
+    # coincida el número de filas
+    df3 = df2.assign(Total=[9.0, 2.5, 9.0, 3.0, 4.0])
+    cambios = data_loader._indexar_filas(ruta, df3, {'cache': 'hit', 'huella_fuente': 'v3'}, cache_dir)
+    assert list(cambios['changed_rows']) == [0, 2]
+    assert data_utils.get_row_index(df3)['duplicate_count'] == 1
+    assert np.array_equal(data_utils.get_row_index(df3)['hashes'], data_utils.row_hashes(df3))
+    assert cache_datos.cargar_hashes(ruta, cache_dir)[1] == 'v3'
+
+    # Un fallo al guardar los hashes queda registrado en la información de la carga
+    def _fallar(*args, **kwargs):
+        raise OSError("archivo en uso")
+    monkeypatch.setattr(data_loader, 'guardar_hashes', _fallar)
+    info = {'cache': 'miss', 'huella_fuente': 'v4'}
+    data_loader._indexar_filas(ruta, df, info, cache_dir)
+    assert 'archivo en uso' in cache_datos.describir_carga(info)
+
+# Prueba de los sketches categóricos: top exacto, cotas de error, HyperLogLog e ingesta
+def test_sketches_categoricos(tmp_path):
+    import numpy as np
+    from src import data_loader, data_utils
+    from src.sketches_categoricos import SketchCategorico, ContadorDistintos, obtener_sketches
+    rng = np.random.default_rng(0)
+    valores = pd.Series(np.r_[np.repeat(['A', 'B', 'C'], [500, 300, 200]),
+                              [f'id{i}' for i in range(5000)]].astype(object)).sample(frac=1, random_state=0)
+    sketch = SketchCategorico(capacidad=50)
+    for inicio in range(0, len(valores), 700):
+        sketch.actualizar(valores.iloc[inicio:inicio + 700])
+    resumen = sketch.resumen(3)
+    assert list(resumen['top'].index) == ['A', 'B', 'C'] and not resumen['exacto']
+    reales = pd.Series({'A': 500, 'B': 300, 'C': 200})
+    assert ((resumen['top'] >= reales) & (resumen['top'] - reales <= resumen['error_maximo'])).all()
+    assert resumen['error_maximo'] <= len(valores) / 50
+    assert list(resumen['errores'].index) == ['A', 'B', 'C']
+    assert (resumen['top'] - resumen['errores'] <= reales).all()
+    assert abs(resumen['distintos'] - 5003) / 5003 < 0.05
+
+    hll = ContadorDistintos()
+    hll.actualizar_hashes(pd.util.hash_array(np.arange(200_000)))
+    assert abs(hll.estimar() - 200_000) / 200_000 < 0.03
+
+    ruta = str(tmp_path / 'ventas.csv')
+    pd.DataFrame({'Branch': rng.choice(['A', 'B'], 250), 'Payment': ['Cash', None] * 125,
+                  'Total': rng.random(250)}).to_csv(ruta, index=False)
+    df = data_loader.cargar_por_bloques(ruta, tamano_bloque=100, ruta_manifiesto=str(tmp_path / 'catalogo.json'))
+    ingesta = data_utils.get_column_sketches(df)
+    assert ingesta['Branch'].filas == 250 and ingesta['Payment'].nulos == 125
+    assert obtener_sketches(df, ['Branch'])['Branch'] is ingesta['Branch']
+    assert dict(ingesta['Branch'].frecuentes.top()) == df['Branch'].value_counts().to_dict()
+
+    # Otro DataFrame con la misma forma no recibe los sketches del primero
+    editado = df.copy()
+    editado.loc[:99, 'Branch'] = 'A'
+    assert data_utils.get_column_sketches(editado) is None
+    conteos = editado['Branch'].value_counts().to_dict()
+    assert dict(obtener_sketches(editado, ['Branch'])['Branch'].frecuentes.top()) == conteos
+
+    cache_dir = str(tmp_path / 'cache')
+    data_loader._indexar_categoricas(ruta, df, {'cache': 'miss', 'huella_fuente': 'v1'}, cache_dir)
+    guardados, huella = cache_datos.cargar_sketches(ruta, cache_dir)
+    assert guardados['Payment'].cardinalidad() == 1 and huella == 'v1'
+
+    # Los sketches guardados de otra versión de la fuente se reconstruyen
+    # aunque coincida el número de filas
+    data_loader._indexar_categoricas(ruta, editado, {'cache': 'hit', 'huella_fuente': 'v2'}, cache_dir)
+    assert cache_datos.cargar_sketches(ruta, cache_dir)[1] == 'v2'
+    recargado = editado.copy()
+    data_loader._indexar_categoricas(ruta, recargado, {'cache': 'hit', 'huella_fuente': 'v2'}, cache_dir)
+    assert dict(data_utils.get_column_sketches(recargado)['Branch'].frecuentes.top()) == conteos
@@ -3,7 +3,7 @@ import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import pytest
 import pandas as pd
-from src import data_loader, modelo_1_regresion, modelo_2_segmentacion, modelo_3_clasificacion
+from src import data_loader, modelo_1_regresion, modelo_2_segmentacion, modelo_3_clasificacion, modelo_4_anomalias
 
 # Prueba de carga de datos (simulada)
 def test_carga_datos():
@@ -52,3 +52,271 @@ def test_clasificacion():
     df = pd.DataFrame(data)
     _, _, resultados = modelo_3_clasificacion.entrenar_clasificacion(df)
     assert 'accuracy' in resultados
+
+# Prueba de la caché de modelos: un segundo entrenamiento con los mismos datos se recupera de disco
+def test_regresion_cache(tmp_path):
+    data = {
+        'Branch': ['A', 'B']*5, 'Gender': ['Female', 'Male']*5,
+        'Unit price': [50.0, 20.0]*5, 'Quantity': [5, 2]*5, 'Total': [262.5, 42.0]*5,
+        'Rating': [9.1, 6.5]*5
+    }
+    df = pd.DataFrame(data)
+    _, _, resultados = modelo_1_regresion.entrenar_regresion(df, usar_cache=True, cache_dir=str(tmp_path))
+    assert not resultados['desde_cache']
+    _, _, resultados = modelo_1_regresion.entrenar_regresion(df, usar_cache=True, cache_dir=str(tmp_path))
+    assert resultados['desde_cache']
+
+# Prueba de predicción por lotes con el Pipeline de regresión sobre un DataFrame crudo
+def test_regresion_pipeline_prediccion():
+    data = {
+        'Branch': ['A', 'B']*10, 'Gender': ['Female', 'Male']*10,
+        'Unit price': [50.0, 20.0]*10, 'Quantity': [5, 2]*10, 'Total': [262.5, 42.0]*10,
+        'Rating': [9.1, 6.5]*10
+    }
+    df = pd.DataFrame(data)
+    _, _, resultados = modelo_1_regresion.entrenar_regresion(df)
+    nuevos = df.drop(columns=['Rating']).head(4)
+    predicciones = modelo_1_regresion.predecir_regresion(resultados['pipeline'], nuevos)
+    assert predicciones.shape == (4,)
+
+# Prueba del modo de entrenamiento por bloques con presupuesto de tiempo
+def test_clasificacion_streaming():
+    data = {
+        'Branch': ['A', 'B']*20, 'Gender': ['Female', 'Male']*20,
+        'Product line': ['Health and beauty', 'Electronic accessories']*20,
+        'Unit price': [50.0, 20.0]*20, 'Quantity': [5, 2]*20, 'Total': [262.5, 42.0]*20
+    }
+    df = pd.DataFrame(data)
+    config = {'modo': 'streaming', 'tamano_bloque': 8, 'max_iter': 20, 'tiempo_maximo': 5}
+    _, _, resultados = modelo_3_clasificacion.entrenar_clasificacion(df, config_entrenamiento=config)
+    assert resultados['entrenamiento']['modo'] == 'streaming'
+    assert resultados['entrenamiento']['epocas'] <= 20
+    assert 'accuracy' in resultados
+
+# Prueba del entrenamiento incremental de clasificación sobre un CSV leído por bloques
+def test_clasificacion_incremental(tmp_path):
+    data = {
+        'Branch': ['A', 'B', 'C', 'A']*25, 'Gender': ['Female', 'Male']*50,
+        'Product line': ['Health and beauty', 'Electronic accessories']*50,
+        'Unit price': [50.0, 20.0, 35.0, 10.0]*25, 'Quantity': [5, 2]*50, 'Total': [262.5, 42.0]*50
+    }
+    ruta = tmp_path / 'ventas.csv'
+    pd.DataFrame(data).to_csv(ruta, index=False)
+    _, preproc, resultados = modelo_3_clasificacion.entrenar_clasificacion_incremental(
+        str(ruta), tamano_bloque=16, config_entrenamiento={'max_iter': 10}
+    )
+    assert 'accuracy' in resultados
+    assert len(resultados['y_test']) > 0
+    # El escalador se ajustó con todos los bloques, pero solo con las filas de entrenamiento
+    assert preproc.named_transformers_['num'].named_steps['escalar'].n_samples_seen_ == 100 - len(resultados['y_test'])
+    # Misma partición desde un DataFrame en memoria
+    _, _, resultados_df = modelo_3_clasificacion.entrenar_clasificacion_incremental(
+        pd.read_csv(ruta), tamano_bloque=16, config_entrenamiento={'max_iter': 10}
+    )
+    assert len(resultados_df['y_test']) == len(resultados['y_test'])
+
+# Prueba de la segmentación dispersa: la matriz one-hot no se densifica
+def test_segmentacion_dispersa():
+    from scipy import sparse
+    data = {
+        'Customer type': [f'C{i}' for i in range(40)], 'Gender': ['Female', 'Male']*20,
+        'Unit price': [float(i) for i in range(40)], 'Quantity': [1, 2, 3, 4]*10
+    }
+    df = pd.DataFrame(data)
+    X, _ = modelo_2_segmentacion.preparar_datos_segmentacion(df)
+    assert sparse.issparse(X)
+    df_seg, _, reductor, _ = modelo_2_segmentacion.segmentar_clientes(df, n_clusters=3)
+    assert type(reductor).__name__ == 'TruncatedSVD'
+    assert df_seg['Segmento'].nunique() == 3
+
+# Prueba de los motores MiniBatchKMeans y en streaming frente a KMeans completo
+def test_segmentacion_minibatch():
+    data = {
+        'Customer type': ['Member', 'Normal']*30, 'Gender': ['Female', 'Male', 'Male']*20,
+        'Unit price': [float(i % 17) for i in range(60)], 'Quantity': [i % 10 + 1 for i in range(60)]
+    }
+    df = pd.DataFrame(data)
+    assert modelo_2_segmentacion.resolver_motor('auto', 10) == 'kmeans'
+    assert modelo_2_segmentacion.resolver_motor('auto', modelo_2_segmentacion.UMBRAL_MINIBATCH + 1) == 'minibatch'
+    for motor in ('minibatch', 'streaming'):
+        df_seg, kmeans, _, _ = modelo_2_segmentacion.segmentar_clientes(df, n_clusters=3, motor=motor, batch_size=8)
+        assert type(kmeans).__name__ == 'MiniBatchKMeans'
+        assert df_seg['Segmento'].nunique() == 3
+    comparacion = modelo_2_segmentacion.comparar_motores(df, n_clusters=3, batch_size=8)
+    assert list(comparacion['motor']) == ['kmeans', 'minibatch', 'streaming']
+    assert (comparacion['inercia'] > 0).all()
+
+# Prueba del barrido de k en paralelo con silhouette muestreado
+def test_segmentacion_rango_k():
+    data = {
+        'Customer type': ['Member', 'Normal']*30, 'Gender': ['Female', 'Male', 'Male']*20,
+        'Unit price': [float(i % 17) for i in range(60)], 'Quantity': [i % 10 + 1 for i in range(60)]
+    }
+    df = pd.DataFrame(data)
+    barrido = modelo_2_segmentacion.evaluar_rango_k(df, k_min=2, k_max=4, n_jobs=2, muestra_silhouette=30)
+    assert list(barrido['resumen']['k']) == [2, 3, 4]
+    assert barrido['resumen']['silhouette'].between(-1, 1).all()
+    assert barrido['mejor_k'] in (2, 3, 4)
+    assert len(barrido['asignaciones'][3]) == len(df)
+    df_seg, kmeans, _, _ = modelo_2_segmentacion.segmentacion_desde_barrido(df, barrido, 3)
+    assert df_seg['Segmento'].nunique() == 3
+    assert kmeans.n_clusters == 3
+
+# Prueba de la caracterización de segmentos en una sola agregación: medias, modas y nulos
+def test_caracterizar_segmentos_todas_las_columnas():
+    df = pd.DataFrame({
+        'Segmento': [0, 0, 1, 1, 1],
+        'Total': [10.0, 20.0, 30.0, 40.0, 50.0], 'Unit price': [1.0]*5, 'Quantity': [1, 2, 3, 4, 5],
+        'Tax 5%': [0.5]*5, 'Product line': ['A', 'A', 'B', 'C', 'C'],
+        'Customer type': ['M', 'N', 'N', 'N', 'M'], 'Gender': ['F', 'F', 'M', 'M', 'F'],
+        'Payment': ['Cash', 'Cash', None, None, None]
+    })
+    resumen = modelo_2_segmentacion.caracterizar_segmentos(df)
+    assert list(resumen['count']) == [2, 3]
+    assert list(resumen['Total_mean']) == [15.0, 40.0]
+    assert {'Unit price_mean', 'Quantity_mean', 'Tax 5%_mean'} <= set(resumen.columns)
+    assert list(resumen['Product line_mode']) == ['A', 'C']
+    assert list(resumen['Gender_mode']) == ['F', 'M']
+    assert list(resumen['Payment_mode']) == ['Cash', 'N/A']
+
+# Prueba de detección de anomalías: puntuación por bloques y columnas compactas
+def test_anomalias_por_bloques():
+    import numpy as np
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'Total': rng.normal(100, 10, 300), 'Quantity': rng.integers(1, 10, 300),
+        'Payment': rng.choice(['Cash', 'Ewallet'], 300)
+    })
+    variables = ['Total', 'Quantity', 'Payment']
+    df_anom, modelo, preproc = modelo_4_anomalias.detectar_anomalias(
+        df, variables, contamination=0.05, n_jobs=2, max_samples=128, tamano_bloque=64
+    )
+    assert modelo.max_samples == 128
+    assert str(df_anom['Anomalía'].dtype) == 'category'
+    assert df_anom['Puntuación anomalía'].dtype == np.float32
+    assert 'Anomalía' not in df.columns
+    X, _ = modelo_4_anomalias.preparar_datos_anomalias(df, variables)
+    assert ((modelo.predict(X) == -1) == (df_anom['Anomalía'] == 'Sí').to_numpy()).all()
+
+# Prueba del detector persistido y de la puntuación en streaming desde archivo y generador
+def test_detector_anomalias_streaming(tmp_path):
+    import numpy as np
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        'Total': rng.normal(100, 10, 200), 'Payment': rng.choice(['Cash', 'Ewallet'], 200),
+        'Date': pd.date_range('2019-01-01', periods=200, freq='h')
+    })
+    variables = ['Total', 'Payment', 'Date']
+    detector, info = modelo_4_anomalias.entrenar_detector(df, variables, usar_cache=True, cache_dir=str(tmp_path))
+    assert not info['desde_cache']
+    _, info = modelo_4_anomalias.entrenar_detector(df, variables, usar_cache=True, cache_dir=str(tmp_path))
+    assert info['desde_cache']
+
+    ruta_detector = tmp_path / 'detector.joblib'
+    modelo_4_anomalias.guardar_detector(detector, ruta_detector)
+    detector = modelo_4_anomalias.cargar_detector(ruta_detector)
+    _, puntuaciones = modelo_4_anomalias.puntuar_detector(detector, df)
+
+    ruta_csv = tmp_path / 'nuevas.csv'
+    df.to_csv(ruta_csv, index=False)
+    flujo = modelo_4_anomalias.puntuar_en_streaming(detector, str(ruta_csv), tamano_lote=64)
+    lotes = [next(flujo)]
+    # El detector compartido conserva su configuración de núcleos mientras se puntúa
+    assert detector.named_steps['modelo'].n_jobs == modelo_4_anomalias.HIPERPARAMETROS_ANOMALIAS['n_jobs']
+    lotes.extend(flujo)
+    assert [info['filas'] for _, info in lotes] == [64, 64, 64, 8]
+    assert np.allclose(np.concatenate([l['Puntuación anomalía'] for l, _ in lotes]), puntuaciones, atol=1e-5)
+
+    generador = (df.iloc[i:i + 50] for i in range(0, 200, 50))
+    lotes = list(modelo_4_anomalias.puntuar_en_streaming(detector, generador))
+    assert sum(len(l) for l, _ in lotes) == 200
+
+# Prueba de la codificación ordinal float32 para anomalías
+def test_preparar_datos_anomalias_ordinal():
+    import numpy as np
+    df = pd.DataFrame({
+        'Total': [10.0, 20.0, 30.0, 40.0], 'Payment': ['Cash', 'Ewallet', 'Cash', 'Credit card'],
+        'Date': pd.to_datetime(['2019-01-01', '2019-01-02', '2019-01-03', '2019-01-04'])
+    })
+    X, preproc = modelo_4_anomalias.preparar_datos_anomalias(df, ['Total', 'Payment', 'Date'])
+    assert X.dtype == np.float32 and X.flags['C_CONTIGUOUS']
+    assert X.shape == (4, 3)
+    assert list(X[:, 0]) == [0.0, 2.0, 0.0, 1.0]
+    nuevo = pd.DataFrame({'Total': [15.0], 'Payment': ['Bitcoin'], 'Date': ['2019-01-05']})
+    assert preproc.transform(nuevo)[0, 0] == -1
+    # Las fechas se miden desde la mínima del ajuste: en float32 se distinguen segundos
+    assert list(X[:, 2]) == [0.0, 86400.0, 172800.0, 259200.0]
+    assert preproc.transform(nuevo)[0, 2] == 345600.0
+    df_segundos = pd.DataFrame({'Date': pd.to_datetime(['2019-03-30 10:00:00', '2019-03-30 10:00:01'])})
+    X_segundos, _ = modelo_4_anomalias.preparar_datos_anomalias(df_segundos, ['Date'])
+    assert X_segundos[1, 0] - X_segundos[0, 0] == 1.0
+
+# Prueba de los perfiles de preprocesamiento compartidos
+def test_perfiles_preprocesamiento():
+    import numpy as np
+    from scipy import sparse
+    from src.preprocesamiento import crear_preprocesador
+    df = pd.DataFrame({'Payment': ['Cash', 'Ewallet', 'Cash', 'Credit card'], 'Total': [10.0, 20.0, 30.0, 40.0]})
+    X_red = crear_preprocesador(['Payment'], ['Total'], perfil='red_neuronal').fit_transform(df)
+    assert X_red.dtype == np.float32 and X_red.shape == (4, 4)
+    assert abs(float(X_red[:, 3].mean())) < 1e-6
+    X_dist = crear_preprocesador(['Payment'], ['Total'], perfil='distancias').fit_transform(df)
+    assert sparse.issparse(X_dist) and X_dist.dtype == np.float32
+    X_arb = crear_preprocesador(['Payment'], ['Total'], perfil='arboles').fit_transform(df)
+    assert X_arb.dtype == np.float32 and X_arb.shape == (4, 2)
+    assert list(X_arb[:, 1]) == [10.0, 20.0, 30.0, 40.0]
+
+# Prueba del almacén de características: mismas matrices que el preprocesador y columnas reutilizadas
+def test_almacen_caracteristicas():
+    import numpy as np
+    from src.almacen_caracteristicas import AlmacenCaracteristicas
+    df = pd.DataFrame({
+        'Customer type': ['Member', 'Normal']*20, 'Gender': ['Female', 'Male', 'Male', 'Female']*10,
+        'Payment': ['Cash', 'Ewallet', 'Credit card', 'Cash']*10,
+        'Unit price': [float(i % 13) for i in range(40)], 'Quantity': [i % 7 + 1 for i in range(40)],
+        'Total': [float(i * 3 % 50) for i in range(40)]
+    })
+    almacen = AlmacenCaracteristicas()
+    almacen.asignar_datos(df, 'huella-ventas')
+
+    X_ref, _ = modelo_2_segmentacion.preparar_datos_segmentacion(df)
+    X, preproc = modelo_2_segmentacion.preparar_datos_segmentacion(df, almacen)
+    assert np.allclose(X.toarray(), X_ref.toarray())
+    assert np.allclose(preproc.transform(df).toarray(), X_ref.toarray())
+    fallos = almacen.estadisticas()['fallos']
+    modelo_2_segmentacion.preparar_datos_segmentacion(df, almacen)
+    assert almacen.estadisticas()['fallos'] == fallos
+
+    # Un subconjunto de filas (como el dropna() de cada pestaña) se resuelve
+    # por posiciones en el dataset y su salida también se reutiliza
+    variables = ['Gender', 'Payment', 'Total']
+    subconjunto = df[variables].iloc[::3]
+    X_ref, _ = modelo_4_anomalias.preparar_datos_anomalias(subconjunto, variables)
+    X, preproc = modelo_4_anomalias.preparar_datos_anomalias(subconjunto, variables, almacen)
+    assert np.array_equal(X, X_ref)
+    assert np.array_equal(preproc.transform(subconjunto), X_ref)
+    fallos = almacen.estadisticas()['fallos']
+    df_anom, _, _ = modelo_4_anomalias.detectar_anomalias(df[variables].iloc[::3], variables, almacen=almacen)
+    assert almacen.estadisticas()['fallos'] == fallos
+
+    # Una columna que no coincide con la del dataset asignado se codifica sin caché
+    df_editado = df.copy()
+    df_editado.loc[17, 'Total'] = 999.0
+    modelo_4_anomalias.preparar_datos_anomalias(df, variables, almacen)
+    fallos = almacen.estadisticas()['fallos']
+    X, _ = modelo_4_anomalias.preparar_datos_anomalias(df_editado, variables, almacen)
+    assert almacen.estadisticas()['fallos'] == fallos + 1
+    assert np.array_equal(X, modelo_4_anomalias.preparar_datos_anomalias(df_editado, variables)[0])
+
+    # Regresión y clasificación: mismas métricas, preprocesador ajustado solo con entrenamiento
+    df['Rating'] = [float(i % 9) for i in range(40)]
+    df['Product line'] = df['Customer type'].map({'Member': 'A', 'Normal': 'B'})
+    config = {'modo': 'streaming', 'tamano_bloque': 8, 'max_iter': 20}
+    _, _, res_ref = modelo_1_regresion.entrenar_regresion(df, config_entrenamiento=config)
+    _, preproc, res = modelo_1_regresion.entrenar_regresion(df, config_entrenamiento=config, almacen=almacen)
+    assert np.allclose(res['y_pred'], res_ref['y_pred'], atol=1e-4)
+    escalador = dict(preproc.transformadores_)['Total'].named_steps['perfil'].named_steps['perfil'].named_steps['escalar']
+    assert escalador.n_samples_seen_ == len(df) - len(res['y_test'])
+    assert np.allclose(modelo_1_regresion.predecir_regresion(res['pipeline'], df), res_ref['pipeline'].predict(df), atol=1e-4)
+    _, _, res = modelo_3_clasificacion.entrenar_clasificacion(df, config_entrenamiento=config, almacen=almacen)
+    assert len(res['y_pred']) == len(res['y_test']) == 8